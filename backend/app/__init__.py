@@ -70,6 +70,21 @@ def create_app():
     
     with app.app_context():
         db.create_all()
+        # Columns added to existing tables since they were created
+        from .services.ledger import Ledger
+        Ledger.ensure_schema()
+
+    # Keep market catalogs warm in the background (disabled on serverless)
+    from .services.market_refresher import MarketDataRefresher
+    MarketDataRefresher.start(app)
+
+    # Post-trade risk evaluation in background workers (inline on serverless)
+    from .services.risk_queue import RiskQueue
+    RiskQueue.start(app)
+
+    # Mark open accounts to market on every price tick (disabled on serverless)
+    from .services.risk_monitor import RiskMonitor
+    RiskMonitor.start(app)
     
     # Root route for health check
     @app.route('/')
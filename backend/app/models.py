@@ -14,9 +14,18 @@ class User(db.Model):
     last_equity_reset = db.Column(db.DateTime, default=datetime.utcnow)
     failure_reason = db.Column(db.String(255), nullable=True)
     avatar_url = db.Column(db.String(255), nullable=True)
+    # Bumped by every balance change (see services/ledger.py)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+# Login / purchase / challenge lookups match usernames case-insensitively
+db.Index('ix_users_username_lower', db.func.lower(User.username))
 
 class Trade(db.Model):
     __tablename__ = 'trades'
+    __table_args__ = (
+        # Open positions / risk checks: user_id + status, newest first
+        db.Index('ix_trades_user_status_timestamp', 'user_id', 'status', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     symbol = db.Column(db.String(10), nullable=False)
@@ -29,6 +38,10 @@ class Trade(db.Model):
     close_timestamp = db.Column(db.DateTime, nullable=True)
     pnl = db.Column(db.Float, default=0.0)
 
+# Closed trade history pages: keyset on (close time, id), see /challenge/trades
+db.Index('ix_trades_user_status_closed_at', Trade.user_id, Trade.status,
+         db.func.coalesce(Trade.close_timestamp, Trade.timestamp), Trade.id)
+
 class Course(db.Model):
     __tablename__ = 'courses'
     id = db.Column(db.Integer, primary_key=True)
@@ -126,6 +139,9 @@ class QuizAnswer(db.Model):
 
 class UserProgress(db.Model):
     __tablename__ = 'user_course_progress'
+    __table_args__ = (
+        db.Index('ix_user_course_progress_user_course', 'user_id', 'course_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
@@ -178,6 +194,9 @@ class UserChallenge(db.Model):
     Created after successful payment.
     """
     __tablename__ = 'user_challenges'
+    __table_args__ = (
+        db.Index('ix_user_challenges_user_status', 'user_id', 'challenge_status'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     plan_name = db.Column(db.String(50), nullable=False)  # 'starter', 'pro', 'elite'
@@ -395,6 +414,9 @@ class Leaderboard(db.Model):
     Updated periodically (e.g., hourly or daily).
     """
     __tablename__ = 'leaderboard'
+    __table_args__ = (
+        db.Index('ix_leaderboard_snapshot_at', 'snapshot_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     username = db.Column(db.String(80), nullable=False)
@@ -415,6 +437,74 @@ class Leaderboard(db.Model):
             'status': self.status
         }
 
+class UserTradingStats(db.Model):
+    """
+    Running per-user trade aggregates.
+    Incremented when trades are opened/closed; rows are back-filled from the
+    trades table the first time a user needs one.
+    """
+    __tablename__ = 'user_trading_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    total_trades = db.Column(db.Integer, default=0, nullable=False)
+    closed_trades = db.Column(db.Integer, default=0, nullable=False)
+    winning_trades = db.Column(db.Integer, default=0, nullable=False)
+    realized_pnl = db.Column(db.Float, default=0.0, nullable=False)
+    best_trade = db.Column(db.Float, nullable=True)  # Highest closed-trade P&L
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class UserDailyPnl(db.Model):
+    """
+    Realized P&L rolled up per user and close date (UTC).
+    Feeds the weekly performance chart without scanning trade history.
+    """
+    __tablename__ = 'user_daily_pnl'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    pnl = db.Column(db.Float, default=0.0, nullable=False)
+    trades = db.Column(db.Integer, default=0, nullable=False)
+
+class NewsArticle(db.Model):
+    """
+    RSS articles collected by NewsService, one row per story keyed by the
+    hash of its GUID (or link). Keeps the news history across restarts;
+    feed polls only insert entries whose hash is not stored yet.
+    """
+    __tablename__ = 'news_articles'
+    __table_args__ = (
+        # News hub pages: newest first, keyset on (published_at, id)
+        db.Index('ix_news_articles_published', 'published_at', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    guid_hash = db.Column(db.String(40), unique=True, nullable=False)  # sha1 hex
+    title = db.Column(db.String(500), nullable=False)
+    link = db.Column(db.String(1000), nullable=True)
+    source = db.Column(db.String(80), nullable=False)
+    category = db.Column(db.String(20), nullable=True)
+    sentiment = db.Column(db.String(10), default='NEUTRAL')
+    published_at = db.Column(db.DateTime, nullable=False)
+    first_seen_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class NewsKeyword(db.Model):
+    """
+    Inverted index of article title keywords (lowercase, accents and stop
+    words removed) behind /api/news/search.
+    """
+    __tablename__ = 'news_keywords'
+    keyword = db.Column(db.String(40), primary_key=True)
+    article_id = db.Column(db.Integer, db.ForeignKey('news_articles.id'), primary_key=True)
+
+class ChangeLogEntry(db.Model):
+    """
+    Committed changes announced to the other worker processes, so their
+    in-memory caches follow (see services/change_log.py). Short-lived rows.
+    """
+    __tablename__ = 'change_log'
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(80), nullable=False)    # e.g. 'leaderboard', 'view:academy.courses'
+    item_id = db.Column(db.Integer, nullable=True)      # e.g. the user id; None = the whole topic
+    origin = db.Column(db.String(32), nullable=False)   # process that made the change
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
 class Config(db.Model):
     """
     Stores key-value configuration settings (e.g., PayPal keys).
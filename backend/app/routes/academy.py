@@ -1,11 +1,13 @@
 from flask import Blueprint, jsonify, request
 from app.models import Course, Lesson, UserProgress, Certificate, User, db
+from app.utils.http_cache import cached_view
 import uuid
 from datetime import datetime
 
 academy_bp = Blueprint('academy', __name__)
 
 @academy_bp.route('/courses', methods=['GET'])
+@cached_view('academy.courses', ttl=300, max_age=60, depends_on=(Course, Lesson))
 def get_courses():
     courses = Course.query.all()
     courses_data = [{
@@ -3,6 +3,8 @@ Admin Routes - User management and database seeding
 """
 from flask import Blueprint, jsonify, request
 from ..models import User, Trade, db
+from ..services.ledger import Ledger
+from ..services.trading_stats import TradingStatsService
 from datetime import datetime
 import random
 
@@ -25,6 +27,76 @@ def get_users():
         print(f"❌ Error fetching users: {e}")
         return jsonify([])
 
+@admin_bp.route('/admin/metrics/cache', methods=['GET'])
+def get_cache_metrics():
+    """Get size and hit/miss/eviction counters of the in-memory caches"""
+    from ..services.bounded_cache import BoundedCache
+    # Import services so their caches are registered even before first use
+    from ..services import feed_service, bvc_service, news_service, economic_calendar, ai_service  # noqa: F401
+    return jsonify(BoundedCache.all_stats())
+
+@admin_bp.route('/admin/metrics/stream', methods=['GET'])
+def get_stream_metrics():
+    """Get subscriber/symbol counts of the price stream publisher"""
+    from ..services.price_stream import PriceStream
+    return jsonify(PriceStream.stats())
+
+@admin_bp.route('/admin/metrics/news', methods=['GET'])
+def get_news_metrics():
+    """Get per-feed fetch status (HTTP status, latency, conditional GET) and the article store size"""
+    from ..services.news_service import NewsService
+    return jsonify(NewsService.stats())
+
+@admin_bp.route('/admin/metrics/risk', methods=['GET'])
+def get_risk_queue_metrics():
+    """Get queue/worker counters of the background risk evaluation"""
+    from ..services.risk_queue import RiskQueue
+    return jsonify(RiskQueue.stats())
+
+@admin_bp.route('/admin/metrics/risk-monitor', methods=['GET'])
+def get_risk_monitor_metrics():
+    """Get pass/tick counters of the risk monitor and the size of its position index"""
+    from ..services.risk_monitor import RiskMonitor
+    return jsonify(RiskMonitor.stats())
+
+@admin_bp.route('/admin/exposure', methods=['GET'])
+def get_exposure():
+    """Get open exposure per symbol (quantities, notional, unrealized P&L) from the position index"""
+    from ..services.position_index import PositionIndex
+    PositionIndex.sync()
+    symbols = PositionIndex.exposure()
+    return jsonify({
+        "symbols": symbols,
+        "totals": {
+            "positions": sum(s['positions'] for s in symbols),
+            "gross_notional": round(sum(s['gross_notional'] for s in symbols), 2),
+            "unrealized_pnl": round(sum(s['unrealized_pnl'] for s in symbols), 2)
+        },
+        "index": PositionIndex.stats()
+    })
+
+@admin_bp.route('/admin/exposure/<symbol>', methods=['GET'])
+def get_symbol_exposure(symbol):
+    """Get the exposure on one symbol and its largest holders (?limit=50, ?positions=1 for the raw positions)"""
+    from ..services.position_index import PositionIndex
+    PositionIndex.sync()
+    summary = PositionIndex.exposure(symbol)
+    if not summary:
+        return jsonify({"message": f"Aucune position ouverte sur {symbol}"}), 404
+
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    holders = PositionIndex.holders(symbol, limit)
+    usernames = dict(db.session.query(User.id, User.username).filter(
+        User.id.in_([h['user_id'] for h in holders])
+    ).all())
+    for holder in holders:
+        holder['username'] = usernames.get(holder['user_id'])
+
+    result = dict(summary[0], holders=holders)
+    if request.args.get('positions') in ('1', 'true'):
+        result['open_positions'] = PositionIndex.positions(symbol, limit)
+    return jsonify(result)
+
 @admin_bp.route('/seed', methods=['POST'])
 def seed_db():
     """Seed the database with test users and trades"""
@@ -168,7 +240,7 @@ def reset_user():
         
         # Reset all values
         user.status = 'ACTIVE'
-        user.balance = user.initial_capital or 100000
+        Ledger.reset(user, user.initial_capital or 100000)
         user.daily_starting_equity = user.initial_capital or 100000
         user.last_equity_reset = datetime.utcnow()
         user.failure_reason = None
@@ -199,8 +271,9 @@ def delete_user():
         if not user:
             return jsonify({"message": f"Utilisateur {email} non trouvé"}), 404
         
-        # Delete user's trades first
+        # Delete user's trades first, with the stats aggregated from them
         Trade.query.filter_by(user_id=user.id).delete()
+        TradingStatsService.reset(user.id)
         
         # Delete user
         db.session.delete(user)
@@ -154,6 +154,8 @@ def delete_account():
         Account.query.filter_by(user_id=user.id).delete()
         Transaction.query.filter_by(user_id=user.id).delete()
         Leaderboard.query.filter_by(user_id=user.id).delete()
+        from ..services.trading_stats import TradingStatsService
+        TradingStatsService.reset(user.id)
         
         # Now delete the user
         db.session.delete(user)
@@ -1,12 +1,20 @@
 from flask import Blueprint, jsonify, request
 from ..models import User, Trade, db, UserChallenge, Leaderboard
-from ..services.feed_service import FeedService
-from sqlalchemy import desc, func
-from datetime import datetime, timedelta
+from ..services.mark_price_store import MarkPriceStore
+from ..services.leaderboard_service import LeaderboardService
+from ..services.trading_stats import TradingStatsService
+from ..services.ledger import Ledger
+from sqlalchemy import desc, func, or_, and_
+from datetime import datetime, timedelta, timezone
+import base64
+import math
 import random
 
 challenge_bp = Blueprint('challenge', __name__)
 
+RECENT_TRADES_LIMIT = 50  # Closed trades embedded in /challenge
+MAX_TRADES_PAGE = 200
+
 @challenge_bp.route('/challenge', methods=['GET'])
 def get_challenge_stats():
     email = request.args.get('email')
@@ -41,6 +49,8 @@ def get_challenge_stats():
             "profit_percent": 0,
             "drawdown": 0,
             "trades": [],
+            "trades_cursor": None,
+            "total_trades": 0,
             "open_positions": [],
             "win_rate": 0,
             "best_trade": 0,
@@ -57,35 +67,21 @@ def get_challenge_stats():
             "message": "Veuillez acheter un challenge pour commencer le trading"
         })
 
-    # 4. Fetch Trades (Closed & Open)
-    closed_trades = Trade.query.filter_by(user_id=user.id, status='CLOSED').order_by(desc(Trade.close_timestamp)).all()
+    # 4. Fetch Trades: latest page of closed history (full history via /challenge/trades) & open
+    closed_trades, next_cursor = _closed_trades_page(user.id, limit=RECENT_TRADES_LIMIT)
     open_trades = Trade.query.filter_by(user_id=user.id, status='OPEN').order_by(desc(Trade.timestamp)).all()
 
     # 5. Process Closed Trades
-    trade_data = []
-    profit_amount = 0
-    
-    for t in closed_trades:
-        profit_amount += t.pnl
-        trade_data.append({
-            "id": t.id,
-            "ticker": t.symbol,
-            "side": t.type,
-            "entry_price": round(t.price, 2),
-            "close_price": round(t.close_price, 2) if t.close_price else 0,
-            "pnl": round(t.pnl, 2),
-            "time": t.close_timestamp.timestamp() if t.close_timestamp else t.timestamp.timestamp()
-        })
+    trade_data = [_closed_trade_dict(t) for t in closed_trades]
 
     # 6. Process Open Trades (Calculate Unrealized PnL)
     open_positions_data = []
     current_profit_open = 0
+    marks = MarkPriceStore.get_marks(t.symbol for t in open_trades)
     
     for t in open_trades:
-        price_data = FeedService.get_price_data(t.symbol)
-        current_price = t.price 
-        if price_data:
-             current_price = price_data[-1]['close']
+        mark = marks.get(t.symbol)
+        current_price = mark.price if mark else t.price
              
         if t.type == 'BUY':
             pnl = (current_price - t.price) * t.quantity
@@ -123,38 +119,28 @@ def get_challenge_stats():
         drawdown_val = initial_capital - current_equity
         drawdown = (drawdown_val / initial_capital) * 100
 
-    # Win Rate, Best, Avg
+    # Win Rate, Best, Avg (materialized per-user stats)
+    stats = TradingStatsService.get_stats(user.id)
     win_rate = 0
     best_trade = 0
     avg_trade = 0
     
-    if closed_trades:
-        winning_trades = [t for t in closed_trades if t.pnl > 0]
-        win_rate = (len(winning_trades) / len(closed_trades)) * 100
-        best_trade = max([t.pnl for t in closed_trades])
-        avg_trade = sum([t.pnl for t in closed_trades]) / len(closed_trades)
+    if stats.closed_trades:
+        win_rate = (stats.winning_trades / stats.closed_trades) * 100
+        best_trade = stats.best_trade or 0
+        avg_trade = stats.realized_pnl / stats.closed_trades
 
-    # 8. Weekly Performance
+    # 8. Weekly Performance (daily P&L rollup, last 7 days)
     weekly_performance = []
-    today = datetime.now().date()
-    days_map = {}
+    today = datetime.utcnow().date()
+    daily_pnl = TradingStatsService.get_daily_pnl(user.id, days=7, today=today)
     
-    # Initialize last 7 days
     fr_days = {'Mon': 'Lun', 'Tue': 'Mar', 'Wed': 'Mer', 'Thu': 'Jeu', 'Fri': 'Ven', 'Sat': 'Sam', 'Sun': 'Dim'}
     for i in range(6, -1, -1):
         day_date = today - timedelta(days=i)
         day_name = day_date.strftime("%a")
-        fr_day = fr_days.get(day_name, day_name)
-        days_map[day_date] = {"day": fr_day, "profit": 0, "trades": 0}
-
-    for t in closed_trades:
-        if t.close_timestamp:
-            t_date = t.close_timestamp.date()
-            if t_date in days_map:
-                days_map[t_date]["profit"] += t.pnl
-                days_map[t_date]["trades"] += 1
-    
-    weekly_performance = list(days_map.values())
+        profit, trades = daily_pnl.get(day_date, (0, 0))
+        weekly_performance.append({"day": fr_days.get(day_name, day_name), "profit": profit, "trades": trades})
 
     # 9. Risk Params
     risk_params = {
@@ -172,6 +158,8 @@ def get_challenge_stats():
         "profit_percent": round(profit_percent, 2),
         "drawdown": round(drawdown, 2),
         "trades": trade_data,
+        "trades_cursor": next_cursor,
+        "total_trades": stats.closed_trades,
         "open_positions": open_positions_data,
         "win_rate": round(win_rate, 0),
         "best_trade": round(best_trade, 2),
@@ -182,44 +170,135 @@ def get_challenge_stats():
         "active_challenge": active_challenge.to_dict() if active_challenge else None
     })
 
-def refresh_leaderboard():
+@challenge_bp.route('/challenge/trades', methods=['GET'])
+def get_trade_history():
     """
-    Calculates top 10 traders based on performance and updates the Leaderboard table.
+    Closed trade history, newest first, with keyset (cursor) pagination.
+
+    Query params:
+        email (str): User (required)
+        limit (int): Page size (default 50, max 200)
+        cursor (str): `next_cursor` of the previous page
+        symbol (str), side (BUY/SELL): Exact-match filters
+        from, to (epoch seconds or ISO date): Close time range (inclusive)
     """
+    email = request.args.get('email')
+    user = None
+    if email:
+        user = User.query.filter(func.lower(User.username) == email.strip().lower()).first()
+    if not user:
+        return jsonify({"message": "User not found"}), 404
+
     try:
-        users = User.query.all()
-        trader_stats = []
+        limit = min(max(int(request.args.get('limit', 50)), 1), MAX_TRADES_PAGE)
+        cursor = _decode_cursor(request.args.get('cursor'))
+        start = _parse_time(request.args.get('from'))
+        end = _parse_time(request.args.get('to'), end_of_day=True)
+    except ValueError as e:
+        return jsonify({"message": f"Invalid parameter: {e}"}), 400
 
-        for user in users:
-            # Skip if no initial capital or invalid state
-            if not user.initial_capital or user.initial_capital == 0:
-                continue
+    side = request.args.get('side')
+    trades, next_cursor = _closed_trades_page(
+        user.id, limit=limit, cursor=cursor,
+        symbol=request.args.get('symbol'), side=side.upper() if side else None,
+        start=start, end=end
+    )
+    return jsonify({
+        "trades": [_closed_trade_dict(t) for t in trades],
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None
+    })
 
-            # Calculate Equity
-            closed_trades = Trade.query.filter_by(user_id=user.id, status='CLOSED').all()
-            total_pnl = sum(t.pnl for t in closed_trades)
-            current_equity = user.initial_capital + total_pnl # Simplified for ranking
+def _closed_trade_time():
+    # Seeded trades may lack a close timestamp; fall back to the open time
+    return func.coalesce(Trade.close_timestamp, Trade.timestamp)
 
-            profit_percent = ((current_equity - user.initial_capital) / user.initial_capital) * 100
-            
-            # Additional Stats
-            win_rate = 0
-            if closed_trades:
-                winning = len([t for t in closed_trades if t.pnl > 0])
-                win_rate = (winning / len(closed_trades)) * 100
-
-            trader_stats.append({
-                'user_id': user.id,
-                'username': user.username,
-                'profit_percent': round(profit_percent, 2),
-                'total_trades': len(closed_trades),
-                'win_rate': round(win_rate, 1),
-                'status': user.status
-            })
-
-        # Sort by Profit % Descending
-        trader_stats.sort(key=lambda x: x['profit_percent'], reverse=True)
-        top_10 = trader_stats[:10]
+def _closed_trades_page(user_id, limit, cursor=None, symbol=None, side=None, start=None, end=None):
+    """
+    One page of closed trades ordered by (close time, id) descending.
+
+    Returns:
+        tuple: (list of Trade, next cursor or None when this is the last page)
+    """
+    close_time = _closed_trade_time()
+    query = Trade.query.filter(Trade.user_id == user_id, Trade.status == 'CLOSED')
+    if symbol:
+        query = query.filter(Trade.symbol == symbol)
+    if side:
+        query = query.filter(Trade.type == side)
+    if start:
+        query = query.filter(close_time >= start)
+    if end:
+        query = query.filter(close_time <= end)
+    if cursor:
+        cursor_time, cursor_id = cursor
+        query = query.filter(or_(close_time < cursor_time, and_(close_time == cursor_time, Trade.id < cursor_id)))
+
+    rows = query.order_by(close_time.desc(), Trade.id.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, _encode_cursor(last.close_timestamp or last.timestamp, last.id)
+
+def _closed_trade_dict(t):
+    return {
+        "id": t.id,
+        "ticker": t.symbol,
+        "side": t.type,
+        "entry_price": round(t.price, 2),
+        "close_price": round(t.close_price, 2) if t.close_price else 0,
+        "pnl": round(t.pnl, 2),
+        "time": t.close_timestamp.timestamp() if t.close_timestamp else t.timestamp.timestamp()
+    }
+
+def _encode_cursor(close_time, trade_id):
+    raw = f"{close_time.isoformat()}|{trade_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        close_time, trade_id = raw.split('|')
+        return datetime.fromisoformat(close_time), int(trade_id)
+    except Exception:
+        raise ValueError("cursor")
+
+def _parse_time(value, end_of_day=False):
+    """Epoch seconds or ISO date/datetime -> naive UTC datetime."""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = None
+    if seconds is not None:
+        if not math.isfinite(seconds):
+            raise ValueError(f"'{value}' is not a finite timestamp")
+        try:
+            return datetime.utcfromtimestamp(seconds)
+        except (OverflowError, OSError) as e:
+            raise ValueError(f"'{value}' is out of range") from e
+    parsed = datetime.fromisoformat(value)
+    try:
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        if end_of_day and len(value) == 10:
+            # Whole day for date-only upper bounds
+            parsed += timedelta(days=1) - timedelta(microseconds=1)
+    except OverflowError as e:
+        raise ValueError(f"'{value}' is out of range") from e
+    return parsed
+
+def refresh_leaderboard():
+    """
+    Calculates top 10 traders based on performance and updates the Leaderboard table.
+    """
+    try:
+        # Persist the current in-memory top 10
+        top_10 = LeaderboardService.top('realized', 10)
 
         # Update DB
         Leaderboard.query.delete()
@@ -247,8 +326,8 @@ def refresh_leaderboard():
 @challenge_bp.route('/leaderboard', methods=['GET'])
 def get_leaderboard():
     """
-    Get Top 10 Traders of the Month (Persistent SQL Leaderboard).
-    Checks cache age; refreshes if older than 1 hour.
+    Get Top 10 Traders of the Month (live in-memory ranking).
+    The SQL Leaderboard snapshot is re-persisted if older than 1 hour.
     """
     try:
         # Check if we have recent data (e.g., last 1 hour)
@@ -258,9 +337,15 @@ def get_leaderboard():
         if not latest_entry or latest_entry.snapshot_at < one_hour_ago:
             refresh_leaderboard()
             
-        # Fetch Top 10 from SQL
-        leaderboard_data = Leaderboard.query.order_by(Leaderboard.rank.asc()).all()
-        result = [entry.to_dict() for entry in leaderboard_data]
+        # Top 10 straight from memory, same shape as Leaderboard.to_dict()
+        result = [{
+            'rank': i + 1,
+            'username': stat['username'],
+            'profit': stat['profit_percent'],
+            'trades': stat['total_trades'],
+            'win_rate': stat['win_rate'],
+            'status': stat['status']
+        } for i, stat in enumerate(LeaderboardService.top('realized', 10))]
         
         # If still empty (no users/trades), fallback to demo data
         if not result:
@@ -330,7 +415,7 @@ def purchase_challenge():
         db.session.add(challenge)
         
         # 4. RESET USER ACCOUNT
-        user.balance = initial_capital
+        Ledger.reset(user, initial_capital)
         user.initial_capital = initial_capital
         user.daily_starting_equity = initial_capital
         user.status = 'ACTIVE'
@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify
 from app.models import User, Trade, db
-from sqlalchemy import func
+from app.services.leaderboard_service import LeaderboardService
+from app.utils.http_cache import cached_view
 
 leaderboard_bp = Blueprint('leaderboard', __name__)
 
@@ -19,38 +20,12 @@ DEMO_TRADERS = [
 ]
 
 @leaderboard_bp.route('/', methods=['GET'])
+@cached_view('leaderboard', ttl=30, depends_on=(User, Trade))
 def get_leaderboard():
     try:
-        # Get all active users
-        users = User.query.filter(User.status != 'BANNED').all()
-        
-        leaderboard_data = []
-        real_usernames = set()
-        
-        for user in users:
-            # Calculate Profit %
-            # (Current Equity - Initial) / Initial * 100
-            # Use daily_starting_equity or initial_capital logic. 
-            # For simplicity: Use balance vs initial_capital
-            
-            initial = user.initial_capital if user.initial_capital > 0 else 100000.0
-            current = user.balance
-            
-            profit_raw = current - initial
-            profit_pct = (profit_raw / initial) * 100
-            
-            # Count trades
-            trade_count = Trade.query.filter_by(user_id=user.id).count()
-            
-            leaderboard_data.append({
-                'username': user.username,
-                'profit': round(profit_pct, 2),
-                'trades': trade_count,
-                'status': user.status,
-                'total_pnl': round(profit_raw, 2),
-                'closed_trades': trade_count, 
-            })
-            real_usernames.add(user.username)
+        # Top 10 real traders from the in-memory ranking
+        leaderboard_data = LeaderboardService.top('balance', 10)
+        real_usernames = {entry['username'] for entry in leaderboard_data}
             
         # If we have fewer than 10 users, add demo traders to fill the gap
         if len(leaderboard_data) < 10:
@@ -1,14 +1,46 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from ..services.news_service import NewsService
+from ..services.economic_calendar import EconomicCalendar
+from datetime import datetime, timedelta, timezone
+import base64
+import math
 
 news_bp = Blueprint('news', __name__)
 
+MAX_SEARCH_PAGE = 100
+MAX_CALENDAR_RANGE = timedelta(days=62)
+
 @news_bp.route('/calendar', methods=['GET'])
 def get_calendar():
-    """Get economic calendar events"""
+    """
+    Get economic calendar events. Without parameters: the last 12 hours and
+    the next 24.
+
+    Query params:
+        from, to (epoch seconds or ISO date): Range (inclusive, at most 62 days)
+        currency (str): Comma-separated currencies (USD,EUR,MAD...)
+        impact (str): Comma-separated impacts (HIGH,MEDIUM,LOW)
+    """
     try:
-        events = NewsService.get_economic_calendar()
-        return jsonify(events)
+        start = _parse_time(request.args.get('from'))
+        end = _parse_time(request.args.get('to'), end_of_day=True)
+    except ValueError as e:
+        return jsonify({"message": f"Invalid parameter: {e}"}), 400
+    currencies = _split_list(request.args.get('currency'))
+    impacts = _split_list(request.args.get('impact'))
+
+    try:
+        if start is None and end is None and not currencies and not impacts:
+            return jsonify(NewsService.get_economic_calendar())
+
+        now = datetime.utcnow()
+        if start is None:
+            start = (end or now) - EconomicCalendar.DAY_VIEW_PAST
+        if end is None:
+            end = start + EconomicCalendar.DAY_VIEW_PAST + EconomicCalendar.DAY_VIEW_AHEAD
+        if end < start or end - start > MAX_CALENDAR_RANGE:
+            return jsonify({"message": "Invalid parameter: range"}), 400
+        return jsonify(EconomicCalendar.events(start, end, currencies, impacts, now=now))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -21,6 +53,40 @@ def get_latest_news():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@news_bp.route('/search', methods=['GET'])
+def search_news():
+    """
+    Search stored news, newest first.
+
+    Query params:
+        q (str): Keywords, all of them must appear in the title
+        source, category, sentiment (str): Exact-match filters
+        limit (int): Page size (default 20, max 100)
+        cursor (str): `next_cursor` of the previous page
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), MAX_SEARCH_PAGE)
+        cursor = _decode_cursor(request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({"message": f"Invalid parameter: {e}"}), 400
+
+    sentiment = request.args.get('sentiment')
+    try:
+        articles, next_cursor = NewsService.search(
+            query=request.args.get('q'),
+            source=request.args.get('source'),
+            category=request.args.get('category'),
+            sentiment=sentiment.upper() if sentiment else None,
+            limit=limit, cursor=cursor
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify({
+        "articles": articles,
+        "next_cursor": _encode_cursor(*next_cursor) if next_cursor else None,
+        "has_more": next_cursor is not None
+    })
+
 @news_bp.route('/summary', methods=['GET'])
 def get_ai_summary():
     """Get AI generated market summary"""
@@ -29,3 +95,46 @@ def get_ai_summary():
         return jsonify(summary)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+def _encode_cursor(published_at, article_id):
+    raw = f"{published_at.isoformat()}|{article_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        published_at, article_id = raw.split('|')
+        return datetime.fromisoformat(published_at), int(article_id)
+    except Exception:
+        raise ValueError("cursor")
+
+def _split_list(value):
+    return [item.strip() for item in value.split(',') if item.strip()] if value else None
+
+def _parse_time(value, end_of_day=False):
+    """Epoch seconds or ISO date/datetime -> naive UTC datetime."""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = None
+    if seconds is not None:
+        if not math.isfinite(seconds):
+            raise ValueError(f"'{value}' is not a finite timestamp")
+        try:
+            return datetime.utcfromtimestamp(seconds)
+        except (OverflowError, OSError) as e:
+            raise ValueError(f"'{value}' is out of range") from e
+    parsed = datetime.fromisoformat(value)
+    try:
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        if end_of_day and len(value) == 10:
+            # Whole day for date-only upper bounds
+            parsed += timedelta(days=1) - timedelta(microseconds=1)
+    except OverflowError as e:
+        raise ValueError(f"'{value}' is out of range") from e
+    return parsed
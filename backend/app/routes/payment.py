@@ -5,6 +5,7 @@ from flask import Blueprint, jsonify, request
 from datetime import datetime, timedelta
 import uuid
 from ..models import User, UserChallenge, Payment, SystemConfig, db
+from ..services.ledger import Ledger
 
 payment_bp = Blueprint('payment', __name__)
 
@@ -107,7 +108,7 @@ def process_purchase():
         db.session.add(payment)
         
         # Update user balance to match plan capital
-        user.balance = plan['capital']
+        Ledger.reset(user, plan['capital'])
         user.initial_capital = plan['capital']
         user.daily_starting_equity = plan['capital']
         user.status = 'ACTIVE'
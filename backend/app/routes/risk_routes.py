@@ -1,6 +1,11 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request, Response
+import time
 from ..services.risk_manager import RiskManager
-from ..models import User, db
+from ..services.account_context import AccountContext
+from ..services.risk_queue import RiskQueue
+from ..services.price_stream import PriceStream
+from ..services.change_log import ChangeLog
+from ..models import db
 
 risk_bp = Blueprint('risk', __name__)
 
@@ -11,11 +16,11 @@ def get_risk_metrics():
     if not email:
         return jsonify({"message": "Email required"}), 400
     
-    user = User.query.filter_by(username=email).first()
-    if not user:
+    account = AccountContext.for_email(email)
+    if not account:
         return jsonify({"message": "User not found"}), 404
     
-    metrics = RiskManager.get_risk_metrics(user.id)
+    metrics = RiskManager.get_risk_metrics(account.user_id, account)
     if not metrics:
         return jsonify({"message": "Unable to calculate metrics"}), 500
     
@@ -28,9 +33,76 @@ def check_risk():
     if not email:
         return jsonify({"message": "Email required"}), 400
     
-    user = User.query.filter_by(username=email).first()
-    if not user:
+    account = AccountContext.for_email(email)
+    if not account:
         return jsonify({"message": "User not found"}), 404
     
-    risk_check = RiskManager.check_risk_rules(user.id)
+    risk_check = RiskManager.check_risk_rules(account.user_id, account)
     return jsonify(risk_check)
+
+@risk_bp.route('/stream', methods=['GET'])
+def stream_risk():
+    """
+    Server-Sent Events stream of a user's risk evaluations.
+
+    Sends the current risk check as a `risk` event, then one `risk` event per
+    background evaluation (after each fill, see RiskQueue), including the
+    ones made by other workers. Shares the worker's stream slots with the
+    price stream: ends after PriceStream.MAX_STREAM_SECONDS, 503 when full.
+    """
+    email = request.args.get('email')
+    if not email:
+        return jsonify({"message": "Email required"}), 400
+
+    account = AccountContext.for_email(email)
+    if not account:
+        return jsonify({"message": "User not found"}), 404
+
+    if not PriceStream.acquire_slot():
+        response = jsonify({"message": "Too many open streams, poll /api/risk/check"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '60'
+        return response
+
+    subscription = RiskQueue.listen(account.user_id)
+
+    def close():
+        if RiskQueue.unlisten(subscription):
+            PriceStream.release_slot()
+
+    try:
+        current = RiskManager.check_risk_rules(account.user_id, account)
+    except Exception:
+        close()
+        raise
+    app = current_app._get_current_object()
+
+    def events():
+        try:
+            yield "retry: 5000\n\n"
+            yield PriceStream.format_sse('risk', current)
+            ends_at = time.time() + PriceStream.MAX_STREAM_SECONDS
+            keepalive_at = time.time() + 15
+            while time.time() < ends_at:
+                # Evaluations of other workers arrive through the change log
+                with app.app_context():
+                    try:
+                        ChangeLog.poll()
+                    finally:
+                        db.session.remove()
+                message = subscription.get(timeout=max(0.1, min(ChangeLog.POLL_INTERVAL, ends_at - time.time())))
+                if message is not None:
+                    yield PriceStream.format_sse('risk', message)
+                elif time.time() >= keepalive_at:
+                    keepalive_at = time.time() + 15
+                    yield ": keepalive\n\n"
+        finally:
+            close()
+
+    response = Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Also frees the slot when the client leaves before the generator starts
+    response.call_on_close(close)
+    return response
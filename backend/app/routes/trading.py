@@ -1,18 +1,114 @@
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response
 from datetime import datetime
+import math
+import time
 from ..services.feed_service import FeedService
 from ..services.risk_manager import RiskManager
+from ..services.account_context import AccountContext
+from ..services.risk_queue import RiskQueue
 from ..services.bvc_service import BVCService
+from ..services.mark_price_store import MarkPriceStore
+from ..services.price_stream import PriceStream
 from ..models import Trade, User, db
+from ..services.trading_stats import TradingStatsService
+from ..services.ledger import Ledger, LedgerConflict
+from ..utils.http_cache import cached_view
 
 trading_bp = Blueprint('trading', __name__)
 
 @trading_bp.route('/price', methods=['GET'])
 def get_price():
+    """
+    Candles for a ticker.
+
+    Without `since` the full window is returned as a list (legacy shape).
+    With `since` (epoch seconds, normally the `cursor` of the previous reply)
+    only candles with time >= since are returned, with the current mark:
+        {"ticker", "candles": [...], "mark": {...}, "cursor": <last candle time>}
+    The candle at the cursor is included because it may still be forming.
+
+    Both forms carry an ETag; a matching If-None-Match gets an empty 304.
+    """
     ticker = request.args.get('ticker', 'BTC-USD')
-    data = FeedService.get_price_data(ticker)
-    return jsonify(data)
+    since = request.args.get('since')
+    if since is not None:
+        try:
+            since = float(since)
+            if not math.isfinite(since):
+                raise ValueError(since)
+            since = int(since)
+        except (ValueError, OverflowError):
+            return jsonify({"message": "since must be an epoch timestamp"}), 400
+
+    series = FeedService.get_series(ticker)
+    mark = MarkPriceStore.get_mark(ticker) if since is not None else None
+
+    # Revision of what this reply would contain: last candle + mark
+    revision = f"{ticker}:{series.time[-1] if series else 0}:{series.last_close}"
+    if mark:
+        revision += f":{mark.price}"
+    if request.if_none_match.contains(revision):
+        response = Response(status=304)
+        response.set_etag(revision)
+        return response
+
+    if since is None:
+        response = Response(series.to_json(), mimetype='application/json')
+    else:
+        response = jsonify({
+            "ticker": ticker,
+            "candles": series.since(since).to_records(),
+            "mark": {"price": mark.price, "timestamp": mark.timestamp, "source": mark.source} if mark else None,
+            "cursor": int(series.time[-1]) if series else since
+        })
+    response.set_etag(revision)
+    return response
+
+@trading_bp.route('/stream', methods=['GET'])
+def stream_prices():
+    """
+    Server-Sent Events stream of candle/mark updates.
+
+    Query: symbols=BTC-USD,ETH-USD,IAM
+    Sends one `snapshot` event per symbol, then `update` events carrying only
+    the candles that changed since the previous tick and the current mark.
+    The stream ends after PriceStream.MAX_STREAM_SECONDS (the browser
+    reconnects); 503 when the worker has no stream slot left.
+    """
+    symbols = [s.strip() for s in request.args.get('symbols', 'BTC-USD').split(',') if s.strip()]
+    if not symbols:
+        return jsonify({"message": "No symbols requested"}), 400
+
+    subscription, snapshots = PriceStream.subscribe(symbols)
+    if subscription is None:
+        # Every stream slot of this worker is taken: the client polls /price instead
+        response = jsonify({"message": "Too many open streams, poll /api/trading/price"})
+        response.headers['Retry-After'] = '60'
+        return response, 503
+
+    def events():
+        ends_at = time.time() + PriceStream.MAX_STREAM_SECONDS
+        try:
+            yield "retry: 5000\n\n"
+            for snapshot in snapshots:
+                yield PriceStream.format_sse('snapshot', snapshot)
+            while time.time() < ends_at:
+                message = subscription.get(timeout=max(0.1, min(15, ends_at - time.time())))
+                if message is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield PriceStream.format_sse(message['type'], message)
+        finally:
+            PriceStream.unsubscribe(subscription)
+
+    response = Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Also frees the slot when the client leaves before the generator starts
+    response.call_on_close(lambda: PriceStream.unsubscribe(subscription))
+    return response
 
 @trading_bp.route('/health', methods=['GET'])
 def health():
@@ -46,19 +142,23 @@ def execute_trade():
         
         print(f"Processing trade: {side} {amount} of {ticker} (raw: {ticker_raw}) for {email}")
 
-        # Find or create user
-        user = User.query.filter_by(username=email).first()
-        if not user:
+        # Find or create user (account state is loaded once for the whole request)
+        account = AccountContext.for_email(email)
+        if not account:
             print(f"User {email} not found, creating new user...")
             user = User(username=email)
             db.session.add(user)
             db.session.commit()
+            account = AccountContext.for_user(user)
             print(f"User created with ID: {user.id}, Balance: {user.balance}")
         else:
+            user = account.user
             print(f"User found - ID: {user.id}, Balance: {user.balance}, Status: {user.status}")
         
-        # Check if user can trade (risk rules)
-        can_trade, reason = RiskManager.can_trade(user.id)
+        # Check if user can trade (risk rules), always before the fill: the risk
+        # queue only re-evaluates the account after it
+        queued = RiskQueue.is_running()
+        can_trade, reason = RiskManager.can_trade(user.id, account)
         if not can_trade:
             print(f"Trade blocked for user {user.id}: {reason}")
             return jsonify({
@@ -66,32 +166,29 @@ def execute_trade():
                 "status": "FAILED"
             }), 403
 
-        # Get current price
-        # Check BVC first
-        bvc_data = BVCService.get_market_data()
-        bvc_stock = next((item for item in bvc_data if item['symbol'] == ticker), None)
+        # Get current price (BVC has precedence over the generic feed)
+        mark = MarkPriceStore.get_mark(ticker)
+        if not mark:
+            print(f"No price data found for {ticker}")
+            return jsonify({"message": f"Market data unavailable for {ticker}"}), 400
         
-        current_price = 0
-        if bvc_stock:
-            current_price = bvc_stock['price']
-            print(f"Found BVC price for {ticker}: {current_price}")
-        else:
-            # Fallback to standard FeedService (Crypto/Forex/US Stocks)
-            price_data = FeedService.get_price_data(ticker)
-            if not price_data:
-                print(f"No price data found for {ticker}")
-                return jsonify({"message": f"Market data unavailable for {ticker}"}), 400
-            current_price = price_data[-1]['close']
-            print(f"Found Feed price for {ticker}: {current_price}")
+        current_price = mark.price
+        print(f"Found {mark.source} price for {ticker}: {current_price}")
 
         quantity = amount / current_price
 
-        # Check Balance
-        if user.balance < amount:
+        # Deduct the amount (margin/cost for both BUY and SELL). Atomic: checks
+        # the balance on the current row, concurrent trades cannot overdraw it
+        try:
+            new_balance = Ledger.debit(user, amount)
+        except LedgerConflict as e:
+            return jsonify({"message": str(e)}), 409
+        if new_balance is None:
             print(f"Insufficient balance: {user.balance} < {amount}")
             return jsonify({"message": "Insufficient balance"}), 400
 
         # Execute Trade
+        TradingStatsService.record_open(user.id)
         trade = Trade(
             user_id=user.id,
             symbol=ticker,
@@ -102,30 +199,34 @@ def execute_trade():
             status='OPEN'
         )
 
-        # Update Balance (Deduct amount for both BUY and SELL as margin/cost)
-        user.balance -= amount
-
         db.session.add(trade)
-        db.session.commit()
+        db.session.flush()
+        account.add_position(trade)
+        trade_payload = {
+            "id": trade.id,
+            "ticker": trade.symbol,
+            "side": trade.type,
+            "amount": amount,
+            "quantity": quantity,
+            "entry_price": current_price,
+            "timestamp": trade.timestamp.isoformat(),
+            "status": "OPEN"
+        }
         
-        # Check risk rules after trade execution
-        risk_check = RiskManager.check_risk_rules(user.id)
+        # Check risk rules after trade execution: in the background when the
+        # risk queue runs, otherwise inline on the in-session state
+        risk_check = RiskQueue.PENDING if queued else RiskManager.check_risk_rules(user.id, account)
+        new_balance, account_status = user.balance, user.status
+        db.session.commit()
+        if queued:
+            risk_check = RiskQueue.submit(user.id, 'trade_opened')
 
         return jsonify({
             "message": "Trade executed successfully", 
-            "trade": {
-                "id": trade.id,
-                "ticker": trade.symbol,
-                "side": trade.type,
-                "amount": amount,
-                "quantity": quantity,
-                "entry_price": current_price,
-                "timestamp": trade.timestamp.isoformat(),
-                "status": "OPEN"
-            },
-            "new_balance": user.balance,
+            "trade": trade_payload,
+            "new_balance": new_balance,
             "risk_status": risk_check['status'],
-            "account_status": user.status
+            "account_status": account_status
         })
 
     except Exception as e:
@@ -142,20 +243,21 @@ def close_trade():
         if not email or not position_id:
             return jsonify({"message": "Missing email or position_id"}), 400
             
-        user = User.query.filter_by(username=email).first()
-        if not user:
+        account = AccountContext.for_email(email)
+        if not account:
              return jsonify({"message": "User not found"}), 404
+        user = account.user
              
-        trade = Trade.query.filter_by(id=position_id, user_id=user.id, status='OPEN').first()
+        trade = account.open_trade(_as_int(position_id))
         if not trade:
             return jsonify({"message": "Open position not found"}), 404
             
-        # Get current price
-        price_data = FeedService.get_price_data(trade.symbol)
-        if not price_data:
+        # Get current price (same source that filled the position)
+        mark = MarkPriceStore.get_mark(trade.symbol)
+        if not mark:
             return jsonify({"message": "Market data unavailable"}), 400
         
-        current_price = price_data[-1]['close']
+        current_price = mark.price
         
         # Calculate PnL
         if trade.type == 'BUY':
@@ -163,28 +265,45 @@ def close_trade():
         else: # SELL
             pnl = (trade.price - current_price) * trade.quantity
         
+        # Running aggregates and daily rollup (same transaction as the close)
+        close_time = datetime.utcnow()
+        TradingStatsService.record_close(user.id, round(pnl, 2), close_time)
+
         # Calculate initial amount (what was deducted when opening the position)
         initial_amount = trade.quantity * trade.price
             
-        # Return initial amount + pnl to balance
-        user.balance += initial_amount + pnl
-            
+        # Return initial amount + pnl to balance; claims the trade so a
+        # concurrent close of the same position cannot credit it twice
+        try:
+            settled = Ledger.settle(user, trade, initial_amount + pnl)
+        except LedgerConflict as e:
+            db.session.rollback()
+            return jsonify({"message": str(e)}), 409
+        if settled is None:
+            db.session.rollback()
+            return jsonify({"message": "Open position not found"}), 404
+
         trade.status = 'CLOSED'
         trade.close_price = current_price
-        trade.close_timestamp = datetime.utcnow()
+        trade.close_timestamp = close_time
         trade.pnl = round(pnl, 2)  # Round to 2 decimals
+        account.remove_position(trade.id)
         
+        # Check risk rules after closing position: in the background when the
+        # risk queue runs, otherwise inline on the in-session state
+        queued = RiskQueue.is_running()
+        risk_check = RiskQueue.PENDING if queued else RiskManager.check_risk_rules(user.id, account)
+        new_balance, account_status = user.balance, user.status
         db.session.commit()
-        
-        # Check risk rules after closing position
-        risk_check = RiskManager.check_risk_rules(user.id)
+        if queued:
+            risk_check = RiskQueue.submit(user.id, 'trade_closed')
         
         return jsonify({
             "message": "Position closed successfully",
             "pnl": round(pnl, 2),
-            "new_balance": user.balance,
+            "new_balance": new_balance,
             "risk_status": risk_check['status'],
-            "account_status": user.status,
+            "account_status": account_status,
             "violations": risk_check.get('violations', [])
         })
     except Exception as e:
@@ -333,10 +452,10 @@ def get_global_market_data():
         # 1. Fetch Crypto & Forex via FeedService
         for t in tickers:
             try:
-                data = FeedService.get_price_data(t['symbol'])
-                if data and len(data) >= 2:
-                    current = data[-1]['close']
-                    previous = data[0]['open'] # Or data[-2]['close'] for last candle change
+                series = FeedService.get_series(t['symbol'])
+                if len(series) >= 2:
+                    current = series.last_close
+                    previous = series.first_open # Or close[-2] for last candle change
                     # Calculate 24h change (approximate with what we have)
                     # For stability, let's use the difference between last close and first open of the fetched period
                     change_pct = ((current - previous) / previous) * 100
@@ -375,24 +494,43 @@ def get_global_market_data():
     except Exception as e:
         print(f"Global market data error: {e}")
         return jsonify({"error": str(e)}), 500
+
+def _as_int(value):
+    """Position ids arrive as JSON numbers or strings."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _catalog_response(name, data):
+    """JSON response for a cached market catalog, with its age in the Age header."""
+    response = jsonify(data)
+    age = FeedService.catalog_age(name)
+    if age is not None:
+        response.headers['Age'] = str(int(age))
+    return response
+
 @trading_bp.route('/market-data/watchlist', methods=['GET'])
+@cached_view('market.watchlist', ttl=10, version=lambda: FeedService.catalog_version('watchlist'))
 def get_watchlist_data():
     """
     Get real-time data for the default watchlist.
     """
     try:
         data = FeedService.get_watchlist_data()
-        return jsonify(data)
+        return _catalog_response('watchlist', data)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 @trading_bp.route('/market-data/trends', methods=['GET'])
+@cached_view('market.trends', ttl=10, version=lambda: FeedService.catalog_version('trends'))
 def get_market_trends():
     """
     Get live trends across all markets.
     """
     try:
         data = FeedService.get_market_trends()
-        return jsonify(data)
+        return _catalog_response('trends', data)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -403,7 +541,7 @@ def get_heatmap_data():
     """
     try:
         data = FeedService.get_market_heatmap()
-        return jsonify(data)
+        return _catalog_response('heatmap', data)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -414,6 +552,6 @@ def get_global_stats():
     """
     try:
         data = FeedService.get_global_market_stats()
-        return jsonify(data)
+        return _catalog_response('global_stats', data)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
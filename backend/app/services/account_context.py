@@ -0,0 +1,167 @@
+"""
+Account Context
+
+Request-scoped view of a trading account: the User row, its active
+UserChallenge and its open positions, each loaded at most once per request
+and shared by the routes, RiskManager and EquityEngine.
+
+A trade request used to look the user up by email, then again in can_trade,
+check_risk_rules and the equity calculation, and repeat the challenge and
+open-position queries for the post-trade risk check. With a context the
+account costs one query per piece of state; routes keep it in sync when they
+open or close a position instead of reloading it.
+"""
+
+from flask import g, has_app_context
+from sqlalchemy import func
+from ..models import db, User, Trade, UserChallenge
+
+_UNSET = object()
+
+
+class AccountContext:
+    """
+    One account's state for the duration of a request.
+
+    Attributes:
+        user (User): The account's user row
+        user_id (int): Its id
+    """
+
+    _G_KEY = '_account_contexts'
+
+    def __init__(self, user):
+        self.user = user
+        self.user_id = user.id
+        self._challenge = _UNSET
+        self._trades = None      # trade id -> Trade, open positions
+        self._positions = None   # trade id -> (id, symbol, type, quantity, price)
+
+    # --- Lookup -------------------------------------------------------------
+
+    @staticmethod
+    def for_user(user):
+        """
+        Context for an already-loaded user, shared for the rest of the request.
+
+        Args:
+            user (User): User row (must have an id)
+
+        Returns:
+            AccountContext
+        """
+        contexts = AccountContext._request_contexts()
+        if contexts is not None and user.id in contexts and contexts[user.id].user is user:
+            return contexts[user.id]
+
+        context = AccountContext(user)
+        if contexts is not None:
+            contexts[user.id] = context
+        return context
+
+    @staticmethod
+    def for_user_id(user_id):
+        """
+        Context for a user id (one lookup unless the request already has it).
+
+        Returns:
+            AccountContext or None if the user does not exist
+        """
+        contexts = AccountContext._request_contexts()
+        if contexts is not None and user_id in contexts:
+            return contexts[user_id]
+
+        user = db.session.get(User, user_id)
+        return AccountContext.for_user(user) if user else None
+
+    @staticmethod
+    def for_email(email, case_insensitive=False):
+        """
+        Context for the account whose username is `email`.
+
+        Args:
+            email (str): Username / email as sent by the client
+            case_insensitive (bool): Match lower(username) instead of the exact value
+
+        Returns:
+            AccountContext or None if no such user
+        """
+        if case_insensitive:
+            user = User.query.filter(func.lower(User.username) == email.strip().lower()).first()
+        else:
+            user = User.query.filter_by(username=email).first()
+        return AccountContext.for_user(user) if user else None
+
+    # --- Lazily loaded state ------------------------------------------------
+
+    @property
+    def active_challenge(self):
+        """The user's active UserChallenge, or None."""
+        if self._challenge is _UNSET:
+            self._challenge = UserChallenge.query.filter_by(
+                user_id=self.user_id, challenge_status='active'
+            ).first()
+        return self._challenge
+
+    def end_challenge(self):
+        """Forget the active challenge after it was passed or failed."""
+        self._challenge = None
+
+    @property
+    def positions(self):
+        """
+        Open positions as (id, symbol, type, quantity, price) tuples.
+
+        Plain tuples (not ORM rows) so reading them never triggers a refresh,
+        even after a commit expired the session.
+        """
+        self._load_positions()
+        return list(self._positions.values())
+
+    def open_trade(self, trade_id):
+        """The open Trade with this id owned by the account, or None."""
+        self._load_positions()
+        trade = self._trades.get(trade_id)
+        if trade is None or trade.status != 'OPEN':
+            return None
+        return trade
+
+    def add_position(self, trade):
+        """Record a trade opened in this request (call after it was flushed)."""
+        # Not loaded yet: a later load sees the flushed trade anyway
+        if self._positions is not None:
+            self._trades[trade.id] = trade
+            self._positions[trade.id] = AccountContext._position(trade)
+        self._positions_changed()
+
+    def remove_position(self, trade_id):
+        """Record a position closed in this request."""
+        if self._positions is not None:
+            self._trades.pop(trade_id, None)
+            self._positions.pop(trade_id, None)
+        self._positions_changed()
+
+    def _load_positions(self):
+        if self._positions is not None:
+            return
+        trades = Trade.query.filter_by(user_id=self.user_id, status='OPEN').all()
+        self._trades = {trade.id: trade for trade in trades}
+        self._positions = {trade.id: AccountContext._position(trade) for trade in trades}
+
+    def _positions_changed(self):
+        from .equity_engine import EquityEngine
+        EquityEngine.invalidate(self.user_id)
+
+    @staticmethod
+    def _position(trade):
+        return (trade.id, trade.symbol, trade.type, trade.quantity, trade.price)
+
+    @staticmethod
+    def _request_contexts():
+        if not has_app_context():
+            return None
+        contexts = g.get(AccountContext._G_KEY)
+        if contexts is None:
+            contexts = {}
+            setattr(g, AccountContext._G_KEY, contexts)
+        return contexts
@@ -1,7 +1,15 @@
+import hashlib
 import random
 import os
+import re
+import threading
+import time
+import unicodedata
+from app.services.bounded_cache import BoundedCache
+from app.services.single_flight import SingleFlight
 from app.services.bvc_service import BVCService
 from app.services.news_service import NewsService
+from app.services.sentiment import HeadlineSentiment
 
 # Import Google Gemini
 try:
@@ -18,7 +26,23 @@ except ImportError:
     GROQ_AVAILABLE = False
 
 class AIService:
-    
+    _RESPONSE_TTL = 60  # identical questions on the same market data within a minute share an answer
+
+    # normalized message + market context version -> response
+    _responses = BoundedCache('ai.responses', max_entries=512, max_bytes=2 * 1024 * 1024, ttl=_RESPONSE_TTL)
+    _flight = SingleFlight(timeout=90)  # identical concurrent questions share one upstream call
+    _clients = {}  # (provider, api key) -> long-lived model / client
+    _clients_lock = threading.Lock()
+    _stub_calls = 0
+
+    @staticmethod
+    def _provider():
+        """
+        AI_PROVIDER: 'auto' (default, Gemini then Groq then the built-in
+        answers) or 'stub' (local deterministic model, for offline tests).
+        """
+        return os.getenv('AI_PROVIDER', 'auto').lower()
+
     @staticmethod
     def _get_gemini_key():
         """Get Gemini API key dynamically"""
@@ -30,30 +54,48 @@ class AIService:
         return os.getenv('GROQ_API_KEY', '')
     
     @staticmethod
-    def _configure_gemini():
-        """Configure Gemini API if available"""
+    def _client(provider, api_key, factory):
+        """Client built once per provider and API key, reused by every request."""
+        key = (provider, api_key)
+        client = AIService._clients.get(key)
+        if client is None:
+            with AIService._clients_lock:
+                client = AIService._clients.get(key)
+                if client is None:
+                    client = factory()
+                    # A rotated key replaces the old client
+                    for old in [k for k in AIService._clients if k[0] == provider]:
+                        del AIService._clients[old]
+                    AIService._clients[key] = client
+        return client
+
+    @staticmethod
+    def _gemini_model():
+        """Gemini model, or None if the SDK or the API key is missing"""
         api_key = AIService._get_gemini_key()
-        if GEMINI_AVAILABLE and api_key:
-            try:
-                genai.configure(api_key=api_key)
-                return True
-            except Exception as e:
-                print(f"Error configuring Gemini: {e}")
-                return False
-        return False
+        if not GEMINI_AVAILABLE or not api_key:
+            return None
+
+        def create():
+            genai.configure(api_key=api_key)
+            # gemini-2.0-flash (fast and available)
+            return genai.GenerativeModel('gemini-2.0-flash')
+        try:
+            return AIService._client('gemini', api_key, create)
+        except Exception as e:
+            print(f"Error configuring Gemini: {e}")
+            return None
     
     @staticmethod
     def get_gemini_response(message, market_context=""):
         """
         Get response from Google Gemini AI with market context
         """
-        if not AIService._configure_gemini():
+        model = AIService._gemini_model()
+        if model is None:
             return None
             
         try:
-            # Create the model - using gemini-2.0-flash (fast and available)
-            model = genai.GenerativeModel('gemini-2.0-flash')
-            
             # Build the prompt with context
             system_prompt = """Tu es TradeSense Copilot, un assistant IA expert en trading et marchés financiers.
 Tu es spécialisé dans le marché boursier marocain (BVC - Bourse de Casablanca) et les crypto-monnaies.
@@ -88,7 +130,7 @@ Réponds toujours en français."""
             return None
             
         try:
-            client = Groq(api_key=api_key)
+            client = AIService._client('groq', api_key, lambda: Groq(api_key=api_key))
             
             # Build the system prompt
             system_prompt = """Tu es TradeSense Copilot, un assistant IA expert en trading et marchés financiers.
@@ -123,11 +165,44 @@ Réponds toujours en français."""
             print(f"Error getting Groq response: {e}")
             return None
     
+    @staticmethod
+    def get_stub_response(message, market_context=""):
+        """
+        Local deterministic model (AI_PROVIDER=stub): answers without any
+        network call. AI_STUB_DELAY (seconds) simulates upstream latency.
+        """
+        delay = float(os.getenv('AI_STUB_DELAY', '0') or 0)
+        if delay:
+            time.sleep(delay)
+        AIService._stub_calls += 1
+        context_lines = len([line for line in market_context.splitlines() if line.startswith('- ')])
+        return f"[stub] Réponse à « {message.strip()} » ({context_lines} valeurs BVC en contexte)"
+
     @staticmethod
     def get_response(message):
-        message_lower = message.lower()
-        
-        # Get market data context
+        """
+        Answer a chat message. Identical questions (after normalization) on the
+        same market data are answered from cache for _RESPONSE_TTL seconds;
+        identical questions arriving together wait for a single upstream call.
+        """
+        market_context, bvc_data = AIService._market_context()
+        key = AIService._response_key(message, market_context)
+        cached = AIService._responses.get(key)
+        if cached is not None:
+            return cached
+
+        def answer():
+            response = AIService._answer(message, market_context, bvc_data)
+            AIService._responses.set(key, response)
+            return response
+        return AIService._flight.do(key, answer)
+
+    @staticmethod
+    def _market_context():
+        """
+        Returns:
+            tuple: (market context text for the prompt, BVC stock list)
+        """
         market_context = ""
         bvc_data = []
         
@@ -140,7 +215,28 @@ Réponds toujours en français."""
         except Exception as e:
             print(f"Error fetching BVC data: {e}")
             bvc_data = []
-        
+        return market_context, bvc_data
+
+    @staticmethod
+    def _response_key(message, market_context):
+        """
+        Cache key: provider, market context version and the message
+        normalized (case, Unicode form, punctuation and spacing ignored), so
+        "Prix IAM" and "prix iam ?" share an answer until the data changes.
+        """
+        text = unicodedata.normalize('NFKC', message).lower()
+        text = ' '.join(re.sub(r'[^\w\s]', ' ', text).split())
+        context_version = hashlib.sha1(market_context.encode('utf-8')).hexdigest()[:12]
+        return f"{AIService._provider()}|{context_version}|{text}"
+
+    @staticmethod
+    def _answer(message, market_context, bvc_data):
+        """Ask the configured model, falling back to the built-in answers"""
+        message_lower = message.lower()
+
+        if AIService._provider() == 'stub':
+            return AIService.get_stub_response(message, market_context)
+
         # Try Gemini AI first
         print("[DEBUG] Trying Gemini API...")
         gemini_response = AIService.get_gemini_response(message, market_context)
@@ -185,12 +281,15 @@ Les principaux risques aujourd'hui sont :
             return "Bonjour ! Je suis votre assistant TradeSense Copilot 🤖\n\nJe peux vous aider avec :\n• Analyse du marché BVC 📊\n• Conseils de gestion des risques ⚠️\n• Dernières actualités 📰\n• Stratégies de trading 💡\n\nQue souhaitez-vous savoir ?"
             
         if "tendance" in message_lower or "marché" in message_lower or "market" in message_lower:
+            news_mood = AIService._news_mood()
             if bvc_data:
                 positive_count = sum(1 for stock in bvc_data if stock['change'] > 0)
                 total = len(bvc_data)
                 sentiment = "haussier 📈" if positive_count > total / 2 else "baissier 📉"
                 iam_price = next((s['price'] for s in bvc_data if s['symbol'] == 'IAM'), 'N/A')
-                return f"**Analyse de Marché BVC**\n\nLe marché semble globalement {sentiment} aujourd'hui.\n\n• {positive_count} actions en hausse sur {total} surveillées\n• IAM (Maroc Telecom) : {iam_price} MAD\n• Sentiment général : {sentiment.replace('📈', '').replace('📉', '')}\n\n💡 Surveillez les cassures de support/résistance pour vos entrées."
+                return f"**Analyse de Marché BVC**\n\nLe marché semble globalement {sentiment} aujourd'hui.\n\n• {positive_count} actions en hausse sur {total} surveillées\n• IAM (Maroc Telecom) : {iam_price} MAD\n• Sentiment général : {sentiment.replace('📈', '').replace('📉', '')}{news_mood}\n\n💡 Surveillez les cassures de support/résistance pour vos entrées."
+            if news_mood:
+                return f"**Analyse de Marché**\n\nDonnées BVC indisponibles pour le moment.{news_mood}"
             return "📊 Impossible d'accéder aux données de marché actuellement. Vérifiez votre connexion."
 
         if "iam" in message_lower or "maroc telecom" in message_lower:
@@ -287,6 +386,29 @@ Les principaux risques aujourd'hui sont :
 
 Que souhaitez-vous savoir ? 😊"""
 
+    @staticmethod
+    def _news_mood():
+        """
+        Tone of the latest headlines for the fallback answers.
+
+        Returns:
+            str: Bullet line, or '' if no news is available
+        """
+        try:
+            titles = [item['title'] for item in NewsService.get_market_news()[:10]]
+        except Exception as e:
+            print(f"Error fetching news: {e}")
+            return ""
+        if not titles:
+            return ""
+        scores = HeadlineSentiment.score_batch(titles)
+        positive = sum(1 for score in scores if HeadlineSentiment.label(score) == 'POSITIVE')
+        negative = sum(1 for score in scores if HeadlineSentiment.label(score) == 'NEGATIVE')
+        mood = {"POSITIVE": "plutôt positif 🟢", "NEGATIVE": "plutôt négatif 🔴"}.get(
+            HeadlineSentiment.label(sum(scores) / len(scores)), "neutre ⚪"
+        )
+        return f"\n• Ton des actualités : {mood} ({positive} titres positifs, {negative} négatifs sur {len(titles)})"
+
     @staticmethod
     def generate_signal(symbol):
         """
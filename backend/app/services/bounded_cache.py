@@ -0,0 +1,167 @@
+"""
+Bounded in-memory cache.
+
+A small thread-safe LRU cache with optional per-entry TTL, entry-count and
+byte-size limits, and hit/miss/eviction counters. Caches register themselves
+by name so their counters can be exposed on the admin metrics endpoint.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_size(value):
+    """
+    Cheap approximation of a value's memory footprint in bytes.
+
+    NumPy-backed objects report `nbytes`; containers are measured one level
+    deep, which is enough to rank entries for eviction.
+    """
+    nbytes = getattr(value, 'nbytes', None)
+    if nbytes is not None:
+        return int(nbytes)
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(estimate_size(item) if isinstance(item, (dict, tuple)) else sys.getsizeof(item)
+                    for item in value)
+    return size
+
+
+class BoundedCache:
+    """
+    LRU cache bounded by entry count and (optionally) total bytes.
+
+    Expired entries count as misses for `get` but are kept until evicted, so
+    callers can still serve them as stale values through `peek`.
+    """
+
+    _registry = {}
+
+    def __init__(self, name, max_entries=1000, max_bytes=None, ttl=None, sizeof=estimate_size):
+        """
+        Args:
+            name (str): Registry name shown on the metrics endpoint
+            max_entries (int): Maximum number of keys
+            max_bytes (int, optional): Maximum estimated total size
+            ttl (float, optional): Default time-to-live in seconds (None = no expiry)
+            sizeof (callable): Size estimator for values
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sizeof = sizeof
+        self._entries = OrderedDict()  # key -> (value, stored_at, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        BoundedCache._registry[name] = self
+
+    def get(self, key, default=None):
+        """Return a live value (refreshing its LRU position) or `default`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, _, expires_at, _ = entry
+            if expires_at is not None and time.time() >= expires_at:
+                self.misses += 1
+                self.expirations += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key):
+        """
+        Return (value, age_seconds) even if expired, or None. Does not touch
+        counters or LRU order.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            return entry[0], time.time() - entry[1]
+
+    def stored_at(self, key):
+        """Epoch time the current value of `key` was stored, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry else None
+
+    def set(self, key, value, ttl=None):
+        """Store a value, evicting least recently used entries if over limits."""
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        size = self._sizeof(value) if self.max_bytes else 0
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[3]
+            self._entries[key] = (value, now, now + ttl if ttl else None, size)
+            self._bytes += size
+            self._evict()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return default
+            self._bytes -= entry[3]
+            return entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries.keys())
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes if self.max_bytes else None,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / lookups * 100, 2) if lookups else 0.0
+            }
+
+    @staticmethod
+    def all_stats():
+        """Counters of every registered cache, sorted by name."""
+        return [BoundedCache._registry[name].stats() for name in sorted(BoundedCache._registry)]
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes and self._bytes > self.max_bytes and len(self._entries) > 1)
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry[3]
+            self.evictions += 1
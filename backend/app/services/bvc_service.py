@@ -3,25 +3,43 @@ import requests
 from bs4 import BeautifulSoup
 import random
 import time
+from .bounded_cache import BoundedCache
+from .mark_price_store import MarkPriceStore
+from .single_flight import SingleFlight
 
 class BVCService:
     BASE_URL = "https://www.leboursier.ma/cote-de-la-bourse" # Using a public financial news site as proxy for easier scraping than official BVC site which might be complex
     # Alternatively use: https://www.richbourse.com/bourse/cotations/actions
 
-    _cache = None
-    _last_update = 0
+    # Symbols we quote from the Casablanca exchange; the generic feed never prices them
+    SYMBOLS = frozenset({'IAM', 'ATW', 'BCP', 'ADH', 'LHM', 'CIMR', 'RDS'})
+
     _CACHE_DURATION = 60 # 1 minute cache for scraping
+    _cache = BoundedCache('bvc', max_entries=1, ttl=_CACHE_DURATION)
+    _last_update = 0
+    _flight = SingleFlight()
 
     @staticmethod
     def get_market_data():
         """
         Scrapes the latest prices for major Moroccan stocks with caching.
         """
-        current_time = time.time()
-        if BVCService._cache and (current_time - BVCService._last_update < BVCService._CACHE_DURATION):
+        cached = BVCService._cache.get('market')
+        if cached:
             # print("Returning cached BVC data")
-            return BVCService._cache
+            return cached
+
+        # One scrape at a time; concurrent callers get the stale list meanwhile
+        stale = BVCService._cache.peek('market')
+        return BVCService._flight.do('market', BVCService._fetch_market_data,
+                                     stale=stale[0] if stale else None)
 
+    @staticmethod
+    def _fetch_market_data():
+        """
+        Scrapes richbourse (falls back to mock data) and refreshes the cache.
+        """
+        current_time = time.time()
         try:
             # Target URL: RichBourse (often cleaner for scraping)
             url = "https://www.richbourse.com/bourse/cotations/actions"
@@ -74,8 +92,9 @@ class BVCService:
                                 
                     if live_data:
                         # print(f"Successfully scraped {len(live_data)} BVC stocks")
-                        BVCService._cache = live_data
+                        BVCService._cache.set('market', live_data)
                         BVCService._last_update = current_time
+                        BVCService._publish_marks(live_data, current_time)
                         return live_data
 
             # If scraping fails or returns empty, fall through to mock
@@ -110,10 +129,20 @@ class BVCService:
                     'market': 'BVC'
                 })
                 
-            BVCService._cache = live_data
+            BVCService._cache.set('market', live_data)
             BVCService._last_update = current_time
+            BVCService._publish_marks(live_data, current_time)
             return live_data
 
+    @staticmethod
+    def _publish_marks(live_data, timestamp):
+        """Push the freshly fetched prices to the shared mark store."""
+        MarkPriceStore.update_many(
+            {stock['symbol']: stock['price'] for stock in live_data},
+            MarkPriceStore.SOURCE_BVC,
+            timestamp
+        )
+
     @staticmethod
     def get_stock_price(ticker):
         data = BVCService.get_market_data()
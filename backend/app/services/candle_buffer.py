@@ -0,0 +1,158 @@
+"""
+Rolling candle buffer used by FeedService for simulated market data.
+
+Each symbol keeps a fixed-capacity ring buffer of 5-minute candles stored as
+NumPy columns. Ticks only append the candles that elapsed since the previous
+tick (and move the forming candle), so steady-state cost is O(new candles) and
+chart history stays continuous across refreshes.
+"""
+
+import math
+import numpy as np
+from .ohlcv import OHLCVSeries, COLUMNS
+
+
+class CandleBuffer:
+    """
+    Fixed-capacity random-walk (GBM) candle history for one symbol.
+    """
+
+    DEFAULT_CAPACITY = 100
+    INTERVAL = 300  # 5 min candles
+
+    def __init__(self, ticker, capacity=DEFAULT_CAPACITY, interval=INTERVAL, last_close=None):
+        """
+        Args:
+            last_close (float, optional): Price to continue from (a rebuilt
+                buffer must not jump back to the base price)
+        """
+        self.ticker = ticker
+        self.capacity = capacity
+        self.interval = interval
+        self.last_tick = None
+        self._rng = np.random.default_rng()
+
+        # Ring storage: _head is the slot of the oldest candle once full
+        self._columns = {
+            column: np.zeros(capacity, dtype=np.int64 if column in ('time', 'volume') else np.float64)
+            for column in COLUMNS
+        }
+        self._head = 0
+        self._size = 0
+
+        # Base parameters
+        self._seeded = bool(last_close)
+        if last_close:
+            self.last_close = float(last_close)
+        elif "BTC" in ticker:
+            self.last_close = 45000.0
+        elif "ETH" in ticker:
+            self.last_close = 2500.0
+        elif "EUR" in ticker or "GBP" in ticker:
+            self.last_close = 1.10
+        else:
+            self.last_close = 100.0
+
+        if "BTC" in ticker:
+            self.volatility = 0.002  # 0.2% per candle
+        elif "ETH" in ticker:
+            self.volatility = 0.003
+        else:
+            self.volatility = 0.01
+
+        self.volume_base = 1000000 if "BTC" in ticker else 50000
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self._columns.values())
+
+    def advance(self, now):
+        """
+        Bring the buffer up to `now`.
+
+        Args:
+            now (float): Current epoch time in seconds
+
+        Returns:
+            int: Number of candles appended (the forming candle may also move)
+        """
+        bucket = int(now) - (int(now) % self.interval)
+
+        if not self._size:
+            # Cold start: back-fill a full window ending at the current bucket
+            anchor = self.last_close if self._seeded else None
+            self._append(bucket - (self.capacity - 1) * self.interval, self.capacity)
+            if anchor:
+                # Continuing a known price: the window ends at it instead of starting there
+                ratio = anchor / self.last_close
+                for column in ('open', 'high', 'low', 'close'):
+                    self._columns[column][:self._size] = np.round(self._columns[column][:self._size] * ratio, 2)
+                self.last_close = anchor
+            self.last_tick = now
+            return self.capacity
+
+        last_time = int(self._columns['time'][self._last_index()])
+        missing = (bucket - last_time) // self.interval
+
+        if missing <= 0:
+            self._update_forming(now)
+            self.last_tick = now
+            return 0
+
+        # Anything older than the window would be evicted immediately
+        start = max(last_time + self.interval, bucket - (self.capacity - 1) * self.interval)
+        count = (bucket - start) // self.interval + 1
+        self._append(start, count)
+        self.last_tick = now
+        return count
+
+    def window(self, num_candles=None):
+        """
+        Return the current window as an OHLCVSeries, oldest first.
+
+        The series owns its arrays, so later ticks never alter a window that
+        was already handed out (e.g. one sitting in FeedService's cache).
+
+        Args:
+            num_candles (int, optional): Only the most recent N candles
+        """
+        order = (self._head + np.arange(self._size)) % self.capacity
+        if num_candles is not None and num_candles < self._size:
+            order = order[-num_candles:]
+        return OHLCVSeries(*(self._columns[column][order] for column in COLUMNS))
+
+    def _last_index(self):
+        return (self._head + self._size - 1) % self.capacity
+
+    def _append(self, start_time, count):
+        series, self.last_close = OHLCVSeries.random_walk(
+            start_time, count, self.interval, self.last_close,
+            self.volatility, self.volume_base, rng=self._rng
+        )
+
+        slots = (self._head + self._size + np.arange(count)) % self.capacity
+        for column in COLUMNS:
+            self._columns[column][slots] = getattr(series, column)
+
+        overflow = max(0, self._size + count - self.capacity)
+        self._head = (self._head + overflow) % self.capacity
+        self._size = min(self.capacity, self._size + count)
+
+    def _update_forming(self, now):
+        """Move the close of the current candle by a step scaled to the elapsed time."""
+        elapsed = max(0.0, now - (self.last_tick or now))
+        if elapsed <= 0:
+            return
+
+        sigma = self.volatility * math.sqrt(min(elapsed, self.interval) / self.interval)
+        self.last_close *= 1 + self._rng.normal(0, sigma)
+        close = round(self.last_close, 2)
+
+        i = self._last_index()
+        self._columns['close'][i] = close
+        self._columns['high'][i] = max(self._columns['high'][i], close)
+        self._columns['low'][i] = min(self._columns['low'][i], close)
+        self._columns['volume'][i] += int(self.volume_base * self._rng.uniform(0, 0.05))
@@ -0,0 +1,188 @@
+"""
+Change Log
+
+Cross-process invalidation for the in-memory caches. Each gunicorn worker
+keeps its own caches (HTTP responses, leaderboards) and only sees its own
+commits through the session events; the other workers' commits reach it
+through the change_log table:
+
+- changes are staged on the session while it flushes (`stage`) and written
+  as one row per changed item (topic, item id, origin = host + pid) in the
+  same transaction, just before the outer commit: the rows commit or roll
+  back with the data they describe, without a second connection;
+- on read, a process fetches the rows it has not seen yet, at most once per
+  POLL_INTERVAL, and hands the other processes' changes to the callbacks
+  subscribed to their topic.
+
+So a cache is at most about POLL_INTERVAL behind a commit made in another
+worker. Ids may become visible out of order on a concurrent database: rows
+are re-read for SETTLE_SECONDS and delivered once. Rows are pruned after
+RETENTION; a process that did not poll for half of it resets its
+subscribers instead of trusting the log.
+"""
+
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from ..models import db, ChangeLogEntry
+
+
+class ChangeLog:
+    """
+    Publishes committed changes and delivers the other processes' ones.
+    """
+
+    POLL_INTERVAL = 1.0   # seconds between two reads of the log, per process
+    SETTLE_SECONDS = 10   # a row is visible at most this long after taking its id
+    RETENTION = 3600      # seconds a row is kept
+    PRUNE_INTERVAL = 300
+
+    _subscribers = {}     # topic -> [callback(item_ids)], item_ids is a set or None (everything)
+    _origin = None        # (pid, tag)
+    _floor = None         # every row with id <= floor has been read
+    _marks = []           # (polled_at, highest id read), to move the floor once settled
+    _seen = set()         # ids > floor already delivered
+    _polled_at = 0.0
+    _pruned_at = 0.0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def subscribe(topic, callback):
+        """
+        Args:
+            topic (str): Topic name
+            callback (callable): Called with the set of changed item ids, or
+                None when the whole topic must be considered changed
+        """
+        with ChangeLog._lock:
+            ChangeLog._subscribers.setdefault(topic, []).append(callback)
+
+    @staticmethod
+    def origin():
+        """Tag of the current process (renewed after a fork)."""
+        origin = ChangeLog._origin
+        if origin is None or origin[0] != os.getpid():
+            tag = f"{socket.gethostname()[:15]}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+            origin = ChangeLog._origin = (os.getpid(), tag[:32])
+        return origin[1]
+
+    @staticmethod
+    def stage(session, topic, item_ids=None):
+        """
+        Announce a change to the other processes when the session's outer
+        transaction commits (dropped if it rolls back).
+
+        Args:
+            session: Session making the change
+            topic (str): Topic name
+            item_ids (iterable, optional): Changed items; None for the whole topic
+        """
+        staged = session.info.setdefault('change_log', {})
+        ids = staged.setdefault(topic, set())
+        if item_ids is None:
+            ids.add(None)
+        else:
+            ids.update(item_ids)
+
+    @staticmethod
+    def poll():
+        """
+        Deliver the changes committed by other processes since the last poll
+        (no-op if the last poll is less than POLL_INTERVAL old).
+        """
+        now = time.time()
+        if now - ChangeLog._polled_at < ChangeLog.POLL_INTERVAL:
+            return
+        with ChangeLog._lock:
+            if now - ChangeLog._polled_at < ChangeLog.POLL_INTERVAL:
+                return
+            missed = ChangeLog._floor is not None and now - ChangeLog._polled_at > ChangeLog.RETENTION / 2
+            ChangeLog._polled_at = now
+            try:
+                rows = ChangeLog._read(now, reset=ChangeLog._floor is None or missed)
+            except SQLAlchemyError as e:
+                print(f"ChangeLog: cannot poll: {e}", flush=True)
+                return
+
+            origin = ChangeLog.origin()
+            changes = {}
+            for row in rows:
+                if row.id in ChangeLog._seen:
+                    continue
+                ChangeLog._seen.add(row.id)
+                if row.origin != origin:
+                    changes.setdefault(row.topic, set()).add(row.item_id)
+            ChangeLog._settle(now, rows)
+            subscribers = {topic: list(callbacks) for topic, callbacks in ChangeLog._subscribers.items()}
+
+        # Callbacks run outside the lock: they take their own cache locks
+        for topic, callbacks in subscribers.items():
+            if missed:
+                item_ids = None
+            elif topic in changes:
+                item_ids = None if None in changes[topic] else changes[topic]
+            else:
+                continue
+            for callback in callbacks:
+                callback(item_ids)
+
+    @staticmethod
+    def _settle(now, rows):
+        """Move the floor to the highest id read SETTLE_SECONDS ago: lower ids can no longer appear."""
+        last_id = max([ChangeLog._marks[-1][1]] + [row.id for row in rows])
+        ChangeLog._marks.append((now, last_id))
+        while len(ChangeLog._marks) > 1 and ChangeLog._marks[1][0] <= now - ChangeLog.SETTLE_SECONDS:
+            ChangeLog._marks.pop(0)
+        floor = ChangeLog._marks[0][1]
+        if ChangeLog._marks[0][0] <= now - ChangeLog.SETTLE_SECONDS and floor > ChangeLog._floor:
+            ChangeLog._floor = floor
+            ChangeLog._seen = {i for i in ChangeLog._seen if i > floor}
+
+    @staticmethod
+    def _read(now, reset):
+        with db.engine.connect() as conn:
+            if reset:
+                # Caches built from now on already include the older rows
+                last_id = conn.execute(select(func.max(ChangeLogEntry.id))).scalar() or 0
+                ChangeLog._floor, ChangeLog._marks, ChangeLog._seen = last_id, [(now, last_id)], set()
+                rows = []
+            else:
+                rows = conn.execute(
+                    select(ChangeLogEntry.id, ChangeLogEntry.topic, ChangeLogEntry.item_id, ChangeLogEntry.origin)
+                    .where(ChangeLogEntry.id > ChangeLog._floor)
+                    .order_by(ChangeLogEntry.id)
+                ).all()
+
+            if now - ChangeLog._pruned_at > ChangeLog.PRUNE_INTERVAL:
+                ChangeLog._pruned_at = now
+                cutoff = datetime.utcnow() - timedelta(seconds=ChangeLog.RETENTION)
+                conn.execute(delete(ChangeLogEntry).where(ChangeLogEntry.created_at < cutoff))
+                conn.commit()
+        return rows
+
+
+@event.listens_for(db.session, 'before_commit')
+def _write_staged(session):
+    if session.in_nested_transaction():
+        return
+    # Flush first: the last flush may stage more changes
+    session.flush()
+    staged = session.info.pop('change_log', None)
+    if not staged:
+        return
+    origin = ChangeLog.origin()
+    session.execute(insert(ChangeLogEntry), [
+        {'topic': topic, 'item_id': item_id, 'origin': origin}
+        for topic, ids in staged.items() for item_id in ids
+    ])
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_staged(session):
+    if not session.in_nested_transaction():
+        session.info.pop('change_log', None)
@@ -0,0 +1,199 @@
+"""
+Economic calendar.
+
+Events come from app/data/economic_calendar.json, a list of recurring macro
+releases (weekly or monthly, UTC). They are expanded into dated occurrences
+over a window around today and kept sorted by timestamp, globally and per
+currency, so a range query is two bisections plus the filters on the slice.
+Forecast / actual figures are derived from a hash of the occurrence, so the
+same event always shows the same numbers.
+
+Views (the default day view and every filtered range) are cached per
+BUCKET_SECONDS time bucket: the dashboard polls every minute and only the
+COMPLETED / UPCOMING status changes with time.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from heapq import merge
+from .bounded_cache import BoundedCache
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'economic_calendar.json')
+
+
+class EconomicCalendar:
+    BUCKET_SECONDS = 60
+    DAYS_BACK = 31     # the index covers [today - DAYS_BACK, today + DAYS_AHEAD]
+    DAYS_AHEAD = 62
+    DAY_VIEW_PAST = timedelta(hours=12)
+    DAY_VIEW_AHEAD = timedelta(hours=24)
+
+    _views = BoundedCache('calendar.views', max_entries=128, ttl=BUCKET_SECONDS)
+    _index = None  # {'key': (first day, file mtime), 'all': (timestamps, events), 'by_currency': {...}}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def day_view(now=None):
+        """
+        Events of the last 12 hours and the next 24 (the dashboard widget).
+
+        Returns:
+            list: Event dicts sorted by timestamp
+        """
+        now = now or datetime.utcnow()
+        return EconomicCalendar.events(now - EconomicCalendar.DAY_VIEW_PAST,
+                                       now + EconomicCalendar.DAY_VIEW_AHEAD, now=now)
+
+    @staticmethod
+    def events(start, end, currencies=None, impacts=None, now=None):
+        """
+        Events between two dates, optionally filtered.
+
+        Args:
+            start (datetime): Range start (naive UTC, inclusive)
+            end (datetime): Range end (naive UTC, inclusive)
+            currencies (list, optional): Currencies to keep (USD, EUR, MAD...)
+            impacts (list, optional): Impacts to keep (HIGH, MEDIUM, LOW)
+            now (datetime, optional): Reference time for the event status
+
+        Returns:
+            list: Event dicts sorted by timestamp; the range is clipped to
+            the indexed window
+        """
+        now = now or datetime.utcnow()
+        currencies = tuple(sorted({c.upper() for c in currencies})) if currencies else None
+        impacts = frozenset(i.upper() for i in impacts) if impacts else None
+        # Events fall on whole minutes: rounding the bounds inward to the minute
+        # keeps the same events and gives every request of a bucket the same key
+        start = _ceil_minute(start)
+        end = end.replace(second=0, microsecond=0)
+        key = (int(now.timestamp() // EconomicCalendar.BUCKET_SECONDS), start, end, currencies,
+               tuple(sorted(impacts)) if impacts else None)
+        cached = EconomicCalendar._views.get(key)
+        if cached is not None:
+            return cached
+
+        index = EconomicCalendar._current_index(now)
+        if currencies:
+            sources = [index['by_currency'][c] for c in currencies if c in index['by_currency']]
+        else:
+            sources = [index['all']]
+        slices = [events[bisect_left(timestamps, start):bisect_right(timestamps, end)]
+                  for timestamps, events in sources]
+        selected = merge(*slices, key=lambda event: event['timestamp']) if len(slices) > 1 else (slices[0] if slices else [])
+
+        view = [EconomicCalendar._view(event, now) for event in selected
+                if impacts is None or event['impact'] in impacts]
+        EconomicCalendar._views.set(key, view)
+        return view
+
+    @staticmethod
+    def _view(event, now):
+        completed = event['timestamp'] <= now
+        return {
+            "id": event['id'],
+            "time": event['timestamp'].strftime("%H:%M"),
+            "timestamp": event['timestamp'].isoformat(),
+            "title": event['title'],
+            "currency": event['currency'],
+            "impact": event['impact'],
+            "forecast": event['forecast'],
+            "actual": event['actual'] if completed else "-",
+            "status": "COMPLETED" if completed else "UPCOMING"
+        }
+
+    @staticmethod
+    def _current_index(now):
+        """The sorted index for today's window, rebuilt when the day or the data file changes."""
+        first_day = (now - timedelta(days=EconomicCalendar.DAYS_BACK)).date()
+        try:
+            mtime = os.path.getmtime(DATA_FILE)
+        except OSError:
+            mtime = None
+        index = EconomicCalendar._index
+        if index is not None and index['key'] == (first_day, mtime):
+            return index
+
+        with EconomicCalendar._lock:
+            index = EconomicCalendar._index
+            if index is None or index['key'] != (first_day, mtime):
+                last_day = now.date() + timedelta(days=EconomicCalendar.DAYS_AHEAD)
+                index = EconomicCalendar._build(EconomicCalendar._load(), first_day, last_day)
+                index['key'] = (first_day, mtime)
+                EconomicCalendar._index = index
+                EconomicCalendar._views.clear()
+        return index
+
+    @staticmethod
+    def _load():
+        try:
+            with open(DATA_FILE, encoding='utf-8') as f:
+                return json.load(f)['events']
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Economic calendar: cannot read {DATA_FILE}: {e}")
+            return []
+
+    @staticmethod
+    def _build(specs, first_day, last_day):
+        """Expand the recurring events over [first_day, last_day] and sort them."""
+        events = []
+        day = first_day
+        while day <= last_day:
+            for spec in specs:
+                if EconomicCalendar._occurs(spec, day):
+                    events.append(EconomicCalendar._occurrence(spec, day))
+            day += timedelta(days=1)
+        events.sort(key=lambda event: (event['timestamp'], event['id']))
+
+        by_currency = {}
+        for event in events:
+            by_currency.setdefault(event['currency'], []).append(event)
+        return {
+            'all': ([e['timestamp'] for e in events], events),
+            'by_currency': {c: ([e['timestamp'] for e in evts], evts) for c, evts in by_currency.items()}
+        }
+
+    @staticmethod
+    def _occurs(spec, day):
+        if spec.get('every') == 'week':
+            return day.weekday() == spec['weekday']
+        if spec.get('every') == 'month':
+            return day.day == spec['day'] and day.month in spec.get('months', range(1, 13))
+        return False
+
+    @staticmethod
+    def _occurrence(spec, day):
+        hour, minute = map(int, spec['time'].split(':'))
+        occurrence_id = f"{spec['id']}_{day:%Y%m%d}"
+        forecast = actual = "-"
+        if 'base' in spec:
+            spread = spec.get('spread', 0)
+            forecast_value = spec['base'] + spread * (2 * _unit_hash(occurrence_id, 'forecast') - 1)
+            actual_value = forecast_value + spread * (_unit_hash(occurrence_id, 'actual') - 0.5)
+            decimals, unit = spec.get('decimals', 1), spec.get('unit', '')
+            forecast = f"{forecast_value:.{decimals}f}{unit}"
+            actual = f"{actual_value:.{decimals}f}{unit}"
+        return {
+            "id": occurrence_id,
+            "timestamp": datetime(day.year, day.month, day.day, hour, minute),
+            "title": spec['title'],
+            "currency": spec['currency'],
+            "impact": spec['impact'],
+            "forecast": forecast,
+            "actual": actual
+        }
+
+
+def _ceil_minute(value):
+    floor = value.replace(second=0, microsecond=0)
+    return floor if floor == value else floor + timedelta(minutes=1)
+
+
+def _unit_hash(*parts):
+    """Deterministic float in [0, 1] for the given parts."""
+    digest = hashlib.sha1(':'.join(parts).encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'big') / 0xFFFFFFFF
@@ -0,0 +1,184 @@
+"""
+Equity Engine
+
+Computes a user's mark-to-market equity in a single pass: open positions are
+loaded with one query, each distinct symbol is priced once, and unrealized P&L
+is computed vectorized over the whole position set.
+
+The resulting snapshot is memoized for the duration of the request so that
+RiskManager.check_risk_rules, can_trade and get_risk_metrics share it. Callers
+holding an AccountContext pass its positions and skip the positions query.
+"""
+
+from datetime import datetime
+import numpy as np
+from flask import g, has_app_context
+from sqlalchemy import event
+from ..models import User, Trade, db
+from .mark_price_store import MarkPriceStore
+
+
+class EquitySnapshot:
+    """
+    Immutable view of an account's equity at a point in time.
+
+    Attributes:
+        user_id (int): Owner of the positions
+        balance (float): Cash balance (realized P&L + unused capital)
+        unrealized_pnl (float): Sum of unrealized P&L over open positions
+        equity (float): balance + unrealized_pnl
+        marks (dict): symbol -> mark price used for this snapshot
+        position_ids (np.ndarray): Trade ids, aligned with position_pnl
+        position_pnl (np.ndarray): Unrealized P&L per open position
+    """
+
+    __slots__ = ('user_id', 'balance', 'unrealized_pnl', 'equity', 'marks',
+                 'position_ids', 'position_pnl', 'computed_at')
+
+    def __init__(self, user_id, balance, marks, position_ids, position_pnl):
+        self.user_id = user_id
+        self.balance = balance
+        self.marks = marks
+        self.position_ids = position_ids
+        self.position_pnl = position_pnl
+        self.unrealized_pnl = float(position_pnl.sum()) if len(position_pnl) else 0.0
+        self.equity = balance + self.unrealized_pnl
+        self.computed_at = datetime.utcnow()
+
+    @property
+    def open_positions(self):
+        return len(self.position_ids)
+
+    def pnl_for(self, trade_id):
+        """Unrealized P&L of a single open position (0.0 if not in snapshot)."""
+        matches = np.nonzero(self.position_ids == trade_id)[0]
+        return float(self.position_pnl[matches[0]]) if len(matches) else 0.0
+
+
+class EquityEngine:
+    """
+    Builds and memoizes EquitySnapshot objects.
+    """
+
+    _G_KEY = '_equity_snapshots'
+
+    @staticmethod
+    def get_snapshot(user_id, user=None, positions=None):
+        """
+        Return the equity snapshot for a user, computing it at most once per request.
+
+        Args:
+            user_id (int): The user ID
+            user (User, optional): Already-loaded user row, avoids a lookup
+            positions (list, optional): Open positions as (id, symbol, type, quantity, price)
+
+        Returns:
+            EquitySnapshot or None if the user does not exist
+        """
+        cache = EquityEngine._request_cache()
+        if cache is not None and user_id in cache:
+            return cache[user_id]
+
+        snapshot = EquityEngine.compute(user_id, user=user, positions=positions)
+
+        if cache is not None and snapshot is not None:
+            cache[user_id] = snapshot
+        return snapshot
+
+    @staticmethod
+    def invalidate(user_id=None):
+        """
+        Drop memoized snapshots (call after a fill or a balance change).
+
+        Args:
+            user_id (int, optional): Only drop this user's snapshot
+        """
+        cache = EquityEngine._request_cache()
+        if cache is None:
+            return
+        if user_id is None:
+            cache.clear()
+        else:
+            cache.pop(user_id, None)
+
+    @staticmethod
+    def compute(user_id, user=None, positions=None):
+        """
+        Compute a fresh snapshot (no memoization).
+
+        Args:
+            user_id (int): The user ID
+            user (User, optional): Already-loaded user row
+            positions (list, optional): Open positions as (id, symbol, type, quantity, price)
+
+        Returns:
+            EquitySnapshot or None if the user does not exist
+        """
+        if user is None:
+            user = User.query.get(user_id)
+        if not user:
+            return None
+
+        rows = positions
+        if rows is None:
+            rows = Trade.query.with_entities(
+                Trade.id, Trade.symbol, Trade.type, Trade.quantity, Trade.price
+            ).filter_by(user_id=user_id, status='OPEN').all()
+
+        balance = user.balance or 0.0
+        if not rows:
+            return EquitySnapshot(user_id, balance, {}, np.empty(0, dtype=np.int64), np.empty(0))
+
+        ids, symbols, sides, quantities, entries = zip(*rows)
+        marks = EquityEngine._resolve_marks(set(symbols))
+
+        entry = np.fromiter(entries, dtype=np.float64, count=len(rows))
+        qty = np.fromiter(quantities, dtype=np.float64, count=len(rows))
+        # Missing marks fall back to the entry price (zero unrealized P&L)
+        mark = np.fromiter(
+            (marks.get(s, e) for s, e in zip(symbols, entries)),
+            dtype=np.float64, count=len(rows)
+        )
+        direction = np.fromiter(
+            (1.0 if side == 'BUY' else -1.0 for side in sides),
+            dtype=np.float64, count=len(rows)
+        )
+
+        position_pnl = (mark - entry) * qty * direction
+
+        return EquitySnapshot(
+            user_id,
+            balance,
+            marks,
+            np.fromiter(ids, dtype=np.int64, count=len(rows)),
+            position_pnl
+        )
+
+    @staticmethod
+    def _resolve_marks(symbols):
+        """
+        Price each distinct symbol exactly once.
+
+        Args:
+            symbols (set): Distinct symbols held
+
+        Returns:
+            dict: symbol -> mark price
+        """
+        return {symbol: mark.price for symbol, mark in MarkPriceStore.get_marks(symbols).items()}
+
+    @staticmethod
+    def _request_cache():
+        if not has_app_context():
+            return None
+        cache = g.get(EquityEngine._G_KEY)
+        if cache is None:
+            cache = {}
+            setattr(g, EquityEngine._G_KEY, cache)
+        return cache
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_on_commit(session):
+    # Any committed fill or balance change makes memoized snapshots stale
+    EquityEngine.invalidate()
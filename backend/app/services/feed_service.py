@@ -1,117 +1,144 @@
 import yfinance as yf
 import requests
-from bs4 import BeautifulSoup
-from datetime import datetime, timedelta
 import time
-import random
+from .bounded_cache import BoundedCache
+from .candle_buffer import CandleBuffer
+from .ohlcv import OHLCVSeries
+from .mark_price_store import MarkPriceStore
+from .bvc_service import BVCService
+from .single_flight import SingleFlight
 
 class FeedService:
-    _cache = {}
     _CACHE_DURATION = 5  # seconds (reduced for faster P&L updates)
-    _last_prices = {}  # Store last prices for continuity
+    # Keyed by client-supplied tickers, so both are bounded (LRU)
+    _cache = BoundedCache('feed.series', max_entries=256, max_bytes=4 * 1024 * 1024, ttl=_CACHE_DURATION)
+    _buffers = BoundedCache('feed.buffers', max_entries=256, max_bytes=4 * 1024 * 1024)  # Rolling candle history per symbol
     
-    _watchlist_cache = None
-    _watchlist_last_update = 0
-    _trends_cache = None
-    _trends_last_update = 0
     _CATALOG_CACHE_DURATION = 60 # 1 minute for general market lists
+    _GLOBAL_STATS_CACHE_DURATION = 300
+    _catalogs = BoundedCache('feed.catalogs', max_entries=8)  # watchlist, trends, heatmap, global stats
+    _flight = SingleFlight()
 
     @staticmethod
-    def get_price_data(ticker):
-        """Fetch price data from yfinance (International) or BVC (placeholder)."""
+    def get_series(ticker):
+        """Fetch price data as a columnar OHLCVSeries (cached for _CACHE_DURATION)."""
         current_time = time.time()
         
         # Check cache
-        if ticker in FeedService._cache:
-            cached_data, timestamp = FeedService._cache[ticker]
-            if current_time - timestamp < FeedService._CACHE_DURATION:
-                print(f"Returning cached data for {ticker}")
-                return cached_data
+        cached_series = FeedService._cache.get(ticker)
+        if cached_series is not None:
+            return cached_series
 
         # Force mock data for demo stability
-        data = FeedService._generate_mock_data(ticker)
+        series = FeedService._generate_mock_data(ticker)
             
-        # Update cache
-        if data:
-             FeedService._cache[ticker] = (data, current_time)
+        # Update cache (BVC symbols are marked by BVCService only: the mock
+        # series must not replace their exchange price)
+        if series:
+             FeedService._cache.set(ticker, series)
+             if ticker not in BVCService.SYMBOLS:
+                 MarkPriceStore.update(ticker, series.last_close, MarkPriceStore.SOURCE_FEED, current_time)
              
-        return data
+        return series
+
+    @staticmethod
+    def catalog_specs():
+        """
+        Market catalogs served from `_catalogs`.
+
+        Returns:
+            dict: name -> (fetch function, max age in seconds)
+        """
+        return {
+            'watchlist': (FeedService._fetch_watchlist_data, FeedService._CATALOG_CACHE_DURATION),
+            'trends': (FeedService._fetch_market_trends, FeedService._CATALOG_CACHE_DURATION),
+            'heatmap': (FeedService._fetch_market_heatmap, FeedService._CATALOG_CACHE_DURATION),
+            'global_stats': (FeedService._fetch_global_market_stats, FeedService._GLOBAL_STATS_CACHE_DURATION),
+        }
+
+    @staticmethod
+    def _get_catalog(name):
+        """
+        Serve a market catalog from cache.
+
+        While the MarketDataRefresher is running, an expired value is served
+        as-is (the refresher is about to replace it). Otherwise only one caller
+        refetches on expiry while concurrent callers get the previous value.
+        """
+        cached = FeedService._catalogs.get(name)
+        if cached is not None:
+            return cached
+
+        stale = FeedService._catalogs.peek(name)
+        if stale:
+            from .market_refresher import MarketDataRefresher
+            _, max_age = FeedService.catalog_specs()[name]
+            # Don't trust a refresher that has fallen far behind
+            if MarketDataRefresher.is_running() and stale[1] < max_age * 3:
+                return stale[0]
+
+        return FeedService.refresh_catalog(name, stale=stale[0] if stale else None)
+
+    @staticmethod
+    def refresh_catalog(name, stale=None):
+        """
+        Fetch a catalog from upstream and cache it (coalesced per catalog).
+
+        Args:
+            name (str): Key of catalog_specs()
+            stale: Value returned immediately if a refresh is already in flight
+
+        Returns:
+            The fresh catalog, or `stale`
+        """
+        fetch, max_age = FeedService.catalog_specs()[name]
+
+        def load():
+            result = fetch()
+            FeedService._catalogs.set(name, result, ttl=max_age)
+            return result
+
+        return FeedService._flight.do(name, load, stale=stale)
+
+    @staticmethod
+    def catalog_version(name):
+        """Changes whenever the catalog is refetched (usable as a cache validator)."""
+        return FeedService._catalogs.stored_at(name)
+
+    @staticmethod
+    def catalog_age(name):
+        """Seconds since the cached catalog was fetched, or None if never fetched."""
+        entry = FeedService._catalogs.peek(name)
+        return entry[1] if entry else None
+
+    @staticmethod
+    def get_price_data(ticker):
+        """Fetch price data from yfinance (International) or BVC (placeholder) as a list of candle dicts."""
+        return FeedService.get_series(ticker).to_records()
 
     @staticmethod
     def _generate_mock_data(ticker="BTC-USD", num_candles=100):
-        """Generate realistic market data using Random Walk (Geometric Brownian Motion)."""
-        print(f"Generating realistic random walk data for {ticker}")
-        
-        # Use last price if available for continuity
-        if ticker in FeedService._last_prices:
-             current_price = FeedService._last_prices[ticker]
-        else:
-             # Base parameters
-             if "BTC" in ticker:
-                 current_price = 45000.0
-                 volatility = 0.002 # 0.2% per candle
-             elif "ETH" in ticker:
-                 current_price = 2500.0
-                 volatility = 0.003
-             elif "EUR" in ticker or "GBP" in ticker:
-                 current_price = 1.10
-                 volatility = 0.0005
-             else:
-                 current_price = 100.0
-                 volatility = 0.01
-             
-        # Mock volatility parameters (kept for new candles generation)
-        if "BTC" in ticker: volatility = 0.002 
-        elif "ETH" in ticker: volatility = 0.003
-        else: volatility = 0.01
-
-        data = []
-        current_time_seconds = int(time.time())
-        # Align to minute for cleaner chart
-        current_minute_timestamp = current_time_seconds - (current_time_seconds % 60)
-        
-        # Start from the past
-        start_timestamp = current_minute_timestamp - (num_candles * 300) # 5 min candles
-        
-        for i in range(num_candles):
-            timestamp = start_timestamp + (i * 300)
-            
-            # Random Walk with independent Volatility
-            change_percent = random.gauss(0, volatility)
-            
-            open_price = current_price
-            close_price = current_price * (1 + change_percent)
-            
-            # Wicks: Independent of body size to create realistic "TradingView" shapes (Dojis, Hammers)
-            # Volatility determines the high/low range, not just the close price
-            high_w = max(open_price, close_price) * (1 + abs(random.gauss(0, volatility * 0.5)))
-            low_w = min(open_price, close_price) * (1 - abs(random.gauss(0, volatility * 0.5)))
-            
-            # Ensure high is at least the max of open/close and low is at most min
-            high_price = max(open_price, close_price, high_w)
-            low_price = min(open_price, close_price, low_w)
-            
-            # Volume: Random bursts
-            volume_base = 1000000 if "BTC" in ticker else 50000
-            volume = int(volume_base * random.uniform(0.5, 2.0))
-            if random.random() > 0.9: # Volume spike
-                 volume *= 3
-
-            data.append({
-                "time": timestamp,
-                "open": round(open_price, 2),
-                "high": round(high_price, 2),
-                "low": round(low_price, 2),
-                "close": round(close_price, 2),
-                "volume": volume
-            })
-            
-            current_price = close_price
-            
-        # Store last price for next iteration
-        FeedService._last_prices[ticker] = current_price
-            
-        return data
+        """Advance the symbol's rolling random-walk buffer and return its latest candles."""
+        buffer = FeedService._buffers.get(ticker)
+        if buffer is None:
+            print(f"Generating realistic random walk data for {ticker}")
+            # The buffer may have been evicted: continue from the last known
+            # price, or open positions would be re-marked at the base price
+            buffer = CandleBuffer(ticker, capacity=max(num_candles, CandleBuffer.DEFAULT_CAPACITY),
+                                  last_close=FeedService._last_known_price(ticker))
+            FeedService._buffers.set(ticker, buffer)
+
+        buffer.advance(time.time())
+        return buffer.window(num_candles)
+
+    @staticmethod
+    def _last_known_price(ticker):
+        """Last published mark, else the index's last price for a held symbol (None for a new symbol)."""
+        mark = MarkPriceStore.last_mark(ticker)
+        if mark is not None:
+            return mark.price
+        from .position_index import PositionIndex
+        return PositionIndex.last_price(ticker)
 
     @staticmethod
     def _get_yfinance_price(ticker):
@@ -155,27 +182,12 @@ class FeedService:
                         continue
                 
                 if hist is not None and not hist.empty and len(hist) > 0:
-                    data = []
-                    for index, row in hist.iterrows():
-                        # Convert to Unix timestamp for lightweight-charts
-                        timestamp = int(index.timestamp())
-                        data.append({
-                            "time": timestamp,
-                            "open": float(row['Open']),
-                            "high": float(row['High']),
-                            "low": float(row['Low']),
-                            "close": float(row['Close']),
-                            "volume": int(row['Volume']) if row['Volume'] > 0 else 1000000
-                        })
-                    
-                    # Sort by time to ensure chronological order
-                    data.sort(key=lambda x: x['time'])
-                    
+                    # Vectorized conversion, sorted chronologically
                     # Limit to last 50 candles for better chart readability
-                    data = data[-50:] if len(data) > 50 else data
+                    series = OHLCVSeries.from_dataframe(hist).tail(50)
                     
-                    print(f"Successfully fetched {len(data)} candles for {ticker_variant}")
-                    return data
+                    print(f"Successfully fetched {len(series)} candles for {ticker_variant}")
+                    return series
                     
             except Exception as e:
                 print(f"Error fetching {ticker_variant}: {e}")
@@ -197,11 +209,11 @@ class FeedService:
         """
         Fetches data for the default watchlist using optimized batch download with caching.
         """
-        current_time = time.time()
-        if FeedService._watchlist_cache and (current_time - FeedService._watchlist_last_update < FeedService._CATALOG_CACHE_DURATION):
-            # print("Returning cached watchlist data")
-            return FeedService._watchlist_cache
+        return FeedService._get_catalog('watchlist')
 
+    @staticmethod
+    def _fetch_watchlist_data():
+        """Batch-downloads the watchlist from yfinance and appends BVC quotes."""
         watchlist_config = {
             'Crypto': ['BTC-USD', 'ETH-USD', 'SOL-USD', 'BNB-USD', 'XRP-USD', 'ADA-USD', 'DOGE-USD'],
             'Forex': ['EURUSD=X', 'GBPUSD=X', 'USDJPY=X', 'AUDUSD=X', 'USDCAD=X', 'USDCHF=X'],
@@ -271,23 +283,19 @@ class FeedService:
         except Exception as e:
             print(f"Error fetching BVC for watchlist: {e}")
 
-        FeedService._watchlist_cache = result
-        FeedService._watchlist_last_update = current_time
         return result
-    _global_stats_cache = None
-    _global_stats_last_update = 0
 
     @staticmethod
     def get_global_market_stats():
         """
         Fetches global market statistics with real-time data from CoinGecko & Alternative.me.
         """
-        current_time = time.time()
         # 5 minute cache for global stats to avoid rate limiting
-        if FeedService._global_stats_cache and (current_time - FeedService._global_stats_last_update < 300):
-            return FeedService._global_stats_cache
+        return FeedService._get_catalog('global_stats')
 
-        import requests
+    @staticmethod
+    def _fetch_global_market_stats():
+        """Queries CoinGecko (market cap, volume, dominance) and Alternative.me (Fear & Greed)."""
         
         # Default/Fallback stats
         stats = [
@@ -340,8 +348,6 @@ class FeedService:
         except Exception as e:
             print(f"Error fetching global stats: {e}")
 
-        FeedService._global_stats_cache = stats
-        FeedService._global_stats_last_update = current_time
         return stats
     @staticmethod
     def get_market_heatmap():
@@ -349,6 +355,11 @@ class FeedService:
         Returns live performance data for the heatmap.
         Guarantees return of at least 8 items.
         """
+        return FeedService._get_catalog('heatmap')
+
+    @staticmethod
+    def _fetch_market_heatmap():
+        """Top BVC movers completed with crypto/stock changes (mock fallback)."""
         results = []
         
         # 1. Try BVC Data
@@ -421,11 +432,11 @@ class FeedService:
         """
         Fetches a curated list of trending assets across all markets with caching.
         """
-        current_time = time.time()
-        if FeedService._trends_cache and (current_time - FeedService._trends_last_update < FeedService._CATALOG_CACHE_DURATION):
-            # print("Returning cached trends data")
-            return FeedService._trends_cache
+        return FeedService._get_catalog('trends')
 
+    @staticmethod
+    def _fetch_market_trends():
+        """Batch-downloads the trend symbols from yfinance and appends the top BVC movers."""
         trends_config = {
             'Crypto': ['BTC-USD', 'ETH-USD', 'SOL-USD'],
             'Forex': ['EURUSD=X', 'GC=F'], # EUR/USD and Gold
@@ -488,6 +499,4 @@ class FeedService:
         except Exception as e:
             print(f"Error adding BVC trends: {e}")
 
-        FeedService._trends_cache = result
-        FeedService._trends_last_update = current_time
         return result
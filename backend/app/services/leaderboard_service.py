@@ -0,0 +1,243 @@
+"""
+Leaderboard Service
+
+Keeps both leaderboards in memory as sorted rankings so reads cost O(K):
+
+- 'balance':  balance growth over initial capital (/api/leaderboard/)
+- 'realized': realized P&L over initial capital (/api/leaderboard, persisted
+              to the Leaderboard table as a snapshot)
+
+Per-user aggregates come from UserTradingStats (see TradingStatsService),
+which is incremented in the same transaction that opens or closes a trade.
+Rankings are built lazily from one grouped aggregate over users/trades, then
+kept fresh incrementally: every commit that touches a user or one of their
+trades marks that user dirty, and the next read re-ranks only the dirty
+users. Users touched by the other worker processes are marked dirty from
+the change log (services/change_log.py), so a ranking is about a second
+behind them; the periodic rebuild is only a safety net.
+"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+from sqlalchemy import event, func
+from ..models import db, User, Trade, UserTradingStats
+from .trading_stats import TradingStatsService
+from .change_log import ChangeLog
+
+DEFAULT_CAPITAL = 100000.0
+
+
+class Ranking:
+    """
+    Users sorted by descending score (ties by user id): O(n) worst-case
+    updates via bisect on a flat list, O(K) top-K reads.
+    """
+
+    def __init__(self):
+        self._keys = []      # sorted (-score, user_id)
+        self._entries = {}   # user_id -> (key, row)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def upsert(self, user_id, score, row):
+        self.remove(user_id)
+        key = (-score, user_id)
+        insort(self._keys, key)
+        self._entries[user_id] = (key, row)
+
+    def remove(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            i = bisect_left(self._keys, entry[0])
+            del self._keys[i]
+
+    def top(self, k):
+        return [dict(self._entries[user_id][1]) for _, user_id in self._keys[:k]]
+
+    def clear(self):
+        self._keys = []
+        self._entries = {}
+
+
+class LeaderboardService:
+    """
+    In-memory leaderboards backed by UserTradingStats.
+    """
+
+    REBUILD_INTERVAL = 600  # seconds; safety net, other processes' changes come from the change log
+    CHANGE_TOPIC = 'leaderboard'
+
+    _rankings = {'balance': Ranking(), 'realized': Ranking()}
+    _built_at = None
+    _dirty = set()
+    _lock = threading.RLock()
+
+    # --- Rankings -----------------------------------------------------------
+
+    @staticmethod
+    def top(name, k=10):
+        """
+        Top-K entries of a ranking.
+
+        Args:
+            name (str): 'balance' or 'realized'
+            k (int): Number of entries
+
+        Returns:
+            list: Row dicts, best first (see _rows for the fields)
+        """
+        ChangeLog.poll()
+        with LeaderboardService._lock:
+            LeaderboardService._sync()
+            return LeaderboardService._rankings[name].top(k)
+
+    @staticmethod
+    def mark_dirty(*user_ids):
+        with LeaderboardService._lock:
+            LeaderboardService._dirty.update(user_ids)
+
+    @staticmethod
+    def invalidate():
+        """Force a full rebuild on the next read."""
+        with LeaderboardService._lock:
+            LeaderboardService._built_at = None
+
+    @staticmethod
+    def _sync():
+        built_at = LeaderboardService._built_at
+        if built_at is None or time.time() - built_at > LeaderboardService.REBUILD_INTERVAL:
+            LeaderboardService._rebuild()
+        elif LeaderboardService._dirty:
+            dirty = list(LeaderboardService._dirty)
+            LeaderboardService._dirty.clear()
+            LeaderboardService._apply(LeaderboardService._rows(dirty), dirty)
+
+    @staticmethod
+    def _rebuild():
+        for ranking in LeaderboardService._rankings.values():
+            ranking.clear()
+        LeaderboardService._dirty.clear()
+        LeaderboardService._apply(LeaderboardService._rows())
+        LeaderboardService._built_at = time.time()
+
+    @staticmethod
+    def _apply(rows, user_ids=()):
+        balance = LeaderboardService._rankings['balance']
+        realized = LeaderboardService._rankings['realized']
+
+        seen = set()
+        for row in rows:
+            seen.add(row.id)
+            initial = row.initial_capital if row.initial_capital and row.initial_capital > 0 else DEFAULT_CAPITAL
+            profit_raw = (row.balance or 0.0) - initial
+
+            if row.status != 'BANNED':
+                score = profit_raw * 100 / initial
+                balance.upsert(row.id, score, {
+                    'username': row.username,
+                    'profit': round(score, 2),
+                    'trades': row.total_trades,
+                    'status': row.status,
+                    'total_pnl': round(profit_raw, 2),
+                    'closed_trades': row.total_trades,
+                })
+            else:
+                balance.remove(row.id)
+
+            if row.initial_capital:
+                score = row.realized_pnl * 100 / row.initial_capital
+                realized.upsert(row.id, score, {
+                    'user_id': row.id,
+                    'username': row.username,
+                    'profit_percent': round(score, 2),
+                    'total_trades': row.closed_trades,
+                    'win_rate': round(row.winning_trades * 100 / row.closed_trades, 1) if row.closed_trades else 0,
+                    'status': row.status
+                })
+            else:
+                realized.remove(row.id)
+
+        # Dirty users that no longer exist
+        for user_id in set(user_ids) - seen:
+            balance.remove(user_id)
+            realized.remove(user_id)
+
+    # --- Queries ------------------------------------------------------------
+
+    @staticmethod
+    def _rows(user_ids=None):
+        """
+        One query returning ranking inputs per user. Running aggregates are
+        used when the user has a stats row, the trades aggregate otherwise.
+        """
+        agg = TradingStatsService.trade_stats_subquery(user_ids)
+
+        def stat(column, agg_column, default):
+            return func.coalesce(column, agg_column, default)
+
+        query = db.session.query(
+            User.id,
+            User.username,
+            User.status,
+            User.balance,
+            User.initial_capital,
+            stat(UserTradingStats.total_trades, agg.c.trade_count, 0).label('total_trades'),
+            stat(UserTradingStats.closed_trades, agg.c.closed_trades, 0).label('closed_trades'),
+            stat(UserTradingStats.winning_trades, agg.c.winning_trades, 0).label('winning_trades'),
+            stat(UserTradingStats.realized_pnl, agg.c.realized_pnl, 0.0).label('realized_pnl'),
+        ).outerjoin(UserTradingStats, UserTradingStats.user_id == User.id) \
+         .outerjoin(agg, agg.c.user_id == User.id)
+        if user_ids is not None:
+            query = query.filter(User.id.in_(user_ids))
+        return query.all()
+
+
+def _apply_remote_changes(user_ids):
+    if user_ids is None:
+        LeaderboardService.invalidate()
+    else:
+        LeaderboardService.mark_dirty(*user_ids)
+
+
+ChangeLog.subscribe(LeaderboardService.CHANGE_TOPIC, _apply_remote_changes)
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_touched_users(session, flush_context, instances):
+    touched = session.info.setdefault('leaderboard_touched', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            touched.add(obj.id)
+        elif isinstance(obj, (Trade, UserTradingStats)) and obj.user_id is not None:
+            touched.add(obj.user_id)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_new_users(session, flush_context):
+    # Users inserted in this flush only have an id now; the other processes
+    # get the touched users with the commit (see services/change_log.py)
+    touched = session.info.setdefault('leaderboard_touched', set())
+    for obj in session.new:
+        if isinstance(obj, User) and obj.id is not None:
+            touched.add(obj.id)
+    if touched:
+        ChangeLog.stage(session, LeaderboardService.CHANGE_TOPIC, touched)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _mark_touched_dirty(session):
+    # Also fired when a SAVEPOINT is released: wait for the outer commit
+    if session.in_nested_transaction():
+        return
+    touched = session.info.pop('leaderboard_touched', None)
+    if touched:
+        LeaderboardService.mark_dirty(*touched)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_touched(session):
+    # A rolled back SAVEPOINT keeps the outer transaction's changes
+    if not session.in_nested_transaction():
+        session.info.pop('leaderboard_touched', None)
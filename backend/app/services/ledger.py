@@ -0,0 +1,146 @@
+"""
+Ledger
+
+Atomic balance updates for trading accounts. Every change of User.balance
+made by a request (opening / closing a position, buying a challenge, an
+admin reset) goes through here so concurrent requests on the same account,
+in any number of workers, cannot overdraw it or lose an update.
+
+Each operation reads the balance and the row's version, computes the new
+balance and writes it with a compare-and-swap:
+
+    UPDATE users SET balance = :new, version = version + 1
+    WHERE id = :id AND version = :read
+
+On MySQL / PostgreSQL the read is a SELECT ... FOR UPDATE, so the row stays
+locked until the request commits and the swap cannot miss. SQLite has no row
+locks; a swap that lost the race matches no row and the operation is retried
+on a fresh read. Only the account row is serialized, never the whole app.
+
+The User object is updated in place, so the rest of the request (risk
+checks, responses) and the session hooks (leaderboard, position index,
+ETags) see the new balance as if it had been assigned.
+"""
+
+import random
+import time
+from sqlalchemy import inspect, text
+from sqlalchemy.orm.attributes import set_committed_value
+from ..models import db, User, Trade
+
+
+class LedgerConflict(Exception):
+    """The balance kept changing under us; the request should be retried."""
+
+
+class Ledger:
+    """
+    Balance operations on a loaded User, inside the caller's transaction.
+    """
+
+    MAX_RETRIES = 5
+    RETRY_DELAY = 0.01  # seconds, doubled after every lost swap
+    LOCKING_DIALECTS = ('mysql', 'mariadb', 'postgresql')
+
+    @staticmethod
+    def debit(user, amount):
+        """
+        Take `amount` from the balance (margin of a new position).
+
+        Args:
+            user (User): Account to debit
+            amount (float): Amount to take, > 0
+
+        Returns:
+            float: New balance, or None if the balance is below `amount`
+        """
+        def apply(balance):
+            return balance - amount if balance >= amount else None
+        return Ledger._apply(user, apply)
+
+    @staticmethod
+    def settle(user, trade, amount):
+        """
+        Close `trade` and credit `amount` (margin + P&L) in one step. The
+        trade is claimed with a conditional UPDATE first, so a position can
+        only be settled once even if two close requests race.
+
+        Args:
+            user (User): Trade owner
+            trade (Trade): Open position being closed
+            amount (float): Amount to credit
+
+        Returns:
+            float: New balance, or None if the trade was no longer open
+        """
+        claimed = db.session.query(Trade).filter(
+            Trade.id == trade.id, Trade.status == 'OPEN'
+        ).update({Trade.status: 'CLOSED'}, synchronize_session=False)
+        if not claimed:
+            return None
+        set_committed_value(trade, 'status', 'CLOSED')
+        return Ledger._apply(user, lambda balance: balance + amount)
+
+    @staticmethod
+    def reset(user, balance):
+        """
+        Set the balance to `balance` (new challenge, admin reset).
+
+        Returns:
+            float: New balance
+        """
+        return Ledger._apply(user, lambda _: balance)
+
+    @staticmethod
+    def ensure_schema():
+        """
+        Add users.version to databases created before it existed
+        (db.create_all() only creates missing tables).
+
+        Returns:
+            bool: Whether the column was added
+        """
+        inspector = inspect(db.engine)
+        if not inspector.has_table(User.__tablename__):
+            return False
+        if any(column['name'] == 'version' for column in inspector.get_columns(User.__tablename__)):
+            return False
+        with db.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+        print("Ledger: added users.version", flush=True)
+        return True
+
+    @staticmethod
+    def _apply(user, operation):
+        """
+        Compare-and-swap loop: operation(balance) -> new balance, or None to
+        leave the account unchanged.
+        """
+        locking = db.engine.dialect.name in Ledger.LOCKING_DIALECTS
+
+        for attempt in range(Ledger.MAX_RETRIES):
+            query = db.session.query(User.balance, User.version).filter(User.id == user.id)
+            if locking:
+                query = query.with_for_update()
+            balance, version = query.one()
+
+            new_balance = operation(balance or 0.0)
+            if new_balance is None:
+                set_committed_value(user, 'balance', balance)
+                set_committed_value(user, 'version', version)
+                return None
+
+            swapped = db.session.query(User).filter(
+                User.id == user.id, User.version == version
+            ).update({User.balance: new_balance, User.version: version + 1}, synchronize_session=False)
+            if swapped:
+                set_committed_value(user, 'balance', new_balance)
+                set_committed_value(user, 'version', version + 1)
+                # Same value as committed: marks the user changed for the session
+                # hooks without writing it again on flush
+                user.balance = new_balance
+                return new_balance
+
+            time.sleep(random.uniform(0, Ledger.RETRY_DELAY * 2 ** attempt))
+
+        raise LedgerConflict(f"Balance of user {user.id} changed {Ledger.MAX_RETRIES} times during the update")
@@ -0,0 +1,169 @@
+"""
+Mark Price Store
+
+Single source of truth for the "current price" of a symbol. FeedService and
+BVCService publish their latest prices here; trading, risk and challenge
+endpoints read marks in O(1) instead of regenerating candle series just to
+read the last close.
+
+Listeners registered with `subscribe` are called whenever a symbol's price
+changes (e.g. the risk monitor re-marking accounts that hold it).
+"""
+
+import time
+from collections import namedtuple
+from .bounded_cache import BoundedCache
+
+Mark = namedtuple('Mark', ['symbol', 'price', 'timestamp', 'source'])
+
+
+class MarkPriceStore:
+    """
+    In-memory store of the last known price per symbol.
+
+    Each mark records its price, the time it was observed and the service it
+    came from ('bvc' or 'feed'). A mark older than its source's cache period
+    is refreshed from that source on the next read; if that fails, the old
+    mark is served for at most MAX_AGE seconds, then the symbol is unpriced.
+    """
+
+    SOURCE_BVC = 'bvc'
+    SOURCE_FEED = 'feed'
+    MAX_AGE = 180  # seconds, three BVC cache periods
+
+    _marks = BoundedCache('marks', max_entries=2048)
+    _listeners = []
+
+    @staticmethod
+    def update(symbol, price, source, timestamp=None):
+        """
+        Publish a new mark for a symbol.
+
+        Args:
+            symbol (str): Ticker as used by the trading endpoints
+            price (float): Last traded / closing price
+            source (str): 'bvc' or 'feed'
+            timestamp (float, optional): Observation time (epoch seconds)
+        """
+        if price is None:
+            return
+        previous = MarkPriceStore.last_mark(symbol)
+        mark = Mark(symbol, float(price), timestamp or time.time(), source)
+        MarkPriceStore._marks.set(symbol, mark)
+
+        if previous is None or previous.price != mark.price:
+            for listener in list(MarkPriceStore._listeners):
+                try:
+                    listener(mark)
+                except Exception as e:
+                    print(f"MarkPriceStore listener error: {e}")
+
+    @staticmethod
+    def subscribe(listener):
+        """
+        Call `listener(mark)` whenever a symbol's price changes. Listeners run
+        on the publishing thread and must return quickly.
+        """
+        if listener not in MarkPriceStore._listeners:
+            MarkPriceStore._listeners.append(listener)
+
+    @staticmethod
+    def unsubscribe(listener):
+        if listener in MarkPriceStore._listeners:
+            MarkPriceStore._listeners.remove(listener)
+
+    @staticmethod
+    def update_many(prices, source, timestamp=None):
+        """
+        Publish marks for several symbols observed at the same time.
+
+        Args:
+            prices (dict): symbol -> price
+            source (str): 'bvc' or 'feed'
+            timestamp (float, optional): Observation time (epoch seconds)
+        """
+        timestamp = timestamp or time.time()
+        for symbol, price in prices.items():
+            MarkPriceStore.update(symbol, price, source, timestamp)
+
+    @staticmethod
+    def get_mark(symbol):
+        """
+        Get the current mark for a symbol.
+
+        Args:
+            symbol (str): Ticker
+
+        Returns:
+            Mark or None if no source can price the symbol (or its last
+            mark is older than MAX_AGE)
+        """
+        mark = MarkPriceStore._marks.get(symbol)
+        if mark and not MarkPriceStore._is_stale(mark):
+            return mark
+
+        mark = MarkPriceStore._refresh(symbol) or mark
+        if mark and time.time() - mark.timestamp < MarkPriceStore.MAX_AGE:
+            return mark
+        return None
+
+    @staticmethod
+    def last_mark(symbol):
+        """Last published mark, even if stale, without refreshing it (or None)."""
+        peeked = MarkPriceStore._marks.peek(symbol)
+        return peeked[0] if peeked else None
+
+    @staticmethod
+    def get_marks(symbols):
+        """
+        Get current marks for several symbols, pricing each one once.
+
+        Args:
+            symbols (iterable): Tickers
+
+        Returns:
+            dict: symbol -> Mark (symbols that cannot be priced are omitted)
+        """
+        marks = {}
+        for symbol in set(symbols):
+            mark = MarkPriceStore.get_mark(symbol)
+            if mark:
+                marks[symbol] = mark
+        return marks
+
+    @staticmethod
+    def get_price(symbol, default=None):
+        """Shortcut returning only the mark price (or `default`)."""
+        mark = MarkPriceStore.get_mark(symbol)
+        return mark.price if mark else default
+
+    @staticmethod
+    def _is_stale(mark):
+        from .bvc_service import BVCService
+        from .feed_service import FeedService
+
+        if mark.source == MarkPriceStore.SOURCE_BVC:
+            max_age = BVCService._CACHE_DURATION
+        else:
+            max_age = FeedService._CACHE_DURATION
+        return time.time() - mark.timestamp >= max_age
+
+    @staticmethod
+    def _refresh(symbol):
+        """
+        Ask the owning source for a fresh price: BVC for the symbols it lists
+        (the feed never prices them), the generic feed for everything else.
+        """
+        from .bvc_service import BVCService
+        from .feed_service import FeedService
+
+        if symbol in BVCService.SYMBOLS:
+            stock = BVCService.get_stock_price(symbol)
+            if stock:
+                # get_market_data publishes on refetch; this covers cache hits
+                MarkPriceStore.update(symbol, stock['price'], MarkPriceStore.SOURCE_BVC,
+                                      BVCService._last_update or None)
+            return MarkPriceStore._marks.get(symbol)
+
+        FeedService.get_series(symbol)
+        return MarkPriceStore._marks.get(symbol)
@@ -0,0 +1,139 @@
+"""
+Market Data Refresher
+
+Background thread that refreshes FeedService's market catalogs (watchlist,
+trends, heatmap, global stats) and NewsService's news list shortly before
+they expire, so requests on /api/trading/market-data/* and /api/news/market
+only ever read memory. Requests are served the last good value together
+with its age.
+
+Disabled on serverless deployments (Vercel) where background threads do not
+survive between invocations; the services then fall back to refreshing on
+expiry inside the request.
+"""
+
+import os
+import threading
+import time
+
+
+class MarketDataRefresher:
+    """
+    Single daemon thread per process keeping the market catalogs warm.
+    """
+
+    REFRESH_AHEAD = 0.8   # refresh once a catalog reaches 80% of its max age
+    MAX_SLEEP = 5         # seconds between scheduling passes
+    RETRY_DELAY = 15      # seconds before retrying a catalog whose refresh failed
+
+    _app = None
+    _thread = None
+    _stop = threading.Event()
+    _retry_at = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def enabled():
+        """
+        Whether the refresher should run in this process.
+
+        MARKET_REFRESHER=0 disables it explicitly; it is also off on Vercel.
+        """
+        flag = os.environ.get('MARKET_REFRESHER')
+        if flag is not None:
+            return flag.lower() not in ('0', 'false', 'no', 'off')
+        return not os.environ.get('VERCEL')
+
+    @staticmethod
+    def start(app=None):
+        """
+        Start the refresher thread once per process (no-op if disabled or running).
+
+        Args:
+            app (Flask, optional): Refreshes run in its app context, so catalogs
+                backed by the database (stored news) can use it
+        """
+        if not MarketDataRefresher.enabled():
+            print("MarketDataRefresher disabled", flush=True)
+            return False
+
+        with MarketDataRefresher._lock:
+            if MarketDataRefresher.is_running():
+                return True
+            MarketDataRefresher._app = app
+            MarketDataRefresher._stop.clear()
+            MarketDataRefresher._thread = threading.Thread(
+                target=MarketDataRefresher._run, name='market-data-refresher', daemon=True
+            )
+            MarketDataRefresher._thread.start()
+        return True
+
+    @staticmethod
+    def stop(timeout=None):
+        MarketDataRefresher._stop.set()
+        thread = MarketDataRefresher._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    @staticmethod
+    def is_running():
+        thread = MarketDataRefresher._thread
+        return thread is not None and thread.is_alive() and not MarketDataRefresher._stop.is_set()
+
+    @staticmethod
+    def refresh_due(now=None):
+        """
+        Refresh every catalog that is missing or close to expiry.
+
+        Returns:
+            float: Seconds until the next catalog becomes due
+        """
+        now = now or time.time()
+        next_due = MarketDataRefresher.MAX_SLEEP
+
+        for service, name, max_age in MarketDataRefresher._catalogs():
+            if now < MarketDataRefresher._retry_at.get(name, 0):
+                next_due = min(next_due, MarketDataRefresher._retry_at[name] - now)
+                continue
+
+            age = service.catalog_age(name)
+            refresh_after = max_age * MarketDataRefresher.REFRESH_AHEAD
+            if age is not None and age < refresh_after:
+                next_due = min(next_due, refresh_after - age)
+                continue
+
+            try:
+                service.refresh_catalog(name)
+                MarketDataRefresher._retry_at.pop(name, None)
+                next_due = min(next_due, refresh_after)
+            except Exception as e:
+                print(f"MarketDataRefresher: {name} refresh failed: {e}")
+                MarketDataRefresher._retry_at[name] = time.time() + MarketDataRefresher.RETRY_DELAY
+
+        return max(0.5, next_due)
+
+    @staticmethod
+    def _catalogs():
+        """(service, catalog name, max age) of every catalog kept warm."""
+        from .feed_service import FeedService
+        from .news_service import NewsService
+
+        return [
+            (service, name, max_age)
+            for service in (FeedService, NewsService)
+            for name, (_, max_age) in service.catalog_specs().items()
+        ]
+
+    @staticmethod
+    def _run():
+        while not MarketDataRefresher._stop.is_set():
+            try:
+                if MarketDataRefresher._app is not None:
+                    with MarketDataRefresher._app.app_context():
+                        delay = MarketDataRefresher.refresh_due()
+                else:
+                    delay = MarketDataRefresher.refresh_due()
+            except Exception as e:
+                print(f"MarketDataRefresher error: {e}")
+                delay = MarketDataRefresher.MAX_SLEEP
+            MarketDataRefresher._stop.wait(delay)
@@ -1,174 +1,566 @@
+import hashlib
 import random
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+from flask import has_app_context
+from sqlalchemy import select, func, and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from ..models import db, NewsArticle, NewsKeyword
+from .bounded_cache import BoundedCache
+from .economic_calendar import EconomicCalendar
+from .sentiment import HeadlineSentiment
+from .single_flight import SingleFlight
+
+# Not indexed (titles are French and English)
+_STOPWORDS = frozenset('''
+    the an and or of to in on for with at by from as is are be its it this that after over into
+    le la les un une des du de et ou en au aux pour par sur avec dans est sont qui que ce ces son sa ses plus
+'''.split())
 
 class NewsService:
+    _NEWS_CACHE_DURATION = 120  # RSS feeds rarely change faster than this
+    _FETCH_TIMEOUT = 5          # seconds per feed; a refresh waits for the slowest one at most
+    _ARTICLE_TTL = 24 * 3600    # articles leave the store a day after publication
+    _MAX_ARTICLES = 500
+    _PER_FEED = 5               # articles per source in the news list
+    _MAX_ITEMS = 20
+    _cache = BoundedCache('news', max_entries=4, ttl=_NEWS_CACHE_DURATION)
+    _flight = SingleFlight()
+
+    # RSS feeds (Financial & Crypto)
+    _FEEDS = [
+        {"url": "https://finance.yahoo.com/news/rssindex", "source": "Yahoo Finance", "category": "STOCKS"},
+        {"url": "https://www.coindesk.com/arc/outboundfeeds/rss/", "source": "CoinDesk", "category": "CRYPTO"},
+        {"url": "https://fr.investing.com/rss/news_25.rss", "source": "Investing.com", "category": "FOREX"}, # Forex news
+    ]
+
+    # Deduplicated article store, refreshed from the feeds
+    _articles = {}        # primary dedup key -> article
+    _keys = {}            # every dedup key -> primary key
+    _feed_state = {}      # url -> validators (etag / modified) and last fetch outcome
+    _last_refresh_ms = None
+    _history_loaded = False
+    _executor = None
+    _lock = threading.RLock()
+
     @staticmethod
     def get_economic_calendar():
         """
-        Generates dynamic economic events based on the current minute/hour.
+        Economic events of the last 12 hours and the next 24
+        (see EconomicCalendar for ranges and filters).
         """
-        events = []
-        now = datetime.utcnow()
-        
-        event_templates = [
-            {"title": "Core Price Index m/m", "currency": "USD", "impact": "HIGH"},
-            {"title": "Unemployment Rate", "currency": "USD", "impact": "HIGH"},
-            {"title": "FOMC Statement", "currency": "USD", "impact": "HIGH"},
-            {"title": "Retail Sales m/m", "currency": "USD", "impact": "MEDIUM"},
-            {"title": "ECB Interest Rate Decision", "currency": "EUR", "impact": "HIGH"},
-            {"title": "BoE Interest Rate Decision", "currency": "GBP", "impact": "HIGH"},
-            {"title": "GDP Growth Rate v/v", "currency": "EUR", "impact": "HIGH"},
-            {"title": "Manufacturing PMI", "currency": "GBP", "impact": "MEDIUM"}
-        ]
-        
-        # 1. Past events (Today)
-        for i in range(5):
-            template = event_templates[i % len(event_templates)]
-            # Distribute over the last 12 hours
-            time_offset = -(i * 2 + 1) 
-            event_time = now + timedelta(hours=time_offset)
-            
-            events.append({
-                "id": f"evt_past_{i}",
-                "time": event_time.strftime("%H:%M"),
-                "timestamp": event_time.isoformat(),
-                "title": template["title"],
-                "currency": template["currency"],
-                "impact": template["impact"],
-                "forecast": f"{random.uniform(0.1, 4.0):.1f}%",
-                "actual": f"{random.uniform(0.1, 4.0):.1f}%",
-                "status": "COMPLETED"
-            })
-
-        # 2. Upcoming Urgent (in 15 mins)
-        urgent_time = now + timedelta(minutes=15)
-        events.append({
-            "id": "evt_urgent",
-            "time": urgent_time.strftime("%H:%M"),
-            "timestamp": urgent_time.isoformat(),
-            "title": "Fed Chair Powell Speaks",
-            "currency": "USD",
-            "impact": "HIGH",
-            "forecast": "-",
-            "actual": "-",
-            "status": "UPCOMING"
-        })
-
-        # 3. Future events
-        for i in range(5):
-            template = event_templates[(i+2) % len(event_templates)]
-            time_offset = (i * 3 + 2)
-            event_time = now + timedelta(hours=time_offset)
-            
-            events.append({
-                "id": f"evt_fut_{i}",
-                "time": event_time.strftime("%H:%M"),
-                "timestamp": event_time.isoformat(),
-                "title": template["title"],
-                "currency": template["currency"],
-                "impact": template["impact"],
-                "forecast": f"{random.uniform(0.1, 4.0):.1f}%",
-                "actual": "-",
-                "status": "UPCOMING"
-            })
-            
-        events.sort(key=lambda x: x['timestamp'])
-        return events
+        return EconomicCalendar.day_view()
 
     @staticmethod
     def get_market_news():
         """
-        Fetches real market news from RSS feeds.
-        Falls back to mock data if fetching fails.
+        Latest market news from the RSS feeds, served from memory.
+
+        While the MarketDataRefresher is running it keeps the list fresh and
+        an expired value is served as-is. Otherwise one caller refreshes on
+        expiry while concurrent callers get the previous list.
+        Falls back to mock data if no feed could be fetched.
         """
-        news_items = []
+        cached = NewsService._cache.get('news')
+        if cached is not None:
+            return cached
+
+        stale = NewsService._cache.peek('news')
+        if stale:
+            from .market_refresher import MarketDataRefresher
+            # Don't trust a refresher that has fallen far behind
+            if MarketDataRefresher.is_running() and stale[1] < NewsService._NEWS_CACHE_DURATION * 3:
+                return stale[0]
+
         try:
-            import feedparser
-            
-            # List of RSS feeds (Financial & Crypto)
-            rss_feeds = [
-                {"url": "https://finance.yahoo.com/news/rssindex", "source": "Yahoo Finance", "category": "STOCKS"},
-                {"url": "https://www.coindesk.com/arc/outboundfeeds/rss/", "source": "CoinDesk", "category": "CRYPTO"},
-                {"url": "https://fr.investing.com/rss/news_25.rss", "source": "Investing.com", "category": "FOREX"}, # Forex news
-            ]
-            
-            for feed in rss_feeds:
-                try:
-                    print(f"DEBUG: Fetching feed {feed['url']}", flush=True)
-                    parsed_feed = feedparser.parse(feed["url"])
-                    print(f"DEBUG: Parsed {len(parsed_feed.entries)} entries from {feed['source']}", flush=True)
-                    # Take top 5 from each feed
-                    for entry in parsed_feed.entries[:5]:
-                        # Determine sentiment (basic keyword check)
-                        title_lower = entry.title.lower()
-                        sentiment = "NEUTRAL"
-                        if any(x in title_lower for x in ['up', 'rise', 'jump', 'gain', 'bull', 'high', 'record', 'hausse', 'bondit']):
-                            sentiment = "POSITIVE"
-                        elif any(x in title_lower for x in ['down', 'drop', 'fall', 'loss', 'bear', 'low', 'crash', 'chute', 'baisse']):
-                            sentiment = "NEGATIVE"
-                            
-                        # Format time
-                        published_time = datetime.now() # Default
-                        if hasattr(entry, 'published_parsed') and entry.published_parsed:
-                             published_time = datetime(*entry.published_parsed[:6])
-                        
-                        time_diff = datetime.utcnow() - published_time
-                        if time_diff.total_seconds() < 60:
-                            time_str = "A l'instant"
-                        elif time_diff.total_seconds() < 3600:
-                            time_str = f"Il y a {int(time_diff.total_seconds() / 60)} min"
-                        else:
-                            time_str = f"Il y a {int(time_diff.total_seconds() / 3600)} h"
-
-                        news_items.append({
-                            "id": entry.get("id", entry.link),
-                            "title": entry.title,
-                            "source": feed["source"],
-                            "category": feed["category"],
-                            "sentiment": sentiment,
-                            "time": time_str,
-                            "timestamp": published_time.isoformat(),
-                            "link": entry.link
-                        })
-                except Exception as e:
-                    print(f"Error fetching feed {feed['url']}: {e}", flush=True)
-                    continue
-            
-            # Sort by timestamp descending
-            news_items.sort(key=lambda x: x['timestamp'], reverse=True)
-            
-            if not news_items:
-                 raise Exception("No news fetched")
-                 
-            return news_items[:20] # Return top 20
-            
+            return NewsService.refresh_catalog('news', stale=stale[0] if stale else None)
         except Exception as e:
             print(f"Global News Error (using fallback): {e}", flush=True)
-            # Fallback to mock data
-            headlines = [
-                {"source": "Bloomberg", "title": "Bitcoin franchit la résistance des 68k$ alors que les ETFs explosent.", "category": "CRYPTO", "sentiment": "POSITIVE"},
-                {"source": "Reuters", "title": "La Fed reste prudente sur les taux d'intérêt, Powell demande de la patience.", "category": "FOREX", "sentiment": "NEUTRAL"},
-                {"source": "Le Boursier", "title": "Maroc Telecom (IAM) annonce une hausse de 3% de son chiffre d'affaires.", "category": "BVC", "sentiment": "POSITIVE"},
-                {"source": "CNBC", "title": "Tesla chute de 2% après l'annonce de nouveaux retards sur le Cybertruck.", "category": "STOCKS", "sentiment": "NEGATIVE"},
-                {"source": "Coindesk", "title": "Solana dépasse BNB en capitalisation boursière.", "category": "CRYPTO", "sentiment": "POSITIVE"},
-                {"source": "ForexLive", "title": "L'Euro chute face au Dollar suite aux mauvais chiffres du PMI Allemand.", "category": "FOREX", "sentiment": "NEGATIVE"},
-                {"source": "Boursenews", "title": "Le MASI clôture en hausse, porté par le secteur bancaire.", "category": "BVC", "sentiment": "POSITIVE"},
-            ]
-            
-            # Add timestamps
-            news_fallback = []
-            now = datetime.utcnow()
-            for i, item in enumerate(headlines):
-                news_fallback.append({
-                    "id": i,
-                    "title": item['title'],
-                    "source": item['source'],
-                    "category": item['category'],
-                    "sentiment": item['sentiment'],
-                    "time": (now - timedelta(minutes=i*15 + random.randint(1, 10))).strftime("%H:%M"),
-                    "timestamp": (now - timedelta(minutes=i*15)).isoformat()
+            return NewsService._fallback_news()
+
+    @staticmethod
+    def catalog_specs():
+        """
+        Catalogs served from `_cache` (refreshed by MarketDataRefresher).
+
+        Returns:
+            dict: name -> (fetch function, max age in seconds)
+        """
+        return {'news': (NewsService._fetch_market_news, NewsService._NEWS_CACHE_DURATION)}
+
+    @staticmethod
+    def refresh_catalog(name, stale=None):
+        """
+        Refetch a catalog and cache it (coalesced per catalog).
+
+        Args:
+            name (str): Key of catalog_specs()
+            stale: Value returned immediately if a refresh is already in flight
+
+        Returns:
+            The fresh catalog, or `stale`
+        """
+        fetch, max_age = NewsService.catalog_specs()[name]
+
+        def load():
+            result = fetch()
+            NewsService._cache.set(name, result, ttl=max_age)
+            return result
+
+        return NewsService._flight.do(name, load, stale=stale)
+
+    @staticmethod
+    def catalog_age(name):
+        """Seconds since the cached catalog was fetched, or None if never fetched."""
+        entry = NewsService._cache.peek(name)
+        return entry[1] if entry else None
+
+    @staticmethod
+    def stats():
+        """Per-feed fetch state and size of the article store."""
+        with NewsService._lock:
+            feeds = []
+            for feed in NewsService._FEEDS:
+                state = NewsService._feed_state.get(feed['url'], {})
+                feeds.append({
+                    'source': feed['source'],
+                    'url': feed['url'],
+                    'status': state.get('status'),
+                    'elapsed_ms': state.get('elapsed_ms'),
+                    'fetched_at': state.get('fetched_at'),
+                    'conditional': bool(state.get('etag') or state.get('modified')),
+                    'error': state.get('error')
                 })
-            return news_fallback
+            return {
+                'articles': len(NewsService._articles),
+                'age': NewsService.catalog_age('news'),
+                'last_refresh_ms': NewsService._last_refresh_ms,
+                'feeds': feeds
+            }
+
+    @staticmethod
+    def search(query=None, source=None, category=None, sentiment=None, limit=20, cursor=None):
+        """
+        Stored articles whose title contains every keyword of `query`,
+        newest first.
+
+        Args:
+            query (str, optional): Free text, tokenized like the titles
+            source, category, sentiment (str, optional): Exact-match filters
+            limit (int): Page size
+            cursor (tuple, optional): (published_at, id) of the last article of the previous page
+
+        Returns:
+            tuple: (list of article dicts, cursor of the next page or None)
+        """
+        articles = NewsArticle.query
+        if query:
+            terms = NewsService._keywords(query)
+            if not terms:
+                return [], None
+            matching = db.session.query(NewsKeyword.article_id).filter(
+                NewsKeyword.keyword.in_(terms)
+            ).group_by(NewsKeyword.article_id).having(func.count() == len(terms))
+            articles = articles.filter(NewsArticle.id.in_(matching))
+        if source:
+            articles = articles.filter(NewsArticle.source == source)
+        if category:
+            articles = articles.filter(NewsArticle.category == category)
+        if sentiment:
+            articles = articles.filter(NewsArticle.sentiment == sentiment)
+        if cursor:
+            published_at, article_id = cursor
+            articles = articles.filter(or_(
+                NewsArticle.published_at < published_at,
+                and_(NewsArticle.published_at == published_at, NewsArticle.id < article_id)
+            ))
+
+        rows = articles.order_by(NewsArticle.published_at.desc(), NewsArticle.id.desc()).limit(limit + 1).all()
+        next_cursor = (rows[limit - 1].published_at, rows[limit - 1].id) if len(rows) > limit else None
+        return [{
+            "id": row.id,
+            "title": row.title,
+            "source": row.source,
+            "category": row.category,
+            "sentiment": row.sentiment,
+            "timestamp": row.published_at.isoformat(),
+            "link": row.link
+        } for row in rows[:limit]], next_cursor
+
+    @staticmethod
+    def _fetch_market_news():
+        """
+        Fetch every feed concurrently and rebuild the news list from the
+        article store. A refresh takes as long as the slowest feed, at most
+        _FETCH_TIMEOUT (plus parsing); a feed that failed or timed out keeps
+        its previous articles.
+        """
+        started = time.time()
+        NewsService._load_history()
+        pool = NewsService._pool()
+        futures = {
+            pool.submit(NewsService._fetch_feed, feed, dict(NewsService._feed_state.get(feed['url'], {}))): feed
+            for feed in NewsService._FEEDS
+        }
+        done, _ = wait(futures, timeout=NewsService._FETCH_TIMEOUT + 1)
+
+        now = time.time()
+        for future, feed in futures.items():
+            with NewsService._lock:
+                state = NewsService._feed_state.setdefault(feed['url'], {})
+            if future not in done:
+                # Left running; its result is ignored (validators untouched)
+                state['error'] = 'timeout'
+                print(f"Error fetching feed {feed['url']}: timed out", flush=True)
+                continue
+            try:
+                status, entries, etag, modified, elapsed = future.result()
+            except Exception as e:
+                state['error'] = str(e)
+                print(f"Error fetching feed {feed['url']}: {e}", flush=True)
+                continue
+
+            state.update(status=status, fetched_at=now, elapsed_ms=round(elapsed * 1000, 1), error=None)
+            added = 0
+            if entries is not None:
+                # Validators only change together with the entries they describe
+                state.update(etag=etag, modified=modified)
+                added = NewsService._ingest(entries, feed, now)
+            print(f"DEBUG: {feed['source']}: HTTP {status}, {added} new entries", flush=True)
+
+        NewsService._prune(now)
+        news_items = NewsService._latest()
+        NewsService._last_refresh_ms = round((time.time() - started) * 1000, 1)
+        if not news_items:
+            raise Exception("No news fetched")
+        return news_items
+
+    @staticmethod
+    def _fetch_feed(feed, state):
+        """
+        Download and parse one feed (runs in the pool). Sends the validators
+        of the last successful fetch, so an unchanged feed costs a 304.
+
+        Returns:
+            tuple: (HTTP status, feedparser entries or None if not modified,
+            ETag, Last-Modified, seconds elapsed)
+        """
+        import feedparser
+        import requests
+
+        started = time.time()
+        headers = {'User-Agent': 'Mozilla/5.0 (compatible; TradeSense/1.0)'}
+        if state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state.get('modified'):
+            headers['If-Modified-Since'] = state['modified']
+
+        response = requests.get(feed['url'], headers=headers, timeout=NewsService._FETCH_TIMEOUT)
+        if response.status_code == 304:
+            return 304, None, state.get('etag'), state.get('modified'), time.time() - started
+        response.raise_for_status()
+
+        parsed = feedparser.parse(response.content)
+        entries = [entry for entry in parsed.entries if entry.get('title')]
+        return (response.status_code, entries, response.headers.get('ETag'),
+                response.headers.get('Last-Modified'), time.time() - started)
+
+    @staticmethod
+    def _ingest(entries, feed, now):
+        """
+        Add the entries not seen yet to the store and to news_articles.
+        Only those are normalized and classified; entries already persisted
+        (by another worker or before a restart) are loaded as they are.
+
+        Returns:
+            int: Number of new articles
+        """
+        by_hash = {}
+        for entry in entries:
+            by_hash.setdefault(NewsService._entry_hash(entry), entry)
+        with NewsService._lock:
+            unseen = [h for h in by_hash if f"hash:{h}" not in NewsService._keys]
+        if not unseen:
+            return 0
+
+        persisted = NewsService._load_articles(unseen)
+        NewsService._store(persisted.values(), now)
+        articles = [NewsService._article(by_hash[h], feed, h) for h in unseen if h not in persisted]
+        for article, sentiment in zip(articles, HeadlineSentiment.classify_batch([a['title'] for a in articles])):
+            article['sentiment'] = sentiment
+        added = NewsService._store(articles, now)
+        NewsService._persist(added)
+        return len(added)
+
+    @staticmethod
+    def _entry_hash(entry):
+        """sha1 of the entry's GUID, or of its link / title when it has none."""
+        guid = entry.get('id') or NewsService._normalized_link(entry.get('link', '')) or entry.get('title', '')
+        return hashlib.sha1(guid.strip().encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _article(entry, feed, guid_hash):
+        """Normalize a feedparser entry (sentiment is classified by the caller, in batch)."""
+        # Format time
+        published_time = datetime.utcnow()  # Default
+        if entry.get('published_parsed'):
+            published_time = datetime(*entry.published_parsed[:6])
+
+        link = entry.get('link', '')
+        return {
+            "hash": guid_hash,
+            "id": entry.get("id", link),
+            "title": entry.title.strip(),
+            "source": feed["source"],
+            "category": feed["category"],
+            "sentiment": "NEUTRAL",
+            "published": published_time,
+            "link": link
+        }
+
+    @staticmethod
+    def _keywords(text):
+        """Indexed keywords of a title or search query: lowercase, without accents or stop words."""
+        text = unicodedata.normalize('NFKD', text.lower())
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+        return sorted({word[:40] for word in re.findall(r'[a-z0-9]+', text)
+                       if len(word) > 1 and word not in _STOPWORDS})
+
+    @staticmethod
+    def _normalized_link(link):
+        """Link without scheme, www. and tracking parameters, or '' if not a URL."""
+        parts = urlsplit(link)
+        if not parts.netloc:
+            return ''
+        query = '&'.join(sorted(p for p in parts.query.split('&') if p and not p.startswith('utm_')))
+        host = parts.netloc.lower()
+        host = host[4:] if host.startswith('www.') else host
+        return f"{host}{parts.path.rstrip('/')}?{query}"
+
+    @staticmethod
+    def _dedup_keys(article):
+        """
+        Keys identifying a story: its GUID hash (the primary key), its link
+        without tracking parameters, and its normalized title (the same wire
+        story is often syndicated by several feeds under different links).
+        """
+        keys = [f"hash:{article['hash']}"]
+        link = NewsService._normalized_link(article['link'] or '')
+        if link:
+            keys.append(f"link:{link}")
+        title = ' '.join(re.sub(r'[^\w\s]', ' ', article['title'].lower()).split())
+        if title:
+            keys.append(f"title:{title}")
+        return keys
+
+    @staticmethod
+    def _store(articles, now):
+        """
+        Add articles to the store, skipping stories it already has.
+
+        Returns:
+            list: The articles that were added
+        """
+        added = []
+        with NewsService._lock:
+            for article in articles:
+                keys = NewsService._dedup_keys(article)
+                existing = next((NewsService._keys[key] for key in keys if key in NewsService._keys), None)
+                if existing is not None:
+                    # Copy of a known story: remember its hash so it is not processed again
+                    NewsService._keys.setdefault(keys[0], existing)
+                    continue
+                article['first_seen'] = now
+                NewsService._articles[keys[0]] = article
+                for key in keys:
+                    NewsService._keys[key] = keys[0]
+                added.append(article)
+        return added
+
+    @staticmethod
+    def _prune(now):
+        """Drop articles past _ARTICLE_TTL and cap the store at _MAX_ARTICLES."""
+        cutoff = datetime.utcnow() - timedelta(seconds=NewsService._ARTICLE_TTL)
+        with NewsService._lock:
+            articles = NewsService._articles
+            expired = [key for key, a in articles.items()
+                       if a['published'] < cutoff and now - a['first_seen'] > NewsService._ARTICLE_TTL]
+            if len(articles) - len(expired) > NewsService._MAX_ARTICLES:
+                newest = sorted(articles, key=lambda key: articles[key]['published'], reverse=True)
+                expired = set(expired) | set(newest[NewsService._MAX_ARTICLES:])
+            for key in expired:
+                del articles[key]
+            if expired:
+                NewsService._keys = {k: v for k, v in NewsService._keys.items() if v in articles}
+
+    # --- Persistence (news_articles) ----------------------------------------
+    # Uses its own session so a refresh inside a request never commits the
+    # request's work; skipped without an app context.
+
+    @staticmethod
+    def _load_history():
+        """Fill the store from news_articles once per process (survives restarts)."""
+        if NewsService._history_loaded or not has_app_context():
+            return
+        NewsService._history_loaded = True
+        cutoff = datetime.utcnow() - timedelta(seconds=NewsService._ARTICLE_TTL)
+        try:
+            with Session(db.engine) as session:
+                rows = session.scalars(
+                    select(NewsArticle).where(NewsArticle.published_at >= cutoff)
+                    .order_by(NewsArticle.published_at.desc()).limit(NewsService._MAX_ARTICLES)
+                ).all()
+                articles = [NewsService._from_row(row) for row in rows]
+            NewsService._store(articles, time.time())
+        except Exception as e:
+            print(f"News history load error: {e}", flush=True)
+
+    @staticmethod
+    def _load_articles(hashes):
+        """hash -> article for the hashes already in news_articles."""
+        if not has_app_context():
+            return {}
+        try:
+            with Session(db.engine) as session:
+                rows = session.scalars(select(NewsArticle).where(NewsArticle.guid_hash.in_(hashes))).all()
+                return {row.guid_hash: NewsService._from_row(row) for row in rows}
+        except Exception as e:
+            print(f"News store lookup error: {e}", flush=True)
+            return {}
+
+    @staticmethod
+    def _persist(articles):
+        """Insert new articles and their keywords."""
+        if not articles or not has_app_context():
+            return
+        try:
+            with Session(db.engine) as session:
+                try:
+                    for article in articles:
+                        NewsService._insert(session, article)
+                    session.commit()
+                except IntegrityError:
+                    # Another worker stored some of them first: insert the rest one by one
+                    session.rollback()
+                    for article in articles:
+                        try:
+                            with session.begin_nested():
+                                NewsService._insert(session, article)
+                        except IntegrityError:
+                            pass
+                    session.commit()
+        except Exception as e:
+            print(f"News store error: {e}", flush=True)
+
+    @staticmethod
+    def _insert(session, article):
+        row = NewsArticle(
+            guid_hash=article['hash'],
+            title=article['title'][:500],
+            link=(article['link'] or None) and article['link'][:1000],
+            source=article['source'],
+            category=article['category'],
+            sentiment=article['sentiment'],
+            published_at=article['published']
+        )
+        session.add(row)
+        session.flush()
+        session.add_all([NewsKeyword(keyword=keyword, article_id=row.id)
+                         for keyword in NewsService._keywords(article['title'])])
+        session.flush()
+
+    @staticmethod
+    def _from_row(row):
+        return {
+            "hash": row.guid_hash,
+            "id": row.link or row.guid_hash,
+            "title": row.title,
+            "source": row.source,
+            "category": row.category,
+            "sentiment": row.sentiment,
+            "published": row.published_at,
+            "link": row.link or ''
+        }
+
+    @staticmethod
+    def _latest():
+        """Newest _PER_FEED articles of each source, newest first, formatted for the API."""
+        with NewsService._lock:
+            by_source = {}
+            for article in NewsService._articles.values():
+                by_source.setdefault(article['source'], []).append(article)
+
+        latest = []
+        for articles in by_source.values():
+            articles.sort(key=lambda a: a['published'], reverse=True)
+            latest.extend(articles[:NewsService._PER_FEED])
+        latest.sort(key=lambda a: a['published'], reverse=True)
+
+        now = datetime.utcnow()
+        news_items = []
+        for article in latest[:NewsService._MAX_ITEMS]:
+            time_diff = now - article['published']
+            if time_diff.total_seconds() < 60:
+                time_str = "A l'instant"
+            elif time_diff.total_seconds() < 3600:
+                time_str = f"Il y a {int(time_diff.total_seconds() / 60)} min"
+            else:
+                time_str = f"Il y a {int(time_diff.total_seconds() / 3600)} h"
+
+            news_items.append({
+                "id": article["id"],
+                "title": article["title"],
+                "source": article["source"],
+                "category": article["category"],
+                "sentiment": article["sentiment"],
+                "time": time_str,
+                "timestamp": article["published"].isoformat(),
+                "link": article["link"]
+            })
+        return news_items
+
+    @staticmethod
+    def _pool():
+        with NewsService._lock:
+            if NewsService._executor is None:
+                NewsService._executor = ThreadPoolExecutor(
+                    max_workers=len(NewsService._FEEDS), thread_name_prefix='news-feed'
+                )
+            return NewsService._executor
+
+    @staticmethod
+    def _fallback_news():
+        """Mock headlines served when no feed could be fetched."""
+        headlines = [
+            {"source": "Bloomberg", "title": "Bitcoin franchit la résistance des 68k$ alors que les ETFs explosent.", "category": "CRYPTO", "sentiment": "POSITIVE"},
+            {"source": "Reuters", "title": "La Fed reste prudente sur les taux d'intérêt, Powell demande de la patience.", "category": "FOREX", "sentiment": "NEUTRAL"},
+            {"source": "Le Boursier", "title": "Maroc Telecom (IAM) annonce une hausse de 3% de son chiffre d'affaires.", "category": "BVC", "sentiment": "POSITIVE"},
+            {"source": "CNBC", "title": "Tesla chute de 2% après l'annonce de nouveaux retards sur le Cybertruck.", "category": "STOCKS", "sentiment": "NEGATIVE"},
+            {"source": "Coindesk", "title": "Solana dépasse BNB en capitalisation boursière.", "category": "CRYPTO", "sentiment": "POSITIVE"},
+            {"source": "ForexLive", "title": "L'Euro chute face au Dollar suite aux mauvais chiffres du PMI Allemand.", "category": "FOREX", "sentiment": "NEGATIVE"},
+            {"source": "Boursenews", "title": "Le MASI clôture en hausse, porté par le secteur bancaire.", "category": "BVC", "sentiment": "POSITIVE"},
+        ]
+
+        # Add timestamps
+        news_fallback = []
+        now = datetime.utcnow()
+        for i, item in enumerate(headlines):
+            news_fallback.append({
+                "id": i,
+                "title": item['title'],
+                "source": item['source'],
+                "category": item['category'],
+                "sentiment": item['sentiment'],
+                "time": (now - timedelta(minutes=i*15 + random.randint(1, 10))).strftime("%H:%M"),
+                "timestamp": (now - timedelta(minutes=i*15)).isoformat()
+            })
+        return news_fallback
 
     @staticmethod
     def generate_ai_summary():
@@ -0,0 +1,146 @@
+"""
+Columnar OHLCV series.
+
+Candles are stored as six contiguous NumPy arrays instead of a list of Python
+dicts. Construction from yfinance DataFrames and random-walk generation are
+vectorized, and the series serializes straight to the JSON shape served by
+/api/trading/price: [{"time", "open", "high", "low", "close", "volume"}, ...].
+"""
+
+import json
+import numpy as np
+
+COLUMNS = ('time', 'open', 'high', 'low', 'close', 'volume')
+
+
+class OHLCVSeries:
+    """
+    Immutable-by-convention candle series, oldest candle first.
+    """
+
+    __slots__ = COLUMNS
+
+    def __init__(self, time, open, high, low, close, volume):
+        self.time = np.ascontiguousarray(time, dtype=np.int64)
+        self.open = np.ascontiguousarray(open, dtype=np.float64)
+        self.high = np.ascontiguousarray(high, dtype=np.float64)
+        self.low = np.ascontiguousarray(low, dtype=np.float64)
+        self.close = np.ascontiguousarray(close, dtype=np.float64)
+        self.volume = np.ascontiguousarray(volume, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.time)
+
+    def __bool__(self):
+        return len(self.time) > 0
+
+    @property
+    def last_close(self):
+        return float(self.close[-1]) if len(self.close) else None
+
+    @property
+    def first_open(self):
+        return float(self.open[0]) if len(self.open) else None
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, column).nbytes for column in COLUMNS)
+
+    def slice(self, start=None, stop=None):
+        """Return a series over [start:stop] (NumPy views, no copy)."""
+        return OHLCVSeries(*(getattr(self, column)[start:stop] for column in COLUMNS))
+
+    def since(self, timestamp):
+        """Return the candles with time >= timestamp (NumPy views, no copy)."""
+        return self.slice(int(np.searchsorted(self.time, timestamp, side='left')))
+
+    def tail(self, n):
+        return self.slice(-n) if n < len(self) else self
+
+    def copy(self):
+        return OHLCVSeries(*(getattr(self, column).copy() for column in COLUMNS))
+
+    def to_records(self):
+        """Convert to the legacy list-of-dicts representation."""
+        return [
+            {"time": t, "open": o, "high": h, "low": l, "close": c, "volume": v}
+            for t, o, h, l, c, v in zip(
+                self.time.tolist(), self.open.tolist(), self.high.tolist(),
+                self.low.tolist(), self.close.tolist(), self.volume.tolist()
+            )
+        ]
+
+    def to_json(self):
+        """Serialize to the /api/trading/price JSON payload."""
+        return json.dumps(self.to_records(), separators=(',', ':'))
+
+    @staticmethod
+    def empty():
+        return OHLCVSeries(*(np.empty(0) for _ in COLUMNS))
+
+    @staticmethod
+    def from_records(records):
+        """Build a series from a list of candle dicts."""
+        if not records:
+            return OHLCVSeries.empty()
+        return OHLCVSeries(*(
+            np.fromiter((r[column] for r in records), dtype=np.float64, count=len(records))
+            for column in COLUMNS
+        ))
+
+    @staticmethod
+    def from_dataframe(hist, default_volume=1000000):
+        """
+        Build a series from a yfinance history DataFrame (DatetimeIndex, OHLCV columns).
+
+        Args:
+            hist (pandas.DataFrame): Output of Ticker.history / yf.download
+            default_volume (int): Volume used where the feed reports none
+        """
+        hist = hist.sort_index()
+        volume = hist['Volume'].to_numpy(dtype=np.float64, na_value=0)
+        return OHLCVSeries(
+            hist.index.as_unit('s').asi8,
+            hist['Open'].to_numpy(dtype=np.float64),
+            hist['High'].to_numpy(dtype=np.float64),
+            hist['Low'].to_numpy(dtype=np.float64),
+            hist['Close'].to_numpy(dtype=np.float64),
+            np.where(volume > 0, volume, default_volume)
+        )
+
+    @staticmethod
+    def random_walk(start_time, count, interval, start_price, volatility, volume_base, rng=None):
+        """
+        Generate `count` GBM candles starting at `start_time`.
+
+        Wicks are independent of the body size to create realistic
+        "TradingView" shapes (Dojis, Hammers), and about 10% of candles get
+        a volume spike.
+
+        Returns:
+            tuple: (OHLCVSeries with prices rounded to 2 decimals, unrounded last close)
+        """
+        rng = rng or np.random.default_rng()
+
+        closes = start_price * np.cumprod(1 + rng.normal(0, volatility, count))
+        opens = np.empty(count)
+        opens[0] = start_price
+        opens[1:] = closes[:-1]
+
+        body_high = np.maximum(opens, closes)
+        body_low = np.minimum(opens, closes)
+        highs = body_high * (1 + np.abs(rng.normal(0, volatility * 0.5, count)))
+        lows = body_low * (1 - np.abs(rng.normal(0, volatility * 0.5, count)))
+
+        volumes = (volume_base * rng.uniform(0.5, 2.0, count)).astype(np.int64)
+        volumes[rng.random(count) > 0.9] *= 3
+
+        series = OHLCVSeries(
+            start_time + interval * np.arange(count, dtype=np.int64),
+            np.round(opens, 2),
+            np.round(highs, 2),
+            np.round(lows, 2),
+            np.round(closes, 2),
+            volumes
+        )
+        return series, float(closes[-1])
@@ -0,0 +1,632 @@
+"""
+Position Index
+
+In-memory inverted index from symbol to open positions (user id, side,
+quantity, entry price). It answers "who holds BTC-USD, and how much" without
+scanning the trades table, and powers:
+
+- bulk mark-to-market: a price move on one symbol re-marks only the accounts
+  holding it (RiskMonitor)
+- per-symbol exposure reports for admins (/api/admin/exposure)
+- screening accounts against the risk rules in one vectorized pass
+
+Each symbol's positions live in a SymbolBook of numpy arrays. Re-marking a
+symbol is one vectorized P&L computation and a bincount per account; each
+account's unrealized P&L is the sum of its per-symbol contributions and is
+updated by difference, so a tick costs O(positions in that symbol). The
+inputs of the risk rules (balance, initial capital, daily starting equity,
+challenge limits) are stored per account next to the P&L.
+
+The index is built from the trades table in one streaming query and kept
+consistent by the session hooks at the bottom of this module: committed
+opens, closes and balance / status changes are applied as they are, other
+changes (challenges, deleted rows) reload the account. They are queued on
+commit and applied by the next sync(), so a commit never waits on the index.
+A periodic rebuild picks up commits made by other processes.
+"""
+
+import threading
+import time
+import numpy as np
+from sqlalchemy import event, and_
+from ..models import db, User, Trade, UserChallenge
+
+
+class SymbolBook:
+    """
+    Open positions of one symbol as parallel arrays, plus their unrealized
+    P&L per account at the last mark. Removing a position moves the last row
+    into its place, so opens and closes are O(1).
+    """
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.mark = None
+        self.accounts = np.empty(0, dtype=np.int64)  # distinct slots, aligned with contrib
+        self.contrib = np.empty(0)
+        self._rows = {}                              # trade_id -> row
+        self._trade_ids = np.empty(0, dtype=np.int64)
+        self._slots = np.empty(0, dtype=np.int64)
+        self._qty = np.empty(0)                      # signed: > 0 long, < 0 short
+        self._entry = np.empty(0)
+        self._grouping = None
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, trade_id, slot, signed_qty, entry):
+        if trade_id in self._rows:
+            self.remove(trade_id)
+        row = len(self._rows)
+        if row >= len(self._trade_ids):
+            self._grow(max(16, 2 * len(self._trade_ids)))
+        self._trade_ids[row] = trade_id
+        self._slots[row] = slot
+        self._qty[row] = signed_qty
+        self._entry[row] = entry
+        self._rows[trade_id] = row
+        self._grouping = None
+
+    def remove(self, trade_id):
+        row = self._rows.pop(trade_id, None)
+        if row is None:
+            return False
+        last = len(self._rows)
+        if row != last:
+            for array in (self._trade_ids, self._slots, self._qty, self._entry):
+                array[row] = array[last]
+            self._rows[int(self._trade_ids[row])] = row
+        self._grouping = None
+        return True
+
+    def view(self):
+        """(trade_ids, slots, signed_qty, entry) of the open positions."""
+        n = len(self._rows)
+        return self._trade_ids[:n], self._slots[:n], self._qty[:n], self._entry[:n]
+
+    def grouping(self):
+        """(accounts, inverse): distinct slots and each position's index into them."""
+        if self._grouping is None:
+            self._grouping = np.unique(self._slots[:len(self._rows)], return_inverse=True)
+        return self._grouping
+
+    def _grow(self, capacity):
+        for name in ('_trade_ids', '_slots', '_qty', '_entry'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+
+class PositionIndex:
+    """
+    Process-wide symbol -> open positions index with per-account risk inputs.
+    """
+
+    REBUILD_INTERVAL = 600  # seconds; bounds drift from commits in other processes
+    REBUILD_BATCH = 5000    # rows per round trip while streaming a rebuild
+
+    _books = {}              # symbol -> SymbolBook
+    _slots = {}              # user_id -> slot
+    _trades = {}             # trade_id -> (symbol, slot)
+    _positions_by_slot = {}  # slot -> set of trade ids
+    _size = 0
+    _user_ids = np.empty(0, dtype=np.int64)
+    _balance = np.empty(0)
+    _initial = np.empty(0)
+    _daily_start = np.empty(0)
+    _max_total = np.empty(0)
+    _max_daily = np.empty(0)
+    _target = np.empty(0)
+    _active = np.empty(0, dtype=bool)
+    _unrealized = np.empty(0)
+    _ACCOUNT_ARRAYS = ('_user_ids', '_balance', '_initial', '_daily_start', '_max_total',
+                       '_max_daily', '_target', '_active', '_unrealized')
+    _built_at = None
+    _ops = []                # committed changes not applied yet, in commit order
+    _dirty = set()           # accounts to reload from the database
+    _lock = threading.RLock()
+    _ops_lock = threading.Lock()
+
+    # --- Maintenance --------------------------------------------------------
+
+    @staticmethod
+    def rebuild():
+        """
+        Reload every open position and its account with one streaming query.
+
+        Returns:
+            np.ndarray: Slots of all indexed accounts
+        """
+        rows = PositionIndex._position_rows().execution_options(yield_per=PositionIndex.REBUILD_BATCH)
+        with PositionIndex._lock:
+            PositionIndex._reset()
+            PositionIndex._dirty.clear()
+            # Set first so changes committed while streaming are queued
+            PositionIndex._built_at = time.time()
+            try:
+                touched = PositionIndex._load(rows)
+            except Exception:
+                PositionIndex._built_at = None
+                raise
+            # Replaying changes the query already saw is harmless
+            touched |= PositionIndex._apply_ops()
+            PositionIndex._remark_books(touched)
+            return np.arange(PositionIndex._size, dtype=np.int64)
+
+    @staticmethod
+    def sync():
+        """
+        Bring the index up to date: rebuild when due, otherwise apply the
+        changes committed since the last sync.
+
+        Returns:
+            np.ndarray: Slots of the accounts that changed
+        """
+        built_at = PositionIndex._built_at
+        if built_at is None or time.time() - built_at > PositionIndex.REBUILD_INTERVAL:
+            return PositionIndex.rebuild()
+
+        with PositionIndex._lock:
+            changed = set()
+            touched = PositionIndex._apply_ops(changed)
+
+            dirty = list(PositionIndex._dirty)
+            PositionIndex._dirty.clear()
+            if dirty:
+                touched |= PositionIndex._drop_positions(dirty)
+                for user_id in dirty:
+                    slot = PositionIndex._slots.get(user_id)
+                    if slot is not None:
+                        # Re-activated by _load if the account still has positions
+                        PositionIndex._active[slot] = False
+                touched |= PositionIndex._load(PositionIndex._position_rows(dirty).all())
+                changed.update(PositionIndex._slots[u] for u in dirty if u in PositionIndex._slots)
+
+            PositionIndex._remark_books(touched)
+            return np.array(sorted(changed), dtype=np.int64)
+
+    @staticmethod
+    def mark_dirty(*user_ids):
+        """Reload these accounts from the database on the next sync."""
+        PositionIndex.enqueue([('reload', user_id) for user_id in user_ids])
+
+    @staticmethod
+    def enqueue(ops):
+        """Queue committed changes for the next sync (see the session hooks below)."""
+        if PositionIndex._built_at is None:
+            # The rebuild reads them from the database
+            return
+        with PositionIndex._ops_lock:
+            PositionIndex._ops.extend(ops)
+
+    @staticmethod
+    def invalidate():
+        """Force a full rebuild on the next sync."""
+        with PositionIndex._lock:
+            PositionIndex._built_at = None
+
+    @staticmethod
+    def has_pending():
+        """Whether sync() has changes to apply (or a rebuild to do)."""
+        return PositionIndex._built_at is None or bool(PositionIndex._ops) or bool(PositionIndex._dirty)
+
+    # --- Marking and screening ----------------------------------------------
+
+    @staticmethod
+    def mark(symbol, price):
+        """
+        Re-mark every position in `symbol` at `price`.
+
+        Returns:
+            np.ndarray: Slots of the accounts holding the symbol
+        """
+        with PositionIndex._lock:
+            book = PositionIndex._books.get(symbol)
+            if book is None:
+                return np.empty(0, dtype=np.int64)
+            return PositionIndex._remark(book, price)
+
+    @staticmethod
+    def breaches(slots):
+        """
+        Screen accounts against the drawdown, daily loss and profit target
+        rules at their current marks.
+
+        Args:
+            slots (np.ndarray): Account slots to screen
+
+        Returns:
+            list: User ids whose equity crosses a limit or the profit target
+        """
+        with PositionIndex._lock:
+            slots = np.unique(np.asarray(slots, dtype=np.int64))
+            slots = slots[PositionIndex._active[slots]]
+            if not len(slots):
+                return []
+
+            initial = PositionIndex._initial[slots]
+            equity = PositionIndex._balance[slots] + PositionIndex._unrealized[slots]
+            total_loss_pct = (initial - equity) * 100 / initial
+            daily_loss_pct = (PositionIndex._daily_start[slots] - equity) * 100 / initial
+            hit = (
+                (total_loss_pct >= PositionIndex._max_total[slots])
+                | (daily_loss_pct >= PositionIndex._max_daily[slots])
+                | (-total_loss_pct >= PositionIndex._target[slots])
+            )
+            return PositionIndex._user_ids[slots[hit]].tolist()
+
+    # --- Exposure -----------------------------------------------------------
+
+    @staticmethod
+    def exposure(symbol=None):
+        """
+        Aggregate exposure per symbol at the last mark (positions without a
+        mark are valued at entry).
+
+        Args:
+            symbol (str, optional): Only this symbol
+
+        Returns:
+            list: One summary dict per symbol, largest gross notional first
+        """
+        with PositionIndex._lock:
+            if symbol is None:
+                books = list(PositionIndex._books.values())
+            else:
+                books = [PositionIndex._books[symbol]] if symbol in PositionIndex._books else []
+            summaries = [PositionIndex._summary(book) for book in books]
+        return sorted(summaries, key=lambda s: s['gross_notional'], reverse=True)
+
+    @staticmethod
+    def holders(symbol, limit=50):
+        """
+        Accounts holding `symbol`, largest gross notional first.
+
+        Returns:
+            list: dicts with user_id, positions, net_quantity, gross_notional, unrealized_pnl
+        """
+        with PositionIndex._lock:
+            book = PositionIndex._books.get(symbol)
+            if book is None:
+                return []
+            _, _, qty, entry = book.view()
+            accounts, inverse = book.grouping()
+            prices = PositionIndex._prices(book, entry)
+            count = np.bincount(inverse, minlength=len(accounts))
+            net = np.bincount(inverse, weights=qty, minlength=len(accounts))
+            gross = np.bincount(inverse, weights=np.abs(qty) * prices, minlength=len(accounts))
+            order = np.argsort(-gross, kind='stable')[:limit]
+            return [{
+                'user_id': int(PositionIndex._user_ids[accounts[i]]),
+                'positions': int(count[i]),
+                'net_quantity': round(float(net[i]), 8),
+                'gross_notional': round(float(gross[i]), 2),
+                'unrealized_pnl': round(float(book.contrib[i]), 2)
+            } for i in order]
+
+    @staticmethod
+    def positions(symbol, limit=None):
+        """
+        Open positions in `symbol`.
+
+        Returns:
+            list: dicts with trade_id, user_id, side, quantity, entry_price
+        """
+        with PositionIndex._lock:
+            book = PositionIndex._books.get(symbol)
+            if book is None:
+                return []
+            trade_ids, slots, qty, entry = (array[:limit] for array in book.view())
+            user_ids = PositionIndex._user_ids[slots]
+            return [{
+                'trade_id': int(trade_id),
+                'user_id': int(user_id),
+                'side': 'BUY' if q > 0 else 'SELL',
+                'quantity': float(abs(q)),
+                'entry_price': float(e)
+            } for trade_id, user_id, q, e in zip(trade_ids, user_ids, qty, entry)]
+
+    @staticmethod
+    def holds(symbol):
+        return symbol in PositionIndex._books
+
+    @staticmethod
+    def last_price(symbol):
+        """Last mark of a held symbol (or the latest entry price if not marked yet), None if not held."""
+        with PositionIndex._lock:
+            book = PositionIndex._books.get(symbol)
+            if book is None:
+                return None
+            if book.mark is not None:
+                return float(book.mark)
+            entry = book.view()[3]
+            return float(entry[-1]) if len(entry) else None
+
+    @staticmethod
+    def symbols():
+        with PositionIndex._lock:
+            return list(PositionIndex._books)
+
+    @staticmethod
+    def stats():
+        with PositionIndex._lock:
+            return {
+                'built': PositionIndex._built_at is not None,
+                'built_at': PositionIndex._built_at,
+                'accounts': PositionIndex._size,
+                'active_accounts': int(PositionIndex._active[:PositionIndex._size].sum()),
+                'symbols': len(PositionIndex._books),
+                'positions': len(PositionIndex._trades),
+                'pending_changes': len(PositionIndex._ops),
+                'dirty': len(PositionIndex._dirty)
+            }
+
+    # --- Internals ----------------------------------------------------------
+
+    @staticmethod
+    def _position_rows(user_ids=None):
+        """
+        Open positions joined with their account's risk inputs, one row per
+        position: trade id, user id, symbol, side, quantity, entry price,
+        balance, initial capital, daily starting equity, status and the
+        active challenge's limits (None without one).
+        """
+        query = db.session.query(
+            Trade.id, Trade.user_id, Trade.symbol, Trade.type, Trade.quantity, Trade.price,
+            User.balance, User.initial_capital, User.daily_starting_equity, User.status,
+            UserChallenge.max_total_loss, UserChallenge.max_daily_loss, UserChallenge.profit_target
+        ).join(User, User.id == Trade.user_id).outerjoin(UserChallenge, and_(
+            UserChallenge.user_id == Trade.user_id, UserChallenge.challenge_status == 'active'
+        )).filter(Trade.status == 'OPEN')
+        if user_ids is not None:
+            query = query.filter(Trade.user_id.in_(list(user_ids)))
+        return query
+
+    @staticmethod
+    def _load(rows):
+        """Index position rows (see _position_rows); returns the symbols touched."""
+        from .risk_manager import RiskManager
+
+        touched = set()
+        for (trade_id, user_id, symbol, side, quantity, price,
+             balance, initial, daily_start, status, max_total, max_daily, target) in rows:
+            slot = PositionIndex._slot(user_id)
+            PositionIndex._set_account(slot, balance, initial, daily_start, status)
+            PositionIndex._max_total[slot] = max_total if max_total is not None else RiskManager.MAX_TOTAL_DRAWDOWN_PERCENT
+            PositionIndex._max_daily[slot] = max_daily if max_daily is not None else RiskManager.MAX_DAILY_LOSS_PERCENT
+            PositionIndex._target[slot] = target if target is not None else RiskManager.PROFIT_TARGET_PERCENT
+            # Several active challenges repeat the row; the position is kept once
+            PositionIndex._add_position(trade_id, slot, symbol, side, quantity, price)
+            touched.add(symbol)
+        return touched
+
+    @staticmethod
+    def _apply_ops(changed=None):
+        """Apply queued changes in commit order; returns the symbols whose books changed."""
+        with PositionIndex._ops_lock:
+            ops, PositionIndex._ops = PositionIndex._ops, []
+
+        changed = set() if changed is None else changed
+        touched = set()
+        for op in ops:
+            kind = op[0]
+            if kind == 'open':
+                _, trade_id, user_id, symbol, side, quantity, price = op
+                slot = PositionIndex._slots.get(user_id)
+                if slot is None:
+                    # First position of an account we hold no risk inputs for
+                    PositionIndex._dirty.add(user_id)
+                    continue
+                PositionIndex._add_position(trade_id, slot, symbol, side, quantity, price)
+                touched.add(symbol)
+                changed.add(slot)
+            elif kind == 'close':
+                entry = PositionIndex._trades.pop(op[1], None)
+                if entry is None:
+                    continue
+                symbol, slot = entry
+                PositionIndex._books[symbol].remove(op[1])
+                PositionIndex._positions_by_slot.get(slot, set()).discard(op[1])
+                touched.add(symbol)
+                changed.add(slot)
+            elif kind == 'account':
+                _, user_id, balance, initial, daily_start, status = op
+                slot = PositionIndex._slots.get(user_id)
+                if slot is not None:
+                    PositionIndex._set_account(slot, balance, initial, daily_start, status)
+                    changed.add(slot)
+            else:
+                PositionIndex._dirty.add(op[1])
+        return touched
+
+    @staticmethod
+    def _set_account(slot, balance, initial, daily_start, status):
+        initial = initial or 0.0
+        PositionIndex._balance[slot] = balance or 0.0
+        PositionIndex._initial[slot] = initial if initial > 0 else 1.0
+        PositionIndex._daily_start[slot] = daily_start if daily_start is not None else initial
+        # check_risk_rules divides by initial capital; nothing to screen without one
+        PositionIndex._active[slot] = (status or 'ACTIVE') == 'ACTIVE' and initial > 0
+
+    @staticmethod
+    def _add_position(trade_id, slot, symbol, side, quantity, price):
+        book = PositionIndex._books.get(symbol)
+        if book is None:
+            book = PositionIndex._books[symbol] = SymbolBook(symbol)
+            book.mark = PositionIndex._last_price(symbol)
+        signed_qty = (quantity or 0.0) * (1.0 if side == 'BUY' else -1.0)
+        book.add(trade_id, slot, signed_qty, price or 0.0)
+        PositionIndex._trades[trade_id] = (symbol, slot)
+        PositionIndex._positions_by_slot.setdefault(slot, set()).add(trade_id)
+
+    @staticmethod
+    def _drop_positions(user_ids):
+        """Remove the users' positions from their books; returns the affected symbols."""
+        touched = set()
+        for user_id in user_ids:
+            slot = PositionIndex._slots.get(user_id)
+            if slot is None:
+                continue
+            for trade_id in PositionIndex._positions_by_slot.pop(slot, set()):
+                symbol, _ = PositionIndex._trades.pop(trade_id)
+                PositionIndex._books[symbol].remove(trade_id)
+                touched.add(symbol)
+        return touched
+
+    @staticmethod
+    def _remark_books(symbols):
+        """Recompute the contributions of books whose positions changed."""
+        for symbol in symbols:
+            book = PositionIndex._books.get(symbol)
+            if book is None:
+                continue
+            PositionIndex._remark(book, book.mark)
+            if not len(book):
+                del PositionIndex._books[symbol]
+
+    @staticmethod
+    def _remark(book, price):
+        _, _, qty, entry = book.view()
+        accounts, inverse = book.grouping()
+        unrealized = PositionIndex._unrealized
+
+        # Retract the previous contribution (its layout predates any change)
+        if len(book.accounts):
+            unrealized[book.accounts] -= book.contrib
+
+        if price is None or not len(qty):
+            # No mark: positions are valued at entry, as in EquityEngine
+            contrib = np.zeros(len(accounts))
+        else:
+            contrib = np.bincount(inverse, weights=(price - entry) * qty, minlength=len(accounts))
+        unrealized[accounts] += contrib
+
+        book.accounts, book.contrib, book.mark = accounts, contrib, price
+        return accounts
+
+    @staticmethod
+    def _summary(book):
+        _, _, qty, entry = book.view()
+        prices = PositionIndex._prices(book, entry)
+        long = qty > 0
+        long_qty = float(qty[long].sum())
+        short_qty = float(-qty[~long].sum())
+        return {
+            'symbol': book.symbol,
+            'mark': book.mark,
+            'positions': len(qty),
+            'accounts': len(book.grouping()[0]),
+            'long_quantity': round(long_qty, 8),
+            'short_quantity': round(short_qty, 8),
+            'net_quantity': round(long_qty - short_qty, 8),
+            'avg_long_entry': round(float((entry[long] * qty[long]).sum()) / long_qty, 4) if long_qty else None,
+            'avg_short_entry': round(float((entry[~long] * qty[~long]).sum()) / -short_qty, 4) if short_qty else None,
+            'gross_notional': round(float((np.abs(qty) * prices).sum()), 2),
+            'net_notional': round(float((qty * prices).sum()), 2),
+            'unrealized_pnl': round(float(book.contrib.sum()), 2)
+        }
+
+    @staticmethod
+    def _prices(book, entry):
+        """Valuation price per position: the book's mark, or entry without one."""
+        return entry if book.mark is None else np.full(len(entry), book.mark)
+
+    @staticmethod
+    def _last_price(symbol):
+        from .mark_price_store import MarkPriceStore
+        mark = MarkPriceStore.last_mark(symbol)
+        return mark.price if mark else None
+
+    @staticmethod
+    def _slot(user_id):
+        slot = PositionIndex._slots.get(user_id)
+        if slot is not None:
+            return slot
+
+        slot = PositionIndex._size
+        if slot >= len(PositionIndex._user_ids):
+            PositionIndex._grow(max(64, 2 * len(PositionIndex._user_ids)))
+        PositionIndex._slots[user_id] = slot
+        PositionIndex._user_ids[slot] = user_id
+        PositionIndex._size += 1
+        return slot
+
+    @staticmethod
+    def _grow(capacity):
+        for name in PositionIndex._ACCOUNT_ARRAYS:
+            old = getattr(PositionIndex, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(PositionIndex, name, new)
+
+    @staticmethod
+    def _reset():
+        PositionIndex._books = {}
+        PositionIndex._slots = {}
+        PositionIndex._trades = {}
+        PositionIndex._positions_by_slot = {}
+        PositionIndex._size = 0
+        for name in PositionIndex._ACCOUNT_ARRAYS:
+            setattr(PositionIndex, name, np.empty(0, dtype=getattr(PositionIndex, name).dtype))
+
+
+_ACCOUNT_FIELDS = ('balance', 'initial_capital', 'daily_starting_equity', 'status')
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_reloads(session, flush_context, instances):
+    # Changes the index cannot apply as they are: reload the account instead
+    ops = session.info.setdefault('position_index_ops', [])
+    for obj in session.deleted:
+        if isinstance(obj, User) and obj.id is not None:
+            ops.append(('reload', obj.id))
+        elif isinstance(obj, Trade) and obj.user_id is not None:
+            ops.append(('reload', obj.user_id))
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, UserChallenge) and obj.user_id is not None:
+            ops.append(('reload', obj.user_id))
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_changes(session, flush_context):
+    # Flushed values are still on the objects here; they expire on commit
+    ops = session.info.setdefault('position_index_ops', [])
+    for obj in session.new:
+        if isinstance(obj, Trade) and obj.__dict__.get('status') == 'OPEN':
+            ops.append(('open', obj.id, obj.user_id, obj.symbol, obj.type, obj.quantity, obj.price))
+    for obj in session.dirty:
+        if isinstance(obj, Trade):
+            if obj.__dict__.get('status', 'OPEN') != 'OPEN':
+                ops.append(('close', obj.id, obj.user_id))
+            else:
+                ops.append(('reload', obj.user_id))
+        elif isinstance(obj, User):
+            if all(name in obj.__dict__ for name in _ACCOUNT_FIELDS):
+                ops.append(('account', obj.id) + tuple(obj.__dict__[name] for name in _ACCOUNT_FIELDS))
+            else:
+                # Expired attribute, e.g. a SQL expression was assigned
+                ops.append(('reload', obj.id))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _enqueue_changes(session):
+    # Also fired when a SAVEPOINT is released: the rows can still roll back
+    if session.in_nested_transaction():
+        return
+    ops = session.info.pop('position_index_ops', None)
+    if ops:
+        PositionIndex.enqueue(ops)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_changes(session):
+    if not session.in_nested_transaction():
+        session.info.pop('position_index_ops', None)
+        return
+    # Rolled back SAVEPOINT: the ops may describe rows that are gone, reload
+    # the accounts they touch from what the outer transaction commits
+    ops = session.info.get('position_index_ops')
+    if ops:
+        user_ids = {op[2] if op[0] in ('open', 'close') else op[1] for op in ops}
+        session.info['position_index_ops'] = [('reload', user_id) for user_id in user_ids]
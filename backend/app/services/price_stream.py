@@ -0,0 +1,273 @@
+"""
+Price Stream
+
+Shared fan-out publisher behind GET /api/trading/stream (Server-Sent Events).
+
+One background thread ticks the union of all subscribed symbols through
+FeedService / MarkPriceStore, computes a delta per symbol once (new or
+changed candles since the last tick, plus the current mark) and pushes it to
+the queue of every subscriber of that symbol. Clients get one connection and
+small messages instead of polling full candle payloads per endpoint.
+
+Each open stream holds a server thread, so a worker accepts at most
+max_clients() streams (STREAM_MAX_CLIENTS) and ends each one after
+MAX_STREAM_SECONDS; clients turned away fall back to polling /price. The
+slots are shared with the other SSE endpoints (acquire_slot / release_slot).
+"""
+
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+
+
+class Subscription:
+    """
+    A client's view of the stream: the symbols it follows and its outbox.
+    """
+
+    QUEUE_SIZE = 256
+
+    def __init__(self, subscription_id, symbols):
+        self.id = subscription_id
+        self.symbols = frozenset(symbols)
+        self.queue = queue.Queue(maxsize=Subscription.QUEUE_SIZE)
+        self.dropped = 0
+
+    def push(self, message):
+        """Enqueue a message; a slow client loses its oldest pending update."""
+        while True:
+            try:
+                self.queue.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """Next message, or None after `timeout` seconds without one."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class PriceStream:
+    """
+    Process-wide publisher. The thread starts with the first subscriber and
+    idles (without ticking anything) while nobody is connected.
+    """
+
+    TICK_INTERVAL = 2  # seconds between publisher passes
+    MAX_SYMBOLS = 20   # per subscription
+    MAX_CLIENTS = 16   # per worker process, half of the gunicorn threads (render.yaml)
+    MAX_STREAM_SECONDS = 300  # then the browser reconnects, possibly to another worker
+
+    _subscriptions = {}
+    _slots = 0         # open SSE streams of this process, all endpoints
+    _cursors = {}      # symbol -> (last candle time, last candle close, mark timestamp)
+    _ids = itertools.count(1)
+    _lock = threading.Lock()
+    _wakeup = threading.Event()
+    _thread = None
+
+    @staticmethod
+    def subscribe(symbols):
+        """
+        Register a subscriber and return it with a snapshot for each symbol.
+
+        Args:
+            symbols (iterable): Tickers as accepted by /api/trading/price
+
+        Returns:
+            tuple: (Subscription, list of snapshot messages), or (None, None)
+            when the worker already serves max_clients() streams
+        """
+        if not PriceStream.acquire_slot():
+            return None, None
+        try:
+            symbols = list(dict.fromkeys(s for s in symbols if s))[:PriceStream.MAX_SYMBOLS]
+            subscription = Subscription(next(PriceStream._ids), symbols)
+            snapshots = [PriceStream._snapshot(symbol) for symbol in symbols]
+        except Exception:
+            PriceStream.release_slot()
+            raise
+
+        with PriceStream._lock:
+            PriceStream._subscriptions[subscription.id] = subscription
+            PriceStream._ensure_thread()
+        PriceStream._wakeup.set()
+        return subscription, snapshots
+
+    @staticmethod
+    def acquire_slot():
+        """
+        Reserve a stream slot of this process.
+
+        Returns:
+            bool: False when max_clients() streams are already open
+        """
+        with PriceStream._lock:
+            if PriceStream._slots >= PriceStream.max_clients():
+                return False
+            PriceStream._slots += 1
+            return True
+
+    @staticmethod
+    def release_slot():
+        with PriceStream._lock:
+            PriceStream._slots = max(0, PriceStream._slots - 1)
+
+    @staticmethod
+    def max_clients():
+        """Open streams allowed per process (STREAM_MAX_CLIENTS, default MAX_CLIENTS)."""
+        try:
+            return int(os.environ.get('STREAM_MAX_CLIENTS', PriceStream.MAX_CLIENTS))
+        except ValueError:
+            return PriceStream.MAX_CLIENTS
+
+    @staticmethod
+    def unsubscribe(subscription):
+        """Remove a subscriber and free its slot (safe to call more than once)."""
+        with PriceStream._lock:
+            if PriceStream._subscriptions.pop(subscription.id, None) is None:
+                return
+            PriceStream._slots = max(0, PriceStream._slots - 1)
+            active = PriceStream._active_symbols()
+            for symbol in list(PriceStream._cursors):
+                if symbol not in active:
+                    del PriceStream._cursors[symbol]
+
+    @staticmethod
+    def stats():
+        with PriceStream._lock:
+            return {
+                'subscribers': len(PriceStream._subscriptions),
+                'streams': PriceStream._slots,
+                'max_clients': PriceStream.max_clients(),
+                'symbols': sorted(PriceStream._active_symbols()),
+                'dropped': sum(s.dropped for s in PriceStream._subscriptions.values())
+            }
+
+    @staticmethod
+    def format_sse(event, message):
+        """Encode a message as a Server-Sent Events frame."""
+        return f"event: {event}\ndata: {json.dumps(message, separators=(',', ':'))}\n\n"
+
+    @staticmethod
+    def publish_tick():
+        """
+        Compute one delta per subscribed symbol and fan it out.
+
+        Returns:
+            int: Number of symbols that produced an update
+        """
+        with PriceStream._lock:
+            subscribers = list(PriceStream._subscriptions.values())
+        symbols = set().union(*(s.symbols for s in subscribers)) if subscribers else set()
+
+        updates = {}
+        for symbol in symbols:
+            try:
+                delta = PriceStream._delta(symbol)
+            except Exception as e:
+                print(f"PriceStream: {symbol} tick failed: {e}")
+                continue
+            if delta:
+                updates[symbol] = delta
+
+        for subscription in subscribers:
+            for symbol in subscription.symbols:
+                if symbol in updates:
+                    subscription.push(updates[symbol])
+        return len(updates)
+
+    @staticmethod
+    def _snapshot(symbol):
+        """Full current window for a new subscriber (seeds the shared cursor if unset)."""
+        from .feed_service import FeedService
+        from .mark_price_store import MarkPriceStore
+
+        series = FeedService.get_series(symbol)
+        mark = MarkPriceStore.get_mark(symbol)
+        if series:
+            PriceStream._cursors.setdefault(symbol, (
+                int(series.time[-1]), float(series.close[-1]), mark.timestamp if mark else None
+            ))
+        return {
+            'type': 'snapshot',
+            'symbol': symbol,
+            'candles': series.to_records(),
+            'mark': PriceStream._mark_payload(mark)
+        }
+
+    @staticmethod
+    def _delta(symbol):
+        """
+        Candles added or changed since the previous tick for `symbol`, plus the
+        mark. Returns None when nothing moved.
+        """
+        from .feed_service import FeedService
+        from .mark_price_store import MarkPriceStore
+
+        series = FeedService.get_series(symbol)
+        mark = MarkPriceStore.get_mark(symbol)
+        if not series:
+            return None
+
+        last_time = int(series.time[-1])
+        last_close = float(series.close[-1])
+        mark_ts = mark.timestamp if mark else None
+        cursor = PriceStream._cursors.get(symbol)
+        PriceStream._cursors[symbol] = (last_time, last_close, mark_ts)
+
+        if cursor is None or cursor == (last_time, last_close, mark_ts):
+            return None
+
+        # The candle at the cursor may still be forming, so resend it
+        return {
+            'type': 'update',
+            'symbol': symbol,
+            'candles': series.since(cursor[0]).to_records(),
+            'mark': PriceStream._mark_payload(mark)
+        }
+
+    @staticmethod
+    def _mark_payload(mark):
+        if mark is None:
+            return None
+        return {'price': mark.price, 'timestamp': mark.timestamp, 'source': mark.source}
+
+    @staticmethod
+    def _active_symbols():
+        symbols = set()
+        for subscription in PriceStream._subscriptions.values():
+            symbols |= subscription.symbols
+        return symbols
+
+    @staticmethod
+    def _ensure_thread():
+        if PriceStream._thread is not None and PriceStream._thread.is_alive():
+            return
+        PriceStream._thread = threading.Thread(target=PriceStream._run, name='price-stream', daemon=True)
+        PriceStream._thread.start()
+
+    @staticmethod
+    def _run():
+        while True:
+            if not PriceStream._subscriptions:
+                # Sleep until someone subscribes
+                PriceStream._wakeup.wait()
+            PriceStream._wakeup.clear()
+
+            started = time.time()
+            try:
+                PriceStream.publish_tick()
+            except Exception as e:
+                print(f"PriceStream error: {e}")
+            time.sleep(max(0.0, PriceStream.TICK_INTERVAL - (time.time() - started)))
@@ -5,9 +5,10 @@ This module implements strict risk rules to protect capital and ensure complianc
 with prop trading firm regulations.
 """
 
-from datetime import datetime, timedelta
-from ..models import User, Trade, db, UserChallenge
-from sqlalchemy import desc
+from datetime import datetime
+from ..models import db
+from .equity_engine import EquityEngine
+from .account_context import AccountContext
 
 
 class RiskManager:
@@ -25,12 +26,13 @@ class RiskManager:
     PROFIT_TARGET_PERCENT = 10.0       # 10% profit target to PASS the challenge
     
     @staticmethod
-    def check_risk_rules(user_id):
+    def check_risk_rules(user_id, context=None):
         """
         Check if user has violated any risk rules.
         
         Args:
             user_id (int): The user ID to check
+            context (AccountContext, optional): Account state already loaded by the caller
             
         Returns:
             dict: {
@@ -40,20 +42,18 @@ class RiskManager:
                 'violations': list
             }
         """
-        user = User.query.get(user_id)
-        if not user:
+        context = RiskManager._context(user_id, context)
+        if not context:
             return {
                 'allowed': False,
                 'status': 'ERROR',
                 'reason': 'User not found',
                 'violations': []
             }
+        user = context.user
         
         # Determine rules source (Active Challenge or Defaults)
-        active_challenge = UserChallenge.query.filter_by(
-            user_id=user_id, 
-            challenge_status='active'
-        ).first()
+        active_challenge = context.active_challenge
         
         # Default limits
         max_total_drawdown_pct = RiskManager.MAX_TOTAL_DRAWDOWN_PERCENT
@@ -87,10 +87,10 @@ class RiskManager:
         violations = []
         
         # Calculate current equity (balance + unrealized P&L from open positions)
-        current_equity = RiskManager._calculate_current_equity(user_id)
+        current_equity = RiskManager._calculate_current_equity(user_id, context)
         
         # Check 1: Reset daily equity if it's a new day
-        RiskManager._reset_daily_equity_if_needed(user)
+        RiskManager._reset_daily_equity_if_needed(user, current_equity)
         
         # Check 2: Total Drawdown Rule
         total_loss = user.initial_capital - current_equity
@@ -139,6 +139,7 @@ class RiskManager:
             if active_challenge:
                 active_challenge.challenge_status = 'failed'
                 active_challenge.completed_at = datetime.utcnow()
+                context.end_challenge()
                 
             db.session.commit()
             
@@ -162,6 +163,7 @@ class RiskManager:
             if active_challenge:
                 active_challenge.challenge_status = 'passed'
                 active_challenge.completed_at = datetime.utcnow()
+                context.end_challenge()
                 
             db.session.commit()
             
@@ -193,88 +195,64 @@ class RiskManager:
         }
     
     @staticmethod
-    def _calculate_current_equity(user_id):
+    def _calculate_current_equity(user_id, context=None):
         """
         Calculate current equity including unrealized P&L from open positions.
         
         Args:
             user_id (int): The user ID
+            context (AccountContext, optional): Account state already loaded by the caller
             
         Returns:
             float: Current equity value
         """
-        from ..services.feed_service import FeedService
-        
-        user = User.query.get(user_id)
-        if not user:
+        context = RiskManager._context(user_id, context)
+        if not context:
+            return 0
+        snapshot = EquityEngine.get_snapshot(user_id, user=context.user, positions=context.positions)
+        if not snapshot:
             return 0
         
-        # Start with current balance
-        equity = user.balance
-        
-        # Add unrealized P&L from open positions
-        open_trades = Trade.query.filter_by(user_id=user_id, status='OPEN').all()
-        
-        for trade in open_trades:
-            # Get current price
-            price_data = FeedService.get_price_data(trade.symbol)
-            current_price = trade.price  # Default to entry price
-            
-            if price_data:
-                current_price = price_data[-1]['close']
-            
-            # Calculate unrealized P&L
-            if trade.type == 'BUY':
-                unrealized_pnl = (current_price - trade.price) * trade.quantity
-            else:  # SELL
-                unrealized_pnl = (trade.price - current_price) * trade.quantity
-            
-            equity += unrealized_pnl
-        
-        return equity
+        return snapshot.equity
     
     @staticmethod
-    def _reset_daily_equity_if_needed(user):
+    def _reset_daily_equity_if_needed(user, current_equity=None):
         """
         Reset daily starting equity if it's a new trading day (UTC).
         
         Args:
             user (User): User object
+            current_equity (float, optional): Equity already computed by the caller
         """
         now = datetime.utcnow()
         
         # Check if last reset was on a different day
-        if user.last_equity_reset:
-            last_reset_date = user.last_equity_reset.date()
-            current_date = now.date()
-            
-            if last_reset_date < current_date:
-                # New day - reset daily equity
-                current_equity = RiskManager._calculate_current_equity(user.id)
-                user.daily_starting_equity = current_equity
-                user.last_equity_reset = now
-                db.session.commit()
-        else:
-            # First time - initialize
-            current_equity = RiskManager._calculate_current_equity(user.id)
-            user.daily_starting_equity = current_equity
-            user.last_equity_reset = now
-            db.session.commit()
+        if user.last_equity_reset and user.last_equity_reset.date() >= now.date():
+            return
+        
+        # New day (or first time) - reset daily equity
+        if current_equity is None:
+            current_equity = RiskManager._calculate_current_equity(user.id, AccountContext.for_user(user))
+        user.daily_starting_equity = current_equity
+        user.last_equity_reset = now
+        db.session.commit()
     
     @staticmethod
-    def can_trade(user_id):
+    def can_trade(user_id, context=None):
         """
         Quick check if user is allowed to trade.
         
         Args:
             user_id (int): The user ID
+            context (AccountContext, optional): Account state already loaded by the caller
             
         Returns:
             tuple: (bool, str or None) - (can_trade, reason_if_not)
         """
-        user = User.query.get(user_id)
-        if not user:
+        context = RiskManager._context(user_id, context)
+        if not context:
             return False, "User not found"
+        user = context.user
         
         if user.status == 'FAILED':
             return False, user.failure_reason or "Account has failed risk checks"
@@ -283,7 +261,7 @@ class RiskManager:
             return False, "Challenge réussi! Votre compte a atteint l'objectif de profit. Contactez-nous pour passer à l'étape suivante."
         
         # Check current risk status
-        risk_check = RiskManager.check_risk_rules(user_id)
+        risk_check = RiskManager.check_risk_rules(user_id, context)
         
         if not risk_check['allowed']:
             return False, risk_check['reason']
@@ -291,21 +269,23 @@ class RiskManager:
         return True, None
     
     @staticmethod
-    def get_risk_metrics(user_id):
+    def get_risk_metrics(user_id, context=None):
         """
         Get current risk metrics for a user.
         
         Args:
             user_id (int): The user ID
+            context (AccountContext, optional): Account state already loaded by the caller
             
         Returns:
             dict: Risk metrics including drawdown, daily loss, etc.
         """
-        user = User.query.get(user_id)
-        if not user:
+        context = RiskManager._context(user_id, context)
+        if not context:
             return None
+        user = context.user
         
-        current_equity = RiskManager._calculate_current_equity(user_id)
+        current_equity = RiskManager._calculate_current_equity(user_id, context)
         
         # Total drawdown
         total_loss = user.initial_capital - current_equity
@@ -345,3 +325,9 @@ class RiskManager:
             'failure_reason': user.failure_reason
         }
 
+    @staticmethod
+    def _context(user_id, context=None):
+        """The caller's AccountContext, or the request's one for this user."""
+        if context is not None:
+            return context
+        return AccountContext.for_user_id(user_id)
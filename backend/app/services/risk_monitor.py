@@ -0,0 +1,185 @@
+"""
+Risk Monitor
+
+Background thread that marks open accounts to market as prices move, so an
+account past its drawdown / daily loss limit (or at its profit target) is
+settled even if its owner never calls an endpoint again.
+
+MarkPriceStore notifies the monitor of every price change (FeedService,
+BVCService, the market refresher and the price stream all publish there).
+For each changed symbol only the accounts holding it are re-marked, through
+PositionIndex, and screened against the rules in one vectorized pass.
+Accounts that cross a threshold are handed to RiskQueue, where
+RiskManager.check_risk_rules confirms the breach and updates the account
+and its challenge. Marks of held symbols are also refreshed periodically so
+positions in symbols nobody is watching keep moving.
+
+Disabled on serverless deployments (Vercel) where background threads do not
+survive between invocations.
+"""
+
+import os
+import threading
+import time
+import numpy as np
+
+
+class RiskMonitor:
+    """
+    Single daemon thread per process screening accounts on price ticks.
+    """
+
+    POLL_INTERVAL = 10    # seconds between mark refreshes of held symbols
+    BATCH_DELAY = 0.25    # seconds to collect a burst of ticks into one pass
+    FLAG_COOLDOWN = 30    # seconds before re-submitting an account still flagged
+
+    _app = None
+    _thread = None
+    _stop = threading.Event()
+    _wakeup = threading.Event()
+    _ticks = {}           # symbol -> latest price not yet applied
+    _flagged = {}         # user_id -> time it was last submitted
+    _counters = {'passes': 0, 'ticks': 0, 'screened': 0, 'flagged': 0, 'last_pass_ms': 0.0}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def enabled():
+        """
+        Whether the monitor should run in this process.
+
+        RISK_MONITOR=0 disables it explicitly; it is also off on Vercel.
+        """
+        flag = os.environ.get('RISK_MONITOR')
+        if flag is not None:
+            return flag.lower() not in ('0', 'false', 'no', 'off')
+        return not os.environ.get('VERCEL')
+
+    @staticmethod
+    def start(app):
+        """Start the monitor thread once per process (no-op if disabled or running)."""
+        from .mark_price_store import MarkPriceStore
+
+        if not RiskMonitor.enabled():
+            print("RiskMonitor disabled", flush=True)
+            return False
+
+        with RiskMonitor._lock:
+            if RiskMonitor.is_running():
+                return True
+            RiskMonitor._app = app
+            RiskMonitor._stop.clear()
+            MarkPriceStore.subscribe(RiskMonitor._on_mark)
+            RiskMonitor._thread = threading.Thread(target=RiskMonitor._run, name='risk-monitor', daemon=True)
+            RiskMonitor._thread.start()
+        return True
+
+    @staticmethod
+    def stop(timeout=None):
+        from .mark_price_store import MarkPriceStore
+
+        MarkPriceStore.unsubscribe(RiskMonitor._on_mark)
+        RiskMonitor._stop.set()
+        RiskMonitor._wakeup.set()
+        thread = RiskMonitor._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    @staticmethod
+    def is_running():
+        thread = RiskMonitor._thread
+        return thread is not None and thread.is_alive() and not RiskMonitor._stop.is_set()
+
+    @staticmethod
+    def stats():
+        from .position_index import PositionIndex
+
+        with RiskMonitor._lock:
+            return dict(RiskMonitor._counters, running=RiskMonitor.is_running(),
+                        pending_ticks=len(RiskMonitor._ticks), index=PositionIndex.stats())
+
+    @staticmethod
+    def scan(refresh_marks=False):
+        """
+        One monitoring pass (needs an app context): sync the index, apply the
+        pending ticks, screen the affected accounts and submit the flagged
+        ones to RiskQueue.
+
+        Args:
+            refresh_marks (bool): Refresh stale marks of every held symbol first
+
+        Returns:
+            list: User ids submitted for evaluation
+        """
+        from .mark_price_store import MarkPriceStore
+        from .position_index import PositionIndex
+        from .risk_queue import RiskQueue
+
+        started = time.time()
+        slots = [PositionIndex.sync()]
+        if refresh_marks:
+            # Changed prices come back through _on_mark
+            MarkPriceStore.get_marks(PositionIndex.symbols())
+
+        with RiskMonitor._lock:
+            ticks, RiskMonitor._ticks = RiskMonitor._ticks, {}
+        for symbol, price in ticks.items():
+            slots.append(PositionIndex.mark(symbol, price))
+
+        slots = np.concatenate(slots)
+        flagged = PositionIndex.breaches(slots) if len(slots) else []
+
+        now = time.time()
+        submitted = []
+        for user_id in flagged:
+            if now - RiskMonitor._flagged.get(user_id, 0) < RiskMonitor.FLAG_COOLDOWN:
+                continue
+            RiskMonitor._flagged[user_id] = now
+            RiskQueue.submit(user_id, 'mark')
+            submitted.append(user_id)
+
+        with RiskMonitor._lock:
+            counters = RiskMonitor._counters
+            counters['passes'] += 1
+            counters['ticks'] += len(ticks)
+            counters['screened'] += len(slots)
+            counters['flagged'] += len(submitted)
+            counters['last_pass_ms'] = round((time.time() - started) * 1000, 2)
+        return submitted
+
+    @staticmethod
+    def _on_mark(mark):
+        from .position_index import PositionIndex
+
+        # Symbols first traded since the last sync are not in the index yet
+        if PositionIndex.holds(mark.symbol) or PositionIndex.has_pending():
+            with RiskMonitor._lock:
+                RiskMonitor._ticks[mark.symbol] = mark.price
+            RiskMonitor._wakeup.set()
+
+    @staticmethod
+    def _run():
+        from .. import db
+
+        next_refresh = 0
+        while not RiskMonitor._stop.is_set():
+            refresh = time.time() >= next_refresh
+            try:
+                with RiskMonitor._app.app_context():
+                    try:
+                        RiskMonitor.scan(refresh_marks=refresh)
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                print(f"RiskMonitor error: {e}")
+            if refresh:
+                next_refresh = time.time() + RiskMonitor.POLL_INTERVAL
+
+            RiskMonitor._wakeup.wait(max(0.0, next_refresh - time.time()))
+            RiskMonitor._wakeup.clear()
+            # Let a burst of ticks (update_many) accumulate into one pass
+            RiskMonitor._stop.wait(RiskMonitor.BATCH_DELAY)
+
+            # Forget accounts whose cooldown has passed
+            cutoff = time.time() - RiskMonitor.FLAG_COOLDOWN
+            for user_id in [u for u, t in RiskMonitor._flagged.items() if t < cutoff]:
+                RiskMonitor._flagged.pop(user_id, None)
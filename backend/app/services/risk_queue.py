@@ -0,0 +1,249 @@
+"""
+Risk Queue
+
+In-process work queue for post-trade risk evaluation. Fill endpoints commit
+the trade, submit a risk event for the account and respond immediately; a
+small pool of worker threads runs RiskManager.check_risk_rules afterwards.
+Only this post-trade re-evaluation is queued: the pre-trade check
+(RiskManager.can_trade) still runs in the request before every fill.
+
+Events are sharded by user id, so one account is always evaluated by the
+same worker, in submission order, and never concurrently with itself.
+Events for an account that already has an evaluation waiting are coalesced:
+the pending evaluation reads the latest committed state anyway.
+
+Results are kept per account (RiskQueue.last_result) and pushed to the
+account's listeners (GET /api/risk/stream). Clients can also poll
+/api/risk/check. A listener may be connected to another worker: every
+evaluation is announced on the change log (topic CHANGE_TOPIC, item = user
+id) and a process that has listeners for the account evaluates it again
+when it sees the row, without announcing that evaluation in turn.
+
+Disabled on serverless deployments (Vercel) where background threads do not
+survive between invocations; submit() then evaluates synchronously.
+"""
+
+import itertools
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from .change_log import ChangeLog
+from .price_stream import Subscription
+
+
+class RiskQueue:
+    """
+    Per-process pool of risk workers.
+    """
+
+    WORKERS = 4
+    CHANGE_TOPIC = 'risk'
+    REMOTE = 'remote'    # reason of the evaluations triggered by another process
+
+    # Returned to clients in place of a risk check that has been queued
+    PENDING = {'allowed': True, 'status': 'PENDING', 'reason': None, 'violations': []}
+
+    _app = None
+    _queues = []
+    _threads = []
+    _pending = set()     # user ids with an evaluation waiting in a queue
+    _relay = set()       # pending user ids whose evaluation must be announced
+    _results = {}        # user_id -> last result (with 'evaluated_at')
+    _listeners = {}      # user_id -> set of Subscription
+    _counters = {'submitted': 0, 'coalesced': 0, 'processed': 0, 'errors': 0}
+    _lock = threading.Lock()
+    _ids = itertools.count(1)
+
+    @staticmethod
+    def enabled():
+        """
+        Whether risk events should be processed in the background.
+
+        RISK_QUEUE=0 disables it explicitly; it is also off on Vercel.
+        """
+        flag = os.environ.get('RISK_QUEUE')
+        if flag is not None:
+            return flag.lower() not in ('0', 'false', 'no', 'off')
+        return not os.environ.get('VERCEL')
+
+    @staticmethod
+    def start(app):
+        """Start the worker threads once per process (no-op if disabled or running)."""
+        if not RiskQueue.enabled():
+            print("RiskQueue disabled, risk checks run inline", flush=True)
+            return False
+
+        with RiskQueue._lock:
+            if RiskQueue.is_running():
+                return True
+            RiskQueue._app = app
+            RiskQueue._queues = [queue.Queue() for _ in range(RiskQueue.WORKERS)]
+            RiskQueue._threads = []
+            for index in range(RiskQueue.WORKERS):
+                thread = threading.Thread(target=RiskQueue._run, args=(index,),
+                                          name=f'risk-worker-{index}', daemon=True)
+                thread.start()
+                RiskQueue._threads.append(thread)
+        return True
+
+    @staticmethod
+    def stop(timeout=None):
+        """Let the workers finish queued events, then stop them."""
+        with RiskQueue._lock:
+            queues, threads = RiskQueue._queues, RiskQueue._threads
+            RiskQueue._queues, RiskQueue._threads = [], []
+        for work in queues:
+            work.put(None)
+        for thread in threads:
+            thread.join(timeout)
+
+    @staticmethod
+    def is_running():
+        return bool(RiskQueue._threads) and all(t.is_alive() for t in RiskQueue._threads)
+
+    @staticmethod
+    def submit(user_id, reason='fill'):
+        """
+        Schedule a risk evaluation for an account. Call after the commit that
+        changed it, so the worker sees the new state.
+
+        Args:
+            user_id (int): Account to evaluate
+            reason (str): What triggered the event (for logs)
+
+        Returns:
+            dict: RiskQueue.PENDING when queued, the check result when the
+                  queue is not running and the evaluation ran inline
+        """
+        with RiskQueue._lock:
+            queues = RiskQueue._queues
+            if queues and RiskQueue.is_running():
+                RiskQueue._counters['submitted'] += 1
+                if reason != RiskQueue.REMOTE:
+                    RiskQueue._relay.add(user_id)
+                if user_id in RiskQueue._pending:
+                    RiskQueue._counters['coalesced'] += 1
+                else:
+                    RiskQueue._pending.add(user_id)
+                    queues[user_id % len(queues)].put((user_id, reason, time.time()))
+                return RiskQueue.PENDING
+
+        return RiskQueue._evaluate(user_id, relay=reason != RiskQueue.REMOTE)
+
+    @staticmethod
+    def drain(timeout=None):
+        """
+        Wait until every queued event has been processed.
+
+        Returns:
+            bool: False if `timeout` seconds elapsed first
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while RiskQueue._pending or any(q.unfinished_tasks for q in RiskQueue._queues):
+            if deadline is not None and time.time() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    @staticmethod
+    def last_result(user_id):
+        """Most recent background evaluation for an account, or None."""
+        return RiskQueue._results.get(user_id)
+
+    @staticmethod
+    def listen(user_id):
+        """Subscribe to an account's risk results (see Subscription.get)."""
+        subscription = Subscription(next(RiskQueue._ids), [user_id])
+        with RiskQueue._lock:
+            RiskQueue._listeners.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    @staticmethod
+    def unlisten(subscription):
+        """
+        Returns:
+            bool: False if the subscription was already removed
+        """
+        removed = False
+        with RiskQueue._lock:
+            for user_id in subscription.symbols:
+                listeners = RiskQueue._listeners.get(user_id)
+                if listeners is not None and subscription in listeners:
+                    removed = True
+                    listeners.discard(subscription)
+                    if not listeners:
+                        del RiskQueue._listeners[user_id]
+        return removed
+
+    @staticmethod
+    def stats():
+        with RiskQueue._lock:
+            return dict(RiskQueue._counters,
+                        running=RiskQueue.is_running(),
+                        workers=len(RiskQueue._threads),
+                        pending=len(RiskQueue._pending),
+                        listeners=sum(len(s) for s in RiskQueue._listeners.values()))
+
+    @staticmethod
+    def _evaluate(user_id, relay=True):
+        from .. import db
+        from .risk_manager import RiskManager
+
+        if relay:
+            # Written by the commit of a status change, or by the one below
+            ChangeLog.stage(db.session, RiskQueue.CHANGE_TOPIC, [user_id])
+        result = dict(RiskManager.check_risk_rules(user_id))
+        db.session.commit()
+        result['evaluated_at'] = datetime.utcnow().isoformat()
+        with RiskQueue._lock:
+            RiskQueue._results[user_id] = result
+            listeners = list(RiskQueue._listeners.get(user_id, ()))
+        for subscription in listeners:
+            subscription.push(result)
+        return result
+
+    @staticmethod
+    def _run(index):
+        from .. import db
+
+        work = RiskQueue._queues[index]
+        while True:
+            event = work.get()
+            if event is None:
+                work.task_done()
+                return
+
+            user_id, reason, submitted_at = event
+            with RiskQueue._lock:
+                # Commits from here on need a new evaluation
+                RiskQueue._pending.discard(user_id)
+                relay = user_id in RiskQueue._relay
+                RiskQueue._relay.discard(user_id)
+            try:
+                with RiskQueue._app.app_context():
+                    try:
+                        result = RiskQueue._evaluate(user_id, relay)
+                    finally:
+                        db.session.remove()
+                RiskQueue._counters['processed'] += 1
+                if result['status'] != 'ACTIVE':
+                    print(f"RiskQueue: user {user_id} -> {result['status']} ({reason}, "
+                          f"{(time.time() - submitted_at) * 1000:.0f} ms after submit)")
+            except Exception as e:
+                RiskQueue._counters['errors'] += 1
+                print(f"RiskQueue: evaluation failed for user {user_id}: {e}")
+            finally:
+                work.task_done()
+
+
+def _apply_remote_results(user_ids):
+    """Re-evaluate the accounts another process evaluated, if listened to here."""
+    with RiskQueue._lock:
+        listened = set(RiskQueue._listeners)
+    for user_id in listened if user_ids is None else listened & user_ids:
+        RiskQueue.submit(user_id, RiskQueue.REMOTE)
+
+
+ChangeLog.subscribe(RiskQueue.CHANGE_TOPIC, _apply_remote_results)
@@ -0,0 +1,234 @@
+"""
+Headline sentiment.
+
+Scores news headlines against a weighted French / English lexicon. Terms
+are matched on whole words (so "up" no longer matches "supply" nor "low"
+"follow"), after lowercasing and stripping accents, and may be two-word
+phrases ("record high", "plus bas").
+
+Headlines are folded to lowercase ASCII words with a few C-level string
+operations (accent replacements, one bytes translate, one split), then
+each word is a dict lookup. A phrase is stored as a correction added on
+top of its two words, so "record low" still scores -2 and not "record"
++0.5 plus "low" -0.5. A batch of headlines is joined and folded in one
+pass, with a separator token between headlines.
+"""
+
+import string
+import threading
+import unicodedata
+from itertools import compress, count
+
+# term -> weight, written without accents ("chute" also matches "chuté")
+LEXICON = {
+    # English, positive
+    'rise': 1, 'rises': 1, 'rising': 1, 'rose': 1, 'risen': 1,
+    'gain': 1, 'gains': 1, 'gained': 1, 'jump': 1, 'jumps': 1, 'jumped': 1,
+    'climb': 1, 'climbs': 1, 'climbed': 1, 'rebound': 1, 'rebounds': 1, 'rebounded': 1,
+    'surge': 2, 'surges': 2, 'surged': 2, 'soar': 2, 'soars': 2, 'soared': 2,
+    'rally': 2, 'rallies': 2, 'rallied': 2, 'boom': 2, 'booms': 2,
+    'bull': 1, 'bulls': 1, 'bullish': 2, 'record high': 2, 'all-time high': 2,
+    'beat': 1, 'beats': 1, 'upgrade': 1, 'upgraded': 1, 'boost': 1, 'boosts': 1, 'boosted': 1,
+    'growth': 1, 'profit': 1, 'profits': 1, 'recovery': 1, 'optimism': 1, 'outperform': 1,
+    'strong': 0.5, 'higher': 0.5, 'up': 0.5, 'high': 0.5, 'highs': 0.5, 'record': 0.5,
+    # English, negative
+    'fall': -1, 'falls': -1, 'fell': -1, 'fallen': -1, 'falling': -1,
+    'drop': -1, 'drops': -1, 'dropped': -1, 'decline': -1, 'declines': -1, 'declined': -1,
+    'slide': -1, 'slides': -1, 'slid': -1, 'sink': -1, 'sinks': -1, 'sank': -1,
+    'slump': -2, 'slumps': -2, 'slumped': -2, 'plunge': -2, 'plunges': -2, 'plunged': -2,
+    'tumble': -2, 'tumbles': -2, 'tumbled': -2, 'crash': -2, 'crashes': -2, 'crashed': -2,
+    'sell-off': -2, 'selloff': -2, 'record low': -2, 'record lows': -2,
+    'bear': -1, 'bears': -1, 'bearish': -2, 'loss': -1, 'losses': -1, 'lost': -1,
+    'downgrade': -1, 'downgraded': -1, 'miss': -1, 'misses': -1, 'missed': -1,
+    'fear': -1, 'fears': -1, 'crisis': -2, 'recession': -2, 'default': -1, 'bankruptcy': -2,
+    'warns': -1, 'warning': -1, 'weak': -0.5, 'weaker': -0.5, 'lower': -0.5,
+    'down': -0.5, 'low': -0.5, 'lows': -0.5,
+    # French, positive
+    'hausse': 1, 'en hausse': 1, 'progresse': 1, 'progression': 1, 'grimpe': 1, 'grimpent': 1,
+    'rebond': 1, 'rebondit': 1, 'reprise': 1, 'croissance': 1, 'benefice': 1, 'benefices': 1,
+    'optimisme': 1, 'haussier': 2, 'haussiere': 2, 'bondit': 2, 'bondissent': 2,
+    'envolee': 2, 'envole': 2, 'flambe': 2, 'plus haut': 1, 'sommet': 1, 'record historique': 2,
+    'franchit': 1, 'depasse': 1, 'depassent': 1, 'explosent': 1, 'solide': 0.5, 'solides': 0.5,
+    # French, negative
+    'baisse': -1, 'en baisse': -1, 'recul': -1, 'recule': -1, 'reculent': -1, 'repli': -1,
+    'perte': -1, 'pertes': -1, 'deficit': -1, 'inquietude': -1, 'inquietudes': -1,
+    'pessimisme': -1, 'plus bas': -1, 'chute': -2, 'chutent': -2, 'plonge': -2, 'plongent': -2,
+    'degringole': -2, 'effondre': -2, 'effondrement': -2, 'baissier': -2, 'baissiere': -2,
+    'crise': -2, 'faillite': -2, 'mauvais': -1, 'mauvaise': -1, 'mauvaises': -1,
+    'retard': -0.5, 'retards': -0.5, 'menace': -1, 'menaces': -1,
+}
+
+
+class HeadlineSentiment:
+    """
+    Lexicon-based classifier: POSITIVE, NEGATIVE or NEUTRAL.
+    """
+
+    THRESHOLD = 0.5  # |score| needed to leave NEUTRAL
+
+    _lexicon = {}
+    _compiled = None  # (words, pairs, firsts, marks), swapped as a whole when the lexicon changes
+    _lock = threading.Lock()
+
+    @staticmethod
+    def classify(title):
+        """
+        Args:
+            title (str): Headline
+
+        Returns:
+            str: POSITIVE, NEGATIVE or NEUTRAL
+        """
+        return HeadlineSentiment.label(HeadlineSentiment.score(title))
+
+    @staticmethod
+    def classify_batch(titles):
+        """
+        Classify many headlines in one pass.
+
+        Args:
+            titles (list): Headlines
+
+        Returns:
+            list: Labels, in the same order
+        """
+        return [HeadlineSentiment.label(score) for score in HeadlineSentiment.score_batch(titles)]
+
+    @staticmethod
+    def score(title):
+        """Sum of the weights of the terms found in `title`."""
+        words, pairs, firsts, _ = HeadlineSentiment._tables()
+        tokens = _fold(title or '').split()
+        score = sum(filter(None, map(words.get, tokens)))
+        if not firsts.isdisjoint(tokens):
+            for pair in zip(tokens, tokens[1:]):
+                score += pairs.get(pair, 0)
+        return score
+
+    @staticmethod
+    def score_batch(titles):
+        """
+        Args:
+            titles (list): Headlines
+
+        Returns:
+            list: Scores (> 0 positive, < 0 negative), in the same order
+        """
+        if not titles:
+            return []
+        words, pairs, firsts, marks = HeadlineSentiment._tables()
+        text = _SEPARATOR.join(title or '' for title in titles)
+        if text.count('\x01') != len(titles) - 1:
+            # A headline holds the separator itself
+            return [HeadlineSentiment.score(title) for title in titles]
+        tokens = _fold(text).split()
+
+        # Only the lexicon words and the separators are visited in Python
+        scores = [0] * len(titles)
+        i, last = 0, len(tokens) - 1
+        for position in compress(count(), map(marks.__contains__, tokens)):
+            token = tokens[position]
+            if token == _SEPARATOR_TOKEN:
+                i += 1
+                continue
+            scores[i] += words.get(token, 0)
+            if token in firsts and position < last:
+                scores[i] += pairs.get((token, tokens[position + 1]), 0)
+        return scores
+
+    @staticmethod
+    def label(score):
+        if score >= HeadlineSentiment.THRESHOLD:
+            return "POSITIVE"
+        if score <= -HeadlineSentiment.THRESHOLD:
+            return "NEGATIVE"
+        return "NEUTRAL"
+
+    @staticmethod
+    def add_terms(terms):
+        """
+        Add or reweight lexicon terms (a weight of 0 removes the term).
+
+        Args:
+            terms (dict): term -> weight; a term is a word or a two-word phrase
+
+        Raises:
+            ValueError: If a term has more than two words
+        """
+        with HeadlineSentiment._lock:
+            lexicon = dict(HeadlineSentiment._lexicon)
+            for term, weight in terms.items():
+                term = _normalize(term)
+                if weight:
+                    lexicon[term] = weight
+                else:
+                    lexicon.pop(term, None)
+            HeadlineSentiment._compiled = _compile(lexicon)
+            HeadlineSentiment._lexicon = lexicon
+
+    @staticmethod
+    def _tables():
+        compiled = HeadlineSentiment._compiled
+        if compiled is None:
+            with HeadlineSentiment._lock:
+                compiled = HeadlineSentiment._compiled
+                if compiled is None:
+                    compiled = HeadlineSentiment._compiled = _compile(HeadlineSentiment._lexicon)
+        return compiled
+
+
+# Non-ASCII characters folded before the bytes translate; any other one becomes a space
+_FOLDS = {char: folded for folded, chars in {
+    'a': 'àâäáãÀÂÄÁÃ', 'c': 'çÇ', 'e': 'éèêëÉÈÊË', 'i': 'îïíÎÏÍ', 'o': 'ôöóõÔÖÓÕ', 'u': 'ùûüúÙÛÜÚ',
+    'oe': 'œŒ', "'": '’‘', ' ': '«»“”…–—\xa0',
+}.items() for char in chars}
+_FOLD_CHARS = frozenset(_FOLDS)
+
+# Lowercases ASCII letters and turns punctuation (except '-', as in "sell-off") into spaces
+_PUNCTUATION = string.punctuation.replace('-', '').encode()
+_TRANSLATE = bytes.maketrans(string.ascii_uppercase.encode() + _PUNCTUATION,
+                             string.ascii_lowercase.encode() + b' ' * len(_PUNCTUATION))
+
+_SEPARATOR = ' \x01 '  # '\x01' is neither whitespace nor touched by the translate
+_SEPARATOR_TOKEN = b'\x01'
+
+
+def _fold(text):
+    """Lowercase ASCII bytes, accents stripped, punctuation turned into spaces."""
+    if not text.isascii():
+        text = unicodedata.normalize('NFC', text)
+        # A headline is searched for the few characters it holds, a joined batch once per character
+        chars = _FOLD_CHARS.intersection(text) if len(text) < 512 else _FOLD_CHARS
+        for char in chars:
+            text = text.replace(char, _FOLDS[char])
+    return text.encode('ascii', 'replace').translate(_TRANSLATE)
+
+
+def _normalize(term):
+    """Lexicon form of a term: folded words separated by single spaces."""
+    words = _fold(term).decode('ascii').split()
+    if len(words) > 2:
+        raise ValueError(f"Sentiment term '{term}': one word or a two-word phrase expected")
+    return ' '.join(words)
+
+
+def _compile(lexicon):
+    """
+    Lookup tables for a lexicon: word weights, phrase corrections keyed by
+    word pair, the first words of phrases, and every word worth a lookup
+    (plus the headline separator).
+    """
+    words, phrases = {}, {}
+    for term, weight in lexicon.items():
+        if ' ' in term:
+            first, second = term.encode('ascii').split()
+            phrases[(first, second)] = weight
+        else:
+            words[term.encode('ascii')] = weight
+    pairs = {(first, second): weight - words.get(first, 0) - words.get(second, 0)
+             for (first, second), weight in phrases.items()}
+    firsts = frozenset(first for first, _ in pairs)
+    return words, pairs, firsts, frozenset(words) | firsts | {_SEPARATOR_TOKEN}
+
+
+HeadlineSentiment._lexicon = {_normalize(term): weight for term, weight in LEXICON.items()}
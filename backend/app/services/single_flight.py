@@ -0,0 +1,76 @@
+"""
+Single-flight request coalescing.
+
+Guarantees that for a given key at most one upstream fetch is in flight per
+process. Concurrent callers either wait for that fetch and share its result,
+or - when they already hold a stale value - return it immediately instead of
+piling onto the upstream (richbourse, yfinance, CoinGecko...).
+"""
+
+import threading
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key.
+    """
+
+    def __init__(self, timeout=30):
+        """
+        Args:
+            timeout (float): Max seconds a follower waits for the leader
+        """
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, stale=None):
+        """
+        Run `fn` unless a call for `key` is already in flight.
+
+        Args:
+            key (str): Coalescing key (e.g. the cache key being refreshed)
+            fn (callable): Fetch function, called with no arguments
+            stale: Value to return right away if another caller is already fetching
+
+        Returns:
+            The result of `fn` (shared by all callers that waited on it), or `stale`
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            if stale is not None:
+                return stale
+            if not call.event.wait(self.timeout):
+                raise TimeoutError(f"Timed out waiting for in-flight fetch of {key}")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        return call.result
+
+    def in_flight(self, key):
+        return key in self._calls
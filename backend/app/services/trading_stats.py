@@ -0,0 +1,202 @@
+"""
+Trading Stats Service
+
+Materialized per-user trading statistics:
+
+- UserTradingStats: trade counts, realized P&L and best trade
+- UserDailyPnl:     realized P&L and closed-trade count per close date
+
+Both are updated with atomic SQL increments in the transaction that opens or
+closes a trade, so dashboards and leaderboards read a handful of rows
+instead of a user's full trade history. Missing rows are back-filled once
+from the trades table.
+"""
+
+from datetime import datetime, date, timedelta
+from sqlalchemy import func, case, and_, or_, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from ..models import db, Trade, UserTradingStats, UserDailyPnl
+
+
+class TradingStatsService:
+    """
+    Maintains and reads UserTradingStats / UserDailyPnl.
+    """
+
+    @staticmethod
+    def record_open(user_id):
+        """
+        Count a newly opened trade. Call before the new Trade is added to the
+        session so a back-filled row does not count it twice.
+        """
+        TradingStatsService.ensure_stats(user_id)
+        db.session.query(UserTradingStats).filter_by(user_id=user_id).update({
+            UserTradingStats.total_trades: UserTradingStats.total_trades + 1
+        }, synchronize_session=False)
+
+    @staticmethod
+    def record_close(user_id, pnl, closed_at=None):
+        """
+        Add a closed trade to the running aggregates and the daily rollup.
+        Call before the trade is marked CLOSED so back-filled rows do not
+        count it twice.
+
+        Args:
+            user_id (int): Trade owner
+            pnl (float): Realized P&L, as stored on the trade
+            closed_at (datetime, optional): Close time (UTC), defaults to now
+        """
+        TradingStatsService.ensure_stats(user_id)
+        best = UserTradingStats.best_trade
+        db.session.query(UserTradingStats).filter_by(user_id=user_id).update({
+            UserTradingStats.closed_trades: UserTradingStats.closed_trades + 1,
+            UserTradingStats.winning_trades: UserTradingStats.winning_trades + (1 if pnl > 0 else 0),
+            UserTradingStats.realized_pnl: UserTradingStats.realized_pnl + pnl,
+            best: case((or_(best.is_(None), best < pnl), pnl), else_=best),
+        }, synchronize_session=False)
+
+        day = (closed_at or datetime.utcnow()).date()
+        TradingStatsService._add_daily(user_id, day, pnl)
+
+    @staticmethod
+    def get_stats(user_id):
+        """
+        The user's UserTradingStats row, back-filled if missing.
+        Commits when it had to create rows.
+        """
+        stats = db.session.get(UserTradingStats, user_id)
+        if stats is not None and (stats.best_trade is not None or not stats.closed_trades):
+            return stats
+
+        stats = TradingStatsService.ensure_stats(user_id)
+        if stats.best_trade is None and stats.closed_trades:
+            # Row created before best_trade was tracked
+            stats.best_trade = db.session.query(func.max(Trade.pnl)) \
+                .filter(Trade.user_id == user_id, Trade.status == 'CLOSED').scalar()
+        db.session.commit()
+        return stats
+
+    @staticmethod
+    def get_daily_pnl(user_id, days=7, today=None):
+        """
+        Daily realized P&L for the last `days` days (today included).
+
+        Returns:
+            dict: date -> (pnl, trades), only for days with closed trades
+        """
+        today = today or datetime.utcnow().date()
+        rows = UserDailyPnl.query.filter(
+            UserDailyPnl.user_id == user_id,
+            UserDailyPnl.day > today - timedelta(days=days),
+            UserDailyPnl.day <= today
+        ).all()
+        return {row.day: (row.pnl, row.trades) for row in rows}
+
+    @staticmethod
+    def ensure_stats(user_id):
+        """
+        Return the user's stats row, creating it (and the daily rollup) from
+        the trades table if it does not exist yet.
+        """
+        stats = db.session.get(UserTradingStats, user_id)
+        if stats is not None:
+            return stats
+
+        agg = db.session.query(TradingStatsService.trade_stats_subquery(user_ids=[user_id])).first()
+        daily = TradingStatsService._daily_aggregate(user_id)
+        created = _insert_if_missing(
+            UserTradingStats,
+            user_id=user_id,
+            total_trades=agg.trade_count if agg else 0,
+            closed_trades=agg.closed_trades if agg else 0,
+            winning_trades=agg.winning_trades if agg else 0,
+            realized_pnl=agg.realized_pnl if agg else 0.0,
+            best_trade=agg.best_trade if agg else None
+        )
+        if created:
+            UserDailyPnl.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+            if daily:
+                db.session.execute(insert(UserDailyPnl), [
+                    {'user_id': user_id, 'day': day, 'pnl': pnl, 'trades': trades}
+                    for day, (pnl, trades) in daily.items()
+                ])
+        # else: created concurrently by another request
+        return db.session.get(UserTradingStats, user_id)
+
+    @staticmethod
+    def reset(user_id):
+        """
+        Delete the user's stats and daily rollup, before the user or their
+        trades are deleted. The next read rebuilds them from the trades left.
+        """
+        UserDailyPnl.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+        UserTradingStats.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+
+    @staticmethod
+    def trade_stats_subquery(user_ids=None):
+        """
+        Grouped aggregate over trades, one row per user:
+            user_id, trade_count, closed_trades, realized_pnl, winning_trades, best_trade
+        """
+        closed = Trade.status == 'CLOSED'
+        query = db.session.query(
+            Trade.user_id.label('user_id'),
+            func.count(Trade.id).label('trade_count'),
+            func.sum(case((closed, 1), else_=0)).label('closed_trades'),
+            func.sum(case((closed, Trade.pnl), else_=0.0)).label('realized_pnl'),
+            func.sum(case((and_(closed, Trade.pnl > 0), 1), else_=0)).label('winning_trades'),
+            func.max(case((closed, Trade.pnl), else_=None)).label('best_trade'),
+        )
+        if user_ids is not None:
+            query = query.filter(Trade.user_id.in_(user_ids))
+        return query.group_by(Trade.user_id).subquery()
+
+    @staticmethod
+    def _daily_aggregate(user_id):
+        """Closed-trade P&L grouped by close date, straight from the trades table."""
+        day = func.date(Trade.close_timestamp)
+        rows = db.session.query(day, func.sum(Trade.pnl), func.count(Trade.id)) \
+            .filter(Trade.user_id == user_id, Trade.status == 'CLOSED', Trade.close_timestamp.isnot(None)) \
+            .group_by(day).all()
+        # SQLite returns the date as 'YYYY-MM-DD'
+        return {
+            (d if isinstance(d, date) else date.fromisoformat(str(d)[:10])): (pnl or 0.0, count)
+            for d, pnl, count in rows
+        }
+
+    @staticmethod
+    def _add_daily(user_id, day, pnl):
+        values = {
+            UserDailyPnl.pnl: UserDailyPnl.pnl + pnl,
+            UserDailyPnl.trades: UserDailyPnl.trades + 1
+        }
+        query = db.session.query(UserDailyPnl).filter_by(user_id=user_id, day=day)
+        if query.update(values, synchronize_session=False):
+            return
+        if not _insert_if_missing(UserDailyPnl, user_id=user_id, day=day, pnl=pnl, trades=1):
+            # Inserted concurrently; add to that row
+            query.update(values, synchronize_session=False)
+
+
+def _insert_if_missing(model, **values):
+    """
+    INSERT that does nothing when the primary key already exists, in one
+    statement (no SAVEPOINT: releasing one fires the session's commit hooks
+    in the middle of the trade's transaction).
+
+    Returns:
+        bool: Whether the row was inserted
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        statement = postgresql.insert(model).values(**values).on_conflict_do_nothing()
+    elif dialect == 'sqlite':
+        statement = sqlite.insert(model).values(**values).on_conflict_do_nothing()
+    elif dialect in ('mysql', 'mariadb'):
+        statement = insert(model).values(**values).prefix_with('IGNORE')
+    else:
+        keys = [values[column.name] for column in model.__table__.primary_key.columns]
+        if db.session.get(model, keys if len(keys) > 1 else keys[0]) is not None:
+            return False
+        statement = insert(model).values(**values)
+    return db.session.execute(statement).rowcount == 1
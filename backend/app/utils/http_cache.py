@@ -0,0 +1,141 @@
+"""
+HTTP response cache with ETag / conditional GET support.
+
+`cached_view` keeps the serialized body of a GET endpoint together with a
+content hash used as ETag. While the entry is valid, requests are answered
+from memory: `If-None-Match` gets an empty 304 and other requests get the
+stored bytes, in both cases without running the view (no database query, no
+jsonify).
+
+An entry is valid until its TTL runs out, its `version` token changes, or a
+commit touches one of the models listed in `depends_on`. Commits made by the
+other worker processes arrive through the change log (services/change_log.py),
+written in the same transaction, within about a second.
+"""
+
+import hashlib
+import threading
+import time
+from functools import wraps
+from flask import request, Response
+from sqlalchemy import event
+from app import db
+from app.services.bounded_cache import BoundedCache
+from app.services.change_log import ChangeLog
+
+_responses = BoundedCache('http.responses', max_entries=256, max_bytes=8 * 1024 * 1024,
+                          sizeof=lambda entry: len(entry['body']))
+_generations = {}          # view name -> generation, bumped on relevant commits
+_dependencies = {}         # model class -> set of view names
+_lock = threading.Lock()
+
+
+def cached_view(name, ttl=60, max_age=0, version=None, depends_on=()):
+    """
+    Decorator caching a GET view's 200 responses.
+
+    Args:
+        name (str): Cache namespace for the view (also used for invalidation)
+        ttl (float): Seconds an entry may be served without re-running the view
+        max_age (int): Cache-Control max-age sent to clients (0 = always revalidate)
+        version (callable, optional): Returns a token; a new token invalidates the entry
+        depends_on (tuple): Model classes whose committed changes invalidate the entry
+    """
+    with _lock:
+        _generations.setdefault(name, 0)
+        for model in depends_on:
+            _dependencies.setdefault(model, set()).add(name)
+    if depends_on:
+        ChangeLog.subscribe(_topic(name), lambda item_ids: invalidate(name))
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if depends_on:
+                ChangeLog.poll()
+            key = (name, request.full_path)
+            token = (_generations[name], version() if version else None)
+
+            entry = _responses.get(key)
+            if entry is None or entry['token'] != token:
+                response = view(*args, **kwargs)
+                if not isinstance(response, Response) or response.status_code != 200:
+                    return response
+                entry = _store(key, token, response, ttl)
+
+            if request.if_none_match.contains(entry['etag']):
+                response = Response(status=304)
+            else:
+                response = Response(entry['body'], mimetype=entry['mimetype'])
+                for header, value in entry['headers']:
+                    response.headers[header] = value
+                if 'Age' in response.headers:
+                    # Account for the time the body spent in this cache
+                    response.headers['Age'] = str(int(entry['age'] + time.time() - entry['stored_at']))
+
+            response.set_etag(entry['etag'])
+            response.headers['Cache-Control'] = f'public, max-age={max_age}' if max_age else 'no-cache'
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate(name):
+    """Drop every cached response of a view (e.g. after an out-of-band change)."""
+    with _lock:
+        _generations[name] = _generations.get(name, 0) + 1
+
+
+def _topic(name):
+    return f'view:{name}'
+
+
+def _store(key, token, response, ttl):
+    body = response.get_data()
+    entry = {
+        'token': token,
+        'body': body,
+        'etag': hashlib.md5(body).hexdigest(),
+        'mimetype': response.mimetype,
+        'headers': [(h, v) for h, v in response.headers.items()
+                    if h not in ('Content-Type', 'Content-Length', 'ETag', 'Cache-Control')],
+        'age': int(response.headers.get('Age', 0)),
+        'stored_at': time.time()
+    }
+    _responses.set(key, entry, ttl=ttl)
+    return entry
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_changed_models(session, flush_context, instances):
+    changed = session.info.setdefault('http_cache_changed', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        model = type(obj)
+        if model not in changed:
+            changed.add(model)
+            for name in _dependencies.get(model, ()):
+                ChangeLog.stage(session, _topic(name))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_on_commit(session):
+    # Also fired when a SAVEPOINT is released: wait for the outer commit
+    if session.in_nested_transaction():
+        return
+    changed = session.info.pop('http_cache_changed', None)
+    if not changed:
+        return
+    names = set()
+    for model in changed:
+        names |= _dependencies.get(model, set())
+    for name in names:
+        invalidate(name)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_on_rollback(session):
+    # A rolled back SAVEPOINT keeps the outer transaction's changes
+    if not session.in_nested_transaction():
+        session.info.pop('http_cache_changed', None)
@@ -0,0 +1,143 @@
+"""
+Benchmark des index composites / fonctionnels (app/models.py).
+
+Crée une base SQLite temporaire, la remplit (utilisateurs, trades, challenges,
+progression, snapshots du leaderboard), mesure les requêtes les plus
+fréquentes sans les index, applique les index avec manage_db.apply_indexes()
+puis mesure à nouveau.
+
+Usage:
+    python benchmark_indexes.py [nb_utilisateurs] [trades_par_utilisateur]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'tradesense_index_benchmark.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+os.environ['MARKET_REFRESHER'] = '0'
+
+from sqlalchemy import func, text
+from app import create_app, db
+from app.models import User, Trade, UserChallenge, UserProgress, Leaderboard
+from manage_db import apply_indexes
+
+ROUNDS = 200
+
+
+def seed(users, trades_per_user):
+    random.seed(42)
+    now = datetime.utcnow()
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'username': f'Trader{i}@example.com', 'balance': 100000.0, 'status': 'ACTIVE',
+         'initial_capital': 100000.0, 'daily_starting_equity': 100000.0, 'last_equity_reset': now}
+        for i in range(1, users + 1)
+    ])
+
+    batch = []
+    for user_id in range(1, users + 1):
+        for n in range(trades_per_user):
+            opened = now - timedelta(minutes=random.randint(1, 60 * 24 * 90))
+            closed = n % 5 != 0
+            batch.append({
+                'user_id': user_id, 'symbol': random.choice(['BTC-USD', 'AAPL', 'IAM', 'TSLA']),
+                'quantity': 1.0, 'price': 100.0, 'type': random.choice(['BUY', 'SELL']),
+                'timestamp': opened, 'status': 'CLOSED' if closed else 'OPEN',
+                'close_price': 101.0 if closed else None,
+                # Les trades importés n'ont pas toujours de close_timestamp
+                'close_timestamp': opened + timedelta(minutes=30) if closed and n % 3 else None,
+                'pnl': random.uniform(-500, 500) if closed else 0.0
+            })
+        if len(batch) >= 50000:
+            db.session.execute(Trade.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Trade.__table__.insert(), batch)
+
+    db.session.execute(UserChallenge.__table__.insert(), [
+        {'user_id': user_id, 'plan_name': 'pro', 'plan_price': 100.0, 'initial_capital': 100000.0,
+         'payment_method': 'card', 'payment_status': 'completed',
+         'challenge_status': 'active' if k == 2 else 'failed', 'created_at': now}
+        for user_id in range(1, users + 1) for k in range(3)
+    ])
+    db.session.execute(UserProgress.__table__.insert(), [
+        {'user_id': user_id, 'course_id': course_id, 'progress_percentage': 50, 'last_accessed': now}
+        for user_id in range(1, users + 1) for course_id in range(1, 11)
+    ])
+    db.session.execute(Leaderboard.__table__.insert(), [
+        {'user_id': rank, 'username': f'Trader{rank}', 'rank': rank,
+         'snapshot_at': now - timedelta(hours=h)}
+        for h in range(24 * 60) for rank in range(1, 11)
+    ])
+    db.session.commit()
+
+
+def hot_queries(users):
+    closed_at = func.coalesce(Trade.close_timestamp, Trade.timestamp)
+    return {
+        'trades ouverts (user, status)': lambda uid: Trade.query.filter_by(
+            user_id=uid, status='OPEN').order_by(Trade.timestamp.desc()).all(),
+        'historique fermé (keyset)': lambda uid: Trade.query.filter(
+            Trade.user_id == uid, Trade.status == 'CLOSED'
+        ).order_by(closed_at.desc(), Trade.id.desc()).limit(51).all(),
+        'challenge actif': lambda uid: UserChallenge.query.filter_by(
+            user_id=uid, challenge_status='active').first(),
+        'progression cours': lambda uid: UserProgress.query.filter_by(
+            user_id=uid, course_id=uid % 10 + 1).first(),
+        'dernier snapshot leaderboard': lambda uid: Leaderboard.query.order_by(
+            Leaderboard.snapshot_at.desc()).first(),
+        'utilisateur par email': lambda uid: User.query.filter(
+            func.lower(User.username) == f'trader{uid}@example.com').first(),
+    }
+
+
+def measure(queries, users):
+    random.seed(7)
+    user_ids = [random.randint(1, users) for _ in range(ROUNDS)]
+    results = {}
+    for name, query in queries.items():
+        start = time.perf_counter()
+        for uid in user_ids:
+            query(uid)
+            db.session.expunge_all()
+        results[name] = (time.perf_counter() - start) * 1000 / ROUNDS
+    return results
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    trades_per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+
+    app = create_app()
+    with app.app_context():
+        # create_all a posé les index : on les retire pour la mesure "avant"
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                db.session.execute(text(f'DROP INDEX IF EXISTS {index.name}'))
+        db.session.commit()
+
+        print(f"Remplissage : {users} utilisateurs x {trades_per_user} trades...")
+        seed(users, trades_per_user)
+        db.session.execute(text('ANALYZE'))
+
+        queries = hot_queries(users)
+        before = measure(queries, users)
+
+        apply_indexes(app)
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+        after = measure(queries, users)
+
+    print(f"\n{'requête':<32}{'avant (ms)':>12}{'après (ms)':>12}{'gain':>8}")
+    for name in queries:
+        print(f"{name:<32}{before[name]:>12.3f}{after[name]:>12.3f}{before[name] / after[name]:>7.1f}x")
+    os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
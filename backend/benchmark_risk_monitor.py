@@ -0,0 +1,106 @@
+"""
+Benchmark du moniteur de risque (PositionIndex).
+
+Charge un index synthétique (sans base de données) puis mesure, sur un seul
+cœur, le coût d'un tick de prix : re-valorisation des positions du symbole,
+P&L par compte et filtrage des règles (perte max, perte journalière,
+objectif de profit). Mesure aussi l'ouverture / clôture d'une position et
+le rapport d'exposition par symbole.
+
+Usage:
+    python benchmark_risk_monitor.py [nb_positions] [nb_comptes] [nb_symboles]
+"""
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('MARKET_REFRESHER', '0')
+
+import numpy as np
+from app.services.position_index import PositionIndex
+
+ROUNDS = 200
+
+
+def load(positions, accounts, symbols):
+    random.seed(42)
+    # Mêmes colonnes que la requête de reconstruction (_position_rows)
+    rows = [
+        (trade_id, random.randint(1, accounts), random.choice(symbols),
+         random.choice(['BUY', 'SELL']), random.uniform(0.01, 5), 100.0,
+         97000.0, 100000.0, 100000.0, 'ACTIVE', 10.0, 5.0, 10.0)
+        for trade_id in range(1, positions + 1)
+    ]
+    started = time.perf_counter()
+    with PositionIndex._lock:
+        PositionIndex._reset()
+        PositionIndex._remark_books(PositionIndex._load(rows))
+    return (time.perf_counter() - started) * 1000
+
+
+def tick(symbol):
+    price = 100.0 * random.uniform(0.9, 1.1)
+    slots = PositionIndex.mark(symbol, price)
+    return PositionIndex.breaches(slots)
+
+
+def measure(symbols):
+    random.seed(7)
+    flagged = 0
+    started = time.perf_counter()
+    for i in range(ROUNDS):
+        flagged += len(tick(symbols[i % len(symbols)]))
+    return (time.perf_counter() - started) * 1000 / ROUNDS, flagged
+
+
+def main():
+    positions = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    accounts = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    nb_symbols = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    symbols = [f'SYM{i}' for i in range(nb_symbols)]
+
+    print(f"{positions} positions, {accounts} comptes")
+    build_ms = load(positions, accounts, symbols)
+    per_tick, flagged = measure(symbols)
+    print(f"  chargement de l'index          : {build_ms:8.1f} ms")
+    print(f"  tick ({nb_symbols} symboles)             : {per_tick:8.3f} ms  ({flagged} comptes signalés)")
+
+    # Pire cas : toutes les positions sur un seul symbole
+    load(positions, accounts, ['BTC-USD'])
+    per_tick, _ = measure(['BTC-USD'])
+    print(f"  tick (1 symbole, {positions} pos.) : {per_tick:8.3f} ms")
+
+    # Ouverture puis clôture d'une position (appliquées par sync())
+    started = time.perf_counter()
+    for i in range(ROUNDS):
+        trade_id = positions + 1 + i
+        PositionIndex._ops = [('open', trade_id, 1, 'BTC-USD', 'BUY', 1.0, 100.0), ('close', trade_id)]
+        with PositionIndex._lock:
+            PositionIndex._apply_ops()
+    print(f"  ouverture + clôture            : {(time.perf_counter() - started) * 1000 / ROUNDS:8.3f} ms")
+
+    # Tick juste après un ordre sur le symbole (regroupement par compte recalculé)
+    started = time.perf_counter()
+    for i in range(20):
+        PositionIndex._ops = [('open', positions + 1 + i, 1, 'BTC-USD', 'BUY', 1.0, 100.0)]
+        with PositionIndex._lock:
+            PositionIndex._apply_ops()
+        tick('BTC-USD')
+    print(f"  tick après un ordre (1 symbole) : {(time.perf_counter() - started) * 1000 / 20:8.3f} ms")
+
+    started = time.perf_counter()
+    PositionIndex.exposure('BTC-USD')
+    PositionIndex.holders('BTC-USD', 50)
+    print(f"  exposition + top 50 (1 symbole) : {(time.perf_counter() - started) * 1000:8.3f} ms")
+
+    # Contrôle : P&L latent égal au calcul direct
+    book = PositionIndex._books['BTC-USD']
+    _, _, qty, entry = book.view()
+    accounts_, inverse = book.grouping()
+    expected = np.bincount(inverse, weights=(book.mark - entry) * qty, minlength=len(accounts_))
+    assert np.allclose(PositionIndex._unrealized[accounts_], expected)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark du classement de sentiment des titres (HeadlineSentiment).
+
+Génère des titres synthétiques français / anglais puis compare, sur un seul
+cœur, l'ancienne règle (recherche de sous-chaînes, deux `any(...)` par titre)
+au lexique, titre par titre et par lot (meilleur temps sur REPEAT mesures).
+Affiche aussi quelques titres sur lesquels les deux règles divergent.
+
+Usage:
+    python benchmark_sentiment.py [nb_titres]
+"""
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('MARKET_REFRESHER', '0')
+
+from app.services.sentiment import HeadlineSentiment
+
+SUBJECTS = ['Bitcoin', 'Ethereum', 'Le MASI', 'Maroc Telecom', 'Attijariwafa Bank', 'Tesla', 'Apple',
+            'Oil', 'Gold', "L'Euro", 'Le CAC 40', 'Wall Street', 'Nasdaq futures', 'Le dirham']
+EVENTS = ['rises 3% after earnings', 'drops as supply concerns grow', 'hits a record high', 'hits record low',
+          'slumps on recession fears', 'rallies as investors follow the Fed', 'chute de 4% en séance',
+          'clôture en hausse', 'recule face au dollar', "s'envole après l'annonce", 'reste stable',
+          'investors await the jobs report', 'upgraded by analysts', 'se replie, inquiétudes sur la croissance',
+          'sets up for a volatile week', 'Fed keeps rates unchanged', 'bondit de 5%', 'lower in thin trading']
+
+
+def legacy(title):
+    """Ancienne règle de NewsService (sous-chaînes)."""
+    title_lower = title.lower()
+    if any(x in title_lower for x in ['up', 'rise', 'jump', 'gain', 'bull', 'high', 'record', 'hausse', 'bondit']):
+        return "POSITIVE"
+    if any(x in title_lower for x in ['down', 'drop', 'fall', 'loss', 'bear', 'low', 'crash', 'chute', 'baisse']):
+        return "NEGATIVE"
+    return "NEUTRAL"
+
+
+REPEAT = 5
+
+
+def timed(fn):
+    best = None
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - started
+        best = seconds if best is None else min(best, seconds)
+    return result, best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    random.seed(42)
+    titles = [f"{random.choice(SUBJECTS)} {random.choice(EVENTS)}" for _ in range(count)]
+    HeadlineSentiment.classify('warm-up')  # tables du lexique
+
+    print(f"{count} titres, {len(HeadlineSentiment._lexicon)} termes dans le lexique")
+    old, old_s = timed(lambda: [legacy(t) for t in titles])
+    one, one_s = timed(lambda: [HeadlineSentiment.classify(t) for t in titles])
+    batch, batch_s = timed(lambda: HeadlineSentiment.classify_batch(titles))
+    for label, seconds in (("ancienne règle (sous-chaînes)", old_s),
+                           ("lexique, titre par titre", one_s),
+                           ("lexique, par lot", batch_s)):
+        print(f"  {label:30}: {seconds * 1000:8.1f} ms  ({count / seconds:10,.0f} titres/s, x{old_s / seconds:.2f})")
+
+    assert one == batch
+    changed = sum(1 for o, b in zip(old, batch) if o != b)
+    examples = {t: (o, b) for t, o, b in zip(titles, old, batch) if o != b}
+    print(f"  {changed * 100 / count:.1f}% des titres classés différemment, par exemple :")
+    for title, (o, b) in list(examples.items())[:8]:
+        print(f"    {o:8} -> {b:8}  {title}")
+
+
+if __name__ == '__main__':
+    main()
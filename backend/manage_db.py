@@ -7,6 +7,8 @@ Fonctionnalités :
 1. Crée la base de données si elle n'existe pas.
 2. Crée toutes les tables nécessaires.
 3. Vérifie la connexion.
+4. Applique les index déclarés dans app/models.py (`python manage_db.py indexes`),
+   sur SQLite, MySQL ou PostgreSQL. Peut être relancé sans risque.
 """
 import os
 import pymysql
@@ -451,6 +453,7 @@ def setup_database():
         
         cursor.close()
         connection.close()
+        apply_indexes()
         print(f"\n✅ Tout est prêt ! Ce fichier est le seul nécessaire pour gérer la structure de votre base de données.")
         return True
         
@@ -459,5 +462,71 @@ def setup_database():
         print("Assurez-vous que MySQL est lancé et que les identifiants dans .env sont corrects.")
         return False
 
+def _index_exists(engine, table_name, index_name):
+    """Recherche l'index par nom dans le catalogue (l'inspecteur ignore les index fonctionnels sous SQLite)."""
+    from sqlalchemy import text
+
+    dialect = engine.dialect.name
+    if dialect == 'sqlite':
+        sql = "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :index"
+    elif dialect == 'mysql':
+        sql = ("SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() "
+               "AND table_name = :table AND index_name = :index")
+    elif dialect == 'postgresql':
+        sql = "SELECT 1 FROM pg_indexes WHERE schemaname = current_schema() AND indexname = :index"
+    else:
+        from sqlalchemy import inspect
+        return any(i['name'] == index_name for i in inspect(engine).get_indexes(table_name))
+
+    with engine.connect() as conn:
+        return conn.execute(text(sql), {'table': table_name, 'index': index_name}).first() is not None
+
+def apply_indexes(app=None):
+    """
+    Crée les index déclarés sur les modèles (composites et fonctionnels) qui
+    manquent dans une base existante. Idempotent : les index déjà présents
+    sont ignorés.
+
+    Args:
+        app (Flask, optional): Application déjà créée (sinon create_app())
+
+    Returns:
+        list: Noms des index créés
+    """
+    from sqlalchemy import inspect
+
+    if app is None:
+        # Pas besoin du rafraîchissement des marchés pour une migration
+        os.environ.setdefault('MARKET_REFRESHER', '0')
+        from app import create_app
+        app = create_app()
+
+    from app import db
+
+    created = []
+    with app.app_context():
+        engine = db.engine
+        print(f"\n=== INDEX ({engine.dialect.name}) ===")
+        inspector = inspect(engine)
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                try:
+                    if _index_exists(engine, table.name, index.name):
+                        print(f"  [OK] {index.name} déjà présent")
+                        continue
+                    index.create(bind=engine)
+                    created.append(index.name)
+                    print(f"  [CRÉÉ] {index.name} sur {table.name}")
+                except Exception as e:
+                    # ex. MySQL < 8.0.13 ne supporte pas les index fonctionnels
+                    print(f"  [ERREUR] {index.name}: {e}")
+    print(f"{len(created)} index créé(s).")
+    return created
+
 if __name__ == "__main__":
-    setup_database()
+    if len(sys.argv) > 1 and sys.argv[1] == 'indexes':
+        apply_indexes()
+    else:
+        setup_database()
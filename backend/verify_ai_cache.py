@@ -0,0 +1,70 @@
+"""
+Vérifie le cache de réponses et la déduplication des appels de l'assistant IA,
+hors ligne, avec le modèle local (AI_PROVIDER=stub).
+
+Usage:
+    python verify_ai_cache.py
+"""
+import os
+import threading
+import time
+
+os.environ['AI_PROVIDER'] = 'stub'
+os.environ.setdefault('AI_STUB_DELAY', '0.5')
+os.environ.setdefault('MARKET_REFRESHER', '0')
+
+from app.services.ai_service import AIService, GROQ_AVAILABLE
+
+
+def ask_concurrently(messages):
+    answers = [None] * len(messages)
+
+    def ask(i):
+        answers[i] = AIService.get_response(messages[i])
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(len(messages))]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return answers, time.perf_counter() - started
+
+
+print("--- Cache de réponses IA (AI_PROVIDER=stub) ---")
+AIService.get_response("bonjour")  # charge les données BVC (contexte de marché)
+calls = AIService._stub_calls
+
+# 1. Questions identiques (à la normalisation près) posées en même temps
+variants = ["Prix IAM", "prix iam ?", "PRIX  IAM!", "Prix IAM."] * 5
+answers, seconds = ask_concurrently(variants)
+print(f"1. {len(variants)} questions simultanées : {AIService._stub_calls - calls} appel(s) au modèle en {seconds:.2f}s")
+assert AIService._stub_calls - calls == 1 and len(set(answers)) == 1
+
+# 2. Même question juste après : servie depuis le cache
+started = time.perf_counter()
+AIService.get_response("prix IAM")
+print(f"2. Question répétée : {(time.perf_counter() - started) * 1000:.2f} ms, "
+      f"{AIService._stub_calls - calls} appel(s) au total")
+assert AIService._stub_calls - calls == 1
+
+# 3. Autre question : nouvel appel
+AIService.get_response("Cours ATW")
+assert AIService._stub_calls - calls == 2
+print("3. Question différente : nouvel appel au modèle")
+
+# 4. Le contexte de marché fait partie de la clé
+key = AIService._response_key("Prix IAM", "- IAM: 100 MAD")
+assert key != AIService._response_key("Prix IAM", "- IAM: 101 MAD")
+assert key == AIService._response_key("prix iam ?", "- IAM: 100 MAD")
+print("4. Nouvelles données de marché : nouvelle clé de cache")
+
+# 5. Clients réutilisés d'une requête à l'autre
+if GROQ_AVAILABLE:
+    from groq import Groq
+    first = AIService._client('groq', 'test-key', lambda: Groq(api_key='test-key'))
+    assert AIService._client('groq', 'test-key', lambda: Groq(api_key='test-key')) is first
+    print("5. Client Groq créé une seule fois par clé")
+
+stats = AIService._responses.stats()
+print(f"\nCache : {stats['entries']} entrées, {stats['hits']} hits, {stats['misses']} misses")
+print("OK")
@@ -24,6 +24,7 @@ CREATE TABLE IF NOT EXISTS users (
     last_equity_reset DATETIME DEFAULT CURRENT_TIMESTAMP,
     failure_reason VARCHAR(255),
     avatar_url VARCHAR(255),
+    version INT NOT NULL DEFAULT 1,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     INDEX idx_username (username),
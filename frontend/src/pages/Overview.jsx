@@ -43,7 +43,7 @@ const Overview = () => {
     }, [user]);
 
     const performanceMetrics = [
-        { label: 'Nombre de Trades', value: stats?.trades?.length || 0, icon: BarChart, color: 'text-cyan-400' },
+        { label: 'Nombre de Trades', value: stats?.total_trades ?? stats?.trades?.length ?? 0, icon: BarChart, color: 'text-cyan-400' },
         { label: 'Taux de Réussite', value: `${stats?.win_rate || 0}%`, icon: Target, color: 'text-blue-400' },
         { label: 'Meilleur Trade', value: formatPrice(stats?.best_trade || 0), icon: TrendingUp, color: 'text-emerald-400' },
         { label: 'Moyenne Trade', value: formatPrice(stats?.avg_trade || 0), icon: Activity, color: 'text-cyan-400' },
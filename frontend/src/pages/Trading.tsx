@@ -93,46 +93,95 @@ const Trading = () => {
     return () => clearInterval(signalInterval);
   }, [selectedAsset]);
 
-  // Fetch live price updates
+  // Live price updates: one SSE stream for all assets, polling as a fallback
   useEffect(() => {
+    const toTicker = (symbol: string) => symbol.replace('/', '-');
+
+    const applyPrice = (ticker: string, newPrice: number) => {
+      setPrices(prev => prev.map(asset => {
+        if (toTicker(asset.symbol) !== ticker) return asset;
+        // Change is measured against the reference price of the asset
+        const base = initialAssets.find(a => a.symbol === asset.symbol) || asset;
+        const change = ((newPrice - base.price) / base.price) * 100;
+        return { ...asset, price: newPrice, change: parseFloat(change.toFixed(2)) };
+      }));
+    };
+
+    // Last candle time per ticker: after the first poll only deltas are requested
+    const cursors: Record<string, number> = {};
+
     const fetchLivePrices = async () => {
-      const updatedPrices = await Promise.all(
+      await Promise.all(
         initialAssets.map(async (asset) => {
+          const ticker = toTicker(asset.symbol);
           try {
-            const response = await api.get(`/api/trading/price?ticker=${asset.symbol.replace('/', '-')}`);
-            if (response.data && response.data.length > 0) {
-              // Get the latest candle data
-              const latestCandle = response.data[response.data.length - 1];
-              const newPrice = latestCandle.close;
-
-              // Calculate change percentage based on previous price
-              const prevPrice = asset.price;
-              const change = ((newPrice - prevPrice) / prevPrice) * 100;
-
-              return {
-                ...asset,
-                price: newPrice,
-                change: parseFloat(change.toFixed(2)),
-              };
+            if (cursors[ticker] === undefined) {
+              const response = await api.get(`/api/trading/price?ticker=${ticker}`);
+              if (response.data && response.data.length > 0) {
+                // Get the latest candle data
+                const latestCandle = response.data[response.data.length - 1];
+                cursors[ticker] = latestCandle.time;
+                applyPrice(ticker, latestCandle.close);
+              }
+            } else {
+              const response = await api.get(`/api/trading/price?ticker=${ticker}&since=${cursors[ticker]}`, {
+                validateStatus: (status) => status === 200 || status === 304,
+              });
+              if (response.status === 200 && response.data) {
+                cursors[ticker] = response.data.cursor;
+                const latestCandle = response.data.candles[response.data.candles.length - 1];
+                const newPrice = response.data.mark?.price ?? latestCandle?.close;
+                if (newPrice != null) applyPrice(ticker, newPrice);
+              }
             }
           } catch (error) {
             console.error(`Error fetching price for ${asset.symbol}:`, error);
           }
-
-          // Return original asset if there was an error
-          return asset;
         })
       );
+    };
 
-      setPrices(updatedPrices);
+    let priceInterval: ReturnType<typeof setInterval> | undefined;
+    const startPolling = () => {
+      if (priceInterval) return;
+      fetchLivePrices();
+      // Refresh prices every 10 seconds
+      priceInterval = setInterval(fetchLivePrices, 10000);
     };
 
-    // Fetch live prices immediately
-    fetchLivePrices();
+    let source: EventSource | undefined;
+    if (typeof EventSource !== 'undefined') {
+      const symbols = initialAssets.map(asset => toTicker(asset.symbol)).join(',');
+      source = new EventSource(`${api.defaults.baseURL}/api/trading/stream?symbols=${encodeURIComponent(symbols)}`);
+      let opened = false;
+
+      const onMessage = (event: MessageEvent) => {
+        const message = JSON.parse(event.data);
+        const latestCandle = message.candles?.[message.candles.length - 1];
+        const newPrice = message.mark?.price ?? latestCandle?.close;
+        if (newPrice != null) applyPrice(message.symbol, newPrice);
+      };
 
-    // Refresh prices every 10 seconds
-    const priceInterval = setInterval(fetchLivePrices, 10000);
-    return () => clearInterval(priceInterval);
+      source.onopen = () => { opened = true; };
+      source.addEventListener('snapshot', onMessage);
+      source.addEventListener('update', onMessage);
+      source.onerror = () => {
+        // The browser reconnects on its own once a stream was established;
+        // if it never opened (e.g. serverless backend) or a reconnect was
+        // refused (503: no stream slot left on the server), poll instead
+        if (!opened || source?.readyState === EventSource.CLOSED) {
+          source?.close();
+          startPolling();
+        }
+      };
+    } else {
+      startPolling();
+    }
+
+    return () => {
+      source?.close();
+      if (priceInterval) clearInterval(priceInterval);
+    };
   }, []);
 
   const handleExecuteTrade = () => {